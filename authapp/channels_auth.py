@@ -0,0 +1,46 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from .authentication import BlacklistCheckingJWTAuthentication
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    """Resolve a raw JWT to a user with the same checks as the REST API"""
+    authenticator = BlacklistCheckingJWTAuthentication()
+    try:
+        validated_token = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections with the access token used for the API.
+
+    Browsers cannot set headers on a WebSocket handshake, so the token is read
+    from the ``token`` query parameter, falling back to an
+    ``Authorization: Bearer <token>`` header for other clients.
+    """
+
+    def get_raw_token(self, scope):
+        query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+        if query.get('token'):
+            return query['token'][0]
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                parts = value.decode('latin1').split()
+                if len(parts) == 2 and parts[0] == 'Bearer':
+                    return parts[1]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token = self.get_raw_token(scope)
+        scope['user'] = await get_user_for_token(raw_token) if raw_token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
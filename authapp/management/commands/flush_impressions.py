@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authapp import impressions
+
+
+class Command(BaseCommand):
+    help = 'Write buffered view counts to the database in batched updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10.0,
+            help='Seconds between flushes'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Flush once and exit instead of running periodically'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            try:
+                total += impressions.flush()
+            except Exception as e:
+                # flush() has logged the error and kept the counts, so the
+                # worker carries on and the next pass retries them
+                if options['once']:
+                    raise CommandError(f'Flushing views failed: {e}')
+                self.stderr.write(f'Flushing views failed, retrying in {options["interval"]}s: {e}')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {total} views'))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authapp import outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued side effects (notifications, ...) from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of events claimed per batch'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the outbox is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain pending events and exit instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            claimed = outbox.drain(batch_size=batch_size)
+            total += claimed
+            if claimed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} outbox events'))
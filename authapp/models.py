@@ -138,6 +138,35 @@ class Notification(models.Model):
             self.read = False
             self.save(update_fields=['read'])
 
+class OutboxEvent(models.Model):
+    """
+    Side effect waiting to be delivered by the outbox worker.
+
+    Rows are written in the same transaction as the change that caused them,
+    so an event exists exactly when that change committed. The
+    ``process_outbox`` command drains them in batches.
+    """
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='outbox_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} event {self.pk}"
+
 class SecurityLog(models.Model):
     """Model to track security-related events"""
     user = models.ForeignKey(
@@ -0,0 +1,132 @@
+"""
+Transactional outbox for side effects such as notifications.
+
+Request code calls ``enqueue`` inside the transaction that makes the change,
+and the ``process_outbox`` management command drains pending events in
+batches, handing all payloads of a topic to its handler in a single call.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=1)
+# Deferred events are leased for this long per chunk; a worker that dies
+# mid-chunk leaves them to be claimed again once the lease runs out
+LEASE_TIME = timedelta(minutes=15)
+DEFERRED_CHUNK_SIZE = 10
+
+_handlers = {}
+_deferred = set()
+
+
+def register(topic, deferred=False):
+    """
+    Register ``handler(payloads)`` as the consumer of ``topic`` events.
+
+    Handlers run inside the transaction that claims their events. Slow ones
+    (file processing, subprocesses) pass ``deferred=True`` instead: their
+    events are leased in that transaction and handled after it commits,
+    ``DEFERRED_CHUNK_SIZE`` at a time, so no locks are held meanwhile.
+    """
+    def decorator(handler):
+        _handlers[topic] = handler
+        if deferred:
+            _deferred.add(topic)
+        return handler
+    return decorator
+
+
+def enqueue(topic, payload):
+    """Record an event; it becomes visible to the worker when the caller commits."""
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def drain(batch_size=500):
+    """
+    Deliver one batch of pending events.
+
+    Rows are claimed with ``SKIP LOCKED`` where supported, so several
+    workers can run side by side. A handler that raises leaves its events
+    pending with a delay, up to ``MAX_ATTEMPTS`` tries.
+
+    Returns:
+        Number of events claimed (delivered or failed)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                processed_at__isnull=True,
+                available_at__lte=now,
+                attempts__lt=MAX_ATTEMPTS
+            ).order_by('id')[:batch_size]
+        )
+
+        by_topic = defaultdict(list)
+        deferred = defaultdict(list)
+        for event in events:
+            (deferred if event.topic in _deferred else by_topic)[event.topic].append(event)
+
+        if deferred:
+            # Taken out of the pending set until handled or the lease runs out
+            OutboxEvent.objects.filter(
+                id__in=[event.id for batch in deferred.values() for event in batch]
+            ).update(attempts=F('attempts') + 1, available_at=now + LEASE_TIME)
+
+        delivered = []
+        for topic, batch in by_topic.items():
+            ids = [event.id for event in batch]
+            try:
+                handler = _handlers[topic]
+                with transaction.atomic():
+                    handler([event.payload for event in batch])
+            except Exception as e:
+                logger.error(f"Error delivering {len(batch)} '{topic}' outbox events: {str(e)}")
+                OutboxEvent.objects.filter(id__in=ids).update(
+                    attempts=F('attempts') + 1,
+                    last_error=repr(e),
+                    available_at=now + RETRY_DELAY
+                )
+            else:
+                delivered.extend(ids)
+
+        if delivered:
+            OutboxEvent.objects.filter(id__in=delivered).update(
+                attempts=F('attempts') + 1,
+                processed_at=now
+            )
+
+    for topic, batch in deferred.items():
+        for start in range(0, len(batch), DEFERRED_CHUNK_SIZE):
+            deliver_deferred(topic, batch[start:start + DEFERRED_CHUNK_SIZE], batch[start + DEFERRED_CHUNK_SIZE:])
+    return len(events)
+
+
+def deliver_deferred(topic, chunk, rest):
+    """Handle one chunk of leased events outside any transaction"""
+    ids = [event.id for event in chunk]
+    # Renew the lease of the events still waiting behind this chunk
+    OutboxEvent.objects.filter(id__in=[event.id for event in rest]).update(
+        available_at=timezone.now() + LEASE_TIME
+    )
+    try:
+        _handlers[topic]([event.payload for event in chunk])
+    except Exception as e:
+        logger.error(f"Error delivering {len(chunk)} '{topic}' outbox events: {str(e)}")
+        # The attempt was counted when the events were leased
+        OutboxEvent.objects.filter(id__in=ids).update(
+            last_error=repr(e),
+            available_at=timezone.now() + RETRY_DELAY
+        )
+    else:
+        OutboxEvent.objects.filter(id__in=ids).update(processed_at=timezone.now())
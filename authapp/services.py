@@ -8,15 +8,20 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Count
 from typing import List, Optional, Dict, Any
 import logging
 from datetime import timedelta
 
 from .models import Notification
+from . import outbox
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+NOTIFICATION_TOPIC = 'notification'
+NOTIFICATION_BATCH_TOPIC = 'notification.batch'
+
 class NotificationService:
     """
     Service class for handling system notifications.
@@ -98,6 +103,110 @@ class NotificationService:
             logger.error(f"Error creating notification for user {user.email}: {str(e)}")
             raise
 
+    @classmethod
+    def queue_notification(
+        cls,
+        user: User,
+        title: str,
+        message: str,
+        notification_type: str = 'info',
+        link: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Queue a notification for the outbox worker instead of creating it inline.
+
+        The event commits with the caller's transaction, so callers on a
+        latency-sensitive path only pay for one insert.
+
+        Args:
+            user: The user to send the notification to
+            title: Notification title
+            message: Notification message
+            notification_type: Type of notification (info, warning, alert, system, etc.)
+            link: Optional link for the notification
+            data: Optional additional data to store with the notification
+        """
+        outbox.enqueue(NOTIFICATION_TOPIC, {
+            'user_id': user.id,
+            'title': title,
+            'message': message,
+            'notification_type': notification_type,
+            'link': link,
+            'data': data,
+        })
+
+    @classmethod
+    def queue_notifications(cls, items: List[Dict[str, Any]]) -> None:
+        """
+        Queue many notifications as a single outbox event.
+
+        Args:
+            items: Dicts with user_id, title, message and optionally
+                notification_type, link and data
+        """
+        if items:
+            outbox.enqueue(NOTIFICATION_BATCH_TOPIC, {'notifications': items})
+
+    @classmethod
+    def bulk_create_notifications(cls, items: List[Dict[str, Any]]) -> List[Notification]:
+        """
+        Create many notifications with one duplicate check and one insert.
+
+        Applies the same one-minute duplicate window as ``create_notification``,
+        both against stored notifications and within ``items``.
+
+        Args:
+            items: Dicts with user_id, title, message and optionally
+                notification_type, link and data
+
+        Returns:
+            List of created notifications
+        """
+        if not items:
+            return []
+
+        time_window = timezone.now() - timedelta(minutes=1)
+        seen = set(
+            Notification.objects.filter(
+                user_id__in={item['user_id'] for item in items},
+                created_at__gte=time_window
+            ).values_list('user_id', 'title', 'message')
+        )
+
+        pending = []
+        for item in items:
+            key = (item['user_id'], item['title'], item['message'])
+            if key in seen:
+                continue
+            seen.add(key)
+            pending.append(Notification(
+                user_id=item['user_id'],
+                title=item['title'],
+                message=item['message'],
+                notification_type=item.get('notification_type') or 'info',
+                link=item.get('link'),
+                data=item.get('data')
+            ))
+
+        notifications = Notification.objects.bulk_create(pending)
+
+        # Refresh the cached unread counts of everyone notified in one query
+        user_ids = {notification.user_id for notification in notifications}
+        counts = dict(
+            Notification.objects.filter(user_id__in=user_ids, read=False)
+            .values('user_id')
+            .annotate(unread=Count('id'))
+            .values_list('user_id', 'unread')
+        )
+        cache.set_many(
+            {f"unread_notifications_{user_id}": counts.get(user_id, 0) for user_id in user_ids},
+            300
+        )
+
+        logger.info(f"Created {len(notifications)} notifications in bulk")
+        return notifications
+
     @classmethod
     def create_system_notification(
         cls,
@@ -407,8 +516,8 @@ def notify_account_verification(user: User, verification_type: str):
 
 
 def notify_new_message(user: User, sender_name: str):
-    """Notify user of new message."""
-    NotificationService.create_notification(
+    """Notify user of new message. Delivered by the outbox worker."""
+    NotificationService.queue_notification(
         user=user,
         title="New Message",
         message=f"You have received a new message from {sender_name}",
@@ -416,6 +525,19 @@ def notify_new_message(user: User, sender_name: str):
     )
 
 
+def notify_new_messages(user_ids: List[int], sender_name: str):
+    """Notify several users of a message broadcast to them, as one outbox job."""
+    NotificationService.queue_notifications([
+        {
+            'user_id': user_id,
+            'title': "New Message",
+            'message': f"You have received a new message from {sender_name}",
+            'notification_type': NotificationService.NOTIFICATION_TYPES['MESSAGE'],
+        }
+        for user_id in user_ids
+    ])
+
+
 def notify_job_application_update(user: User, job_title: str, status: str):
     """Notify user of job application update."""
     NotificationService.create_notification(
@@ -771,4 +893,18 @@ def notify_new_follower(followed_user: User, follower_name: str):
         title="New Follower",
         message=f"{follower_name} has started following you.",
         notification_type='follow'  # Use 'follow' directly to avoid KeyError
-    )
\ No newline at end of file
+    )
+
+
+@outbox.register(NOTIFICATION_TOPIC)
+def deliver_queued_notifications(payloads: List[Dict[str, Any]]) -> None:
+    """Outbox handler creating every queued notification of a batch at once."""
+    NotificationService.bulk_create_notifications(payloads)
+
+
+@outbox.register(NOTIFICATION_BATCH_TOPIC)
+def deliver_queued_notification_batches(payloads: List[Dict[str, Any]]) -> None:
+    """Outbox handler for jobs that carry a list of notifications each."""
+    NotificationService.bulk_create_notifications([
+        item for payload in payloads for item in payload['notifications']
+    ])
@@ -12,8 +12,14 @@ from django.utils import timezone
 from datetime import timedelta
 import json
 
-from .models import Notification
-from .services import NotificationService
+from django.core.cache import cache
+from django.core.management import call_command
+from io import StringIO
+from unittest.mock import patch
+
+from . import outbox
+from .models import Notification, OutboxEvent
+from .services import NotificationService, notify_new_message, notify_new_messages
 
 User = get_user_model()
 
@@ -433,6 +439,84 @@ class NotificationIntegrationTest(TestCase):
         self.assertIn('Your password has been changed successfully', notification.message)
 
 
+class NotificationOutboxTest(TestCase):
+    """Test queued notifications delivered through the outbox."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123',
+            name='Test User'
+        )
+        self.other = User.objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+            name='Other User'
+        )
+
+    def test_new_message_notification_is_queued(self):
+        """Sending a message only writes an outbox row."""
+        notify_new_message(user=self.user, sender_name='Other User')
+
+        self.assertFalse(Notification.objects.filter(user=self.user).exists())
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.topic, 'notification')
+        self.assertEqual(event.payload['user_id'], self.user.id)
+
+    def test_drain_creates_notifications_in_one_batch(self):
+        """Queued notifications are inserted together and deduplicated."""
+        notify_new_message(user=self.user, sender_name='Other User')
+        notify_new_message(user=self.user, sender_name='Other User')
+        notify_new_message(user=self.other, sender_name='Test User')
+
+        with patch.object(
+            Notification.objects, 'bulk_create', wraps=Notification.objects.bulk_create
+        ) as bulk_create:
+            self.assertEqual(outbox.drain(), 3)
+        bulk_create.assert_called_once()
+
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Notification.objects.filter(user=self.other).count(), 1)
+        self.assertEqual(cache.get(f"unread_notifications_{self.user.id}"), 1)
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(outbox.drain(), 0)
+
+    def test_failed_delivery_is_retried_later(self):
+        """A failing handler leaves its events pending with a delay."""
+        notify_new_message(user=self.user, sender_name='Other User')
+
+        with patch.object(
+            NotificationService, 'bulk_create_notifications', side_effect=RuntimeError('boom')
+        ):
+            self.assertEqual(outbox.drain(), 1)
+
+        event = OutboxEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('boom', event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(outbox.drain(), 0)
+
+    def test_batched_job_is_one_event(self):
+        """A broadcast queues one event that creates every notification."""
+        notify_new_messages([self.user.id, self.other.id], sender_name='Casting Director')
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+        outbox.drain()
+        self.assertEqual(
+            Notification.objects.filter(title='New Message').count(), 2
+        )
+
+    def test_process_outbox_command(self):
+        """The worker command drains the queue and exits with --once."""
+        notify_new_message(user=self.user, sender_name='Other User')
+        out = StringIO()
+        call_command('process_outbox', '--once', stdout=out)
+
+        self.assertIn('Processed 1 outbox events', out.getvalue())
+        self.assertTrue(Notification.objects.filter(user=self.user, title='New Message').exists())
+
+
 class NotificationSecurityTest(TestCase):
     """Test notification security features."""
     
@@ -0,0 +1,77 @@
+"""
+Denormalized engagement counters on feed posts and comments.
+
+``FeedPost.likes_count``, ``FeedPost.comments_count``, ``Comment.likes_count``
+and ``Comment.replies_count`` are kept in step by ``feed.signals`` with
+atomic ``F()`` updates, so listing pages read them instead of counting.
+``reconcile`` recomputes them from the source rows for drift repair.
+"""
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, CommentLike, FeedLike, FeedPost
+
+
+def adjust(model, pk, field, delta):
+    """Atomically add ``delta`` to a counter; never goes below zero"""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_of(model, link, **filters):
+    """Correlated ``COUNT(*)`` of ``model`` rows whose ``link`` is the outer row"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{link: OuterRef('pk')}, **filters)
+            .order_by().values(link).annotate(total=Count('pk')).values('total')[:1]
+        ),
+        0
+    )
+
+
+def actual_counts(model):
+    """Expressions computing each stored counter of ``model`` from scratch"""
+    if model is FeedPost:
+        return {
+            'likes_count': count_of(FeedLike, 'post'),
+            'comments_count': count_of(Comment, 'post'),
+        }
+    return {
+        'likes_count': count_of(CommentLike, 'comment'),
+        'replies_count': count_of(Comment, 'parent'),
+    }
+
+
+def reconcile(model, batch_size=1000, dry_run=False):
+    """
+    Fix drifted counters of ``model`` (``FeedPost`` or ``Comment``), a
+    primary key range at a time.
+
+    Returns:
+        Number of rows whose counters were (or, with ``dry_run``, would be) wrong
+    """
+    expressions = actual_counts(model)
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return fixed
+        last_pk = pks[-1]
+
+        actual = {f'actual_{field}': expression for field, expression in expressions.items()}
+        mismatch = Q()
+        for field in expressions:
+            mismatch |= ~Q(**{field: F(f'actual_{field}')})
+        drifted = list(
+            model.objects.filter(pk__in=pks).annotate(**actual).filter(mismatch).values_list('pk', flat=True)
+        )
+
+        if drifted and not dry_run:
+            model.objects.filter(pk__in=drifted).update(**expressions)
+        fixed += len(drifted)
@@ -0,0 +1,229 @@
+"""
+The follow graph: cached follower/following counts and "who to follow".
+
+Counts are cached per profile and side. Follows and unfollows increment
+or decrement the cached value after commit; a missing or expired value is
+recounted on read, so drift lasts at most ``COUNT_TTL``.
+
+Suggestions are friend-of-friend: profile ``j`` is suggested to ``i`` by
+the number of profiles ``i`` follows that follow ``j``, which is entry
+``(i, j)`` of ``A @ A`` for the adjacency matrix ``A``. The batch job
+``compute_follow_suggestions`` evaluates those rows for a block of profiles
+at a time, over a sparse adjacency of just the block's two-hop
+neighbourhood (at most ``MAX_NEIGHBOURHOOD_EDGES`` edges), and stores the
+top ``k`` per profile in ``FollowSuggestion``. Serving them is an indexed lookup that
+skips profiles followed since the last run.
+"""
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Follow, FollowSuggestion
+
+COUNT_TTL = 24 * 3600
+SIDES = ('followers', 'following')
+
+SUGGESTION_COUNT = 20
+SUGGESTION_BATCH_SIZE = 1000
+# Bounds the memory of one batch: about 16 bytes per edge, several times over
+MAX_NEIGHBOURHOOD_EDGES = 2_000_000
+
+
+def count_key(profile_id, side):
+    return f"feed:follow_count:{side}:{profile_id}"
+
+
+def counted_profile(side):
+    """The ``Follow`` field a count of ``side`` groups by"""
+    return 'following_id' if side == 'followers' else 'follower_id'
+
+
+def counts_for(profile_ids):
+    """
+    Follower and following counts of several profiles, from the cache where
+    possible and with one grouped query per side otherwise.
+
+    Returns:
+        ``{profile_id: {'followers': n, 'following': n}}``
+    """
+    profile_ids = list(profile_ids)
+    keys = {count_key(pk, side): (pk, side) for pk in profile_ids for side in SIDES}
+    cached = cache.get_many(keys)
+    result = {pk: {} for pk in profile_ids}
+    for key, value in cached.items():
+        pk, side = keys[key]
+        result[pk][side] = value
+
+    for side in SIDES:
+        missing = [pk for pk in profile_ids if side not in result[pk]]
+        if not missing:
+            continue
+        field = counted_profile(side)
+        found = dict(
+            Follow.objects.filter(**{f'{field}__in': missing})
+            .values(field).annotate(total=Count('id')).values_list(field, 'total')
+        )
+        fresh = {}
+        for pk in missing:
+            result[pk][side] = fresh[count_key(pk, side)] = found.get(pk, 0)
+        cache.set_many(fresh, COUNT_TTL)
+    return result
+
+
+def counts(profile_id):
+    return counts_for([profile_id])[profile_id]
+
+
+def adjust_count(profile_id, side, delta):
+    try:
+        cache.incr(count_key(profile_id, side), delta)
+    except ValueError:
+        # Not cached; the next read counts it
+        pass
+
+
+def adjust_counts_on_commit(follow, delta):
+    """Keep cached counts of both ends of ``follow`` in step once it commits"""
+    follower_id, following_id = follow.follower_id, follow.following_id
+
+    def adjust():
+        adjust_count(following_id, 'followers', delta)
+        adjust_count(follower_id, 'following', delta)
+
+    transaction.on_commit(adjust)
+
+
+def neighbourhood(source_ids, max_edges=MAX_NEIGHBOURHOOD_EDGES):
+    """
+    Follow edges out of ``source_ids`` and out of every profile they follow:
+    all that their friend-of-friend scores depend on.
+
+    Returns:
+        ``(n, 2)`` array of ``(follower_id, following_id)``, or None when
+        there are more than ``max_edges`` and the batch can be split. A single
+        profile over the limit gets a truncated second hop instead.
+    """
+    first_hop = Follow.objects.filter(follower_id__in=source_ids)
+    second_hop = Follow.objects.filter(follower_id__in=first_hop.values('following_id'))
+    if len(source_ids) > 1 and first_hop.count() + second_hop.count() > max_edges:
+        return None
+    edges = list(first_hop.values_list('follower_id', 'following_id'))
+    edges += second_hop.values_list('follower_id', 'following_id')[:max(max_edges - len(edges), 0)]
+    # Follows between sources are in both hops
+    return np.unique(np.array(edges, dtype=np.int64).reshape(-1, 2), axis=0)
+
+
+def adjacency(edges):
+    """
+    ``edges`` in compressed sparse row form over dense indices.
+
+    Returns:
+        ``(profile_ids, indptr, indices)``: row ``i`` follows
+        ``indices[indptr[i]:indptr[i + 1]]``, sorted, all indices into
+        ``profile_ids``
+    """
+    profile_ids, dense = np.unique(edges, return_inverse=True)
+    dense = dense.reshape(-1, 2)
+    order = np.lexsort((dense[:, 1], dense[:, 0]))
+    rows, indices = dense[order, 0], dense[order, 1]
+    indptr = np.zeros(len(profile_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(profile_ids)), out=indptr[1:])
+    return profile_ids, indptr, indices
+
+
+def expand(indptr, indices, rows, nodes):
+    """Follow every edge out of ``nodes``, carrying ``rows`` along: one hop of a sparse product"""
+    degrees = indptr[nodes + 1] - indptr[nodes]
+    total = int(degrees.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    return np.repeat(rows, degrees), indices[np.repeat(indptr[nodes], degrees) + offsets]
+
+
+def top_suggestions(indptr, indices, nodes, k):
+    """
+    Top ``k`` friend-of-friend candidates of the rows ``nodes``.
+
+    Returns:
+        Arrays ``(rows, candidates, mutual_counts)``
+    """
+    size = len(indptr) - 1
+    sources, followed = expand(indptr, indices, nodes, nodes)
+    rows, candidates = expand(indptr, indices, sources, followed)
+
+    # Entries of A @ A for this block, minus self and already followed profiles
+    pairs = rows * size + candidates
+    keep = (rows != candidates) & ~np.isin(pairs, sources * size + followed)
+    pairs, mutual = np.unique(pairs[keep], return_counts=True)
+    rows, candidates = pairs // size, pairs % size
+
+    order = np.lexsort((candidates, -mutual, rows))
+    rows, candidates, mutual = rows[order], candidates[order], mutual[order]
+    group_start = np.searchsorted(rows, rows, side='left')
+    rank = np.arange(len(rows)) - group_start
+    top = rank < k
+    return rows[top], candidates[top], mutual[top]
+
+
+def store_suggestions(source_ids, edges, k):
+    """Replace the suggestions of ``source_ids`` with the top ``k`` found in ``edges``"""
+    profile_ids, indptr, indices = adjacency(edges)
+    # A source that unfollowed everyone since the batch was read has no row
+    nodes = np.searchsorted(profile_ids, source_ids)[np.isin(source_ids, profile_ids)]
+    rows, candidates, mutual = top_suggestions(indptr, indices, nodes, k)
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(profile_id__in=source_ids).delete()
+        FollowSuggestion.objects.bulk_create(
+            FollowSuggestion(
+                profile_id=int(profile_ids[row]),
+                suggested_id=int(profile_ids[candidate]),
+                mutual_count=int(count)
+            )
+            for row, candidate, count in zip(rows, candidates, mutual)
+        )
+    return len(rows)
+
+
+def compute_suggestions(k=SUGGESTION_COUNT, batch_size=SUGGESTION_BATCH_SIZE,
+                        max_edges=MAX_NEIGHBOURHOOD_EDGES, log=None):
+    """
+    Recompute and store the top ``k`` suggestions of every profile that
+    follows someone, ``batch_size`` profiles at a time. Batches whose
+    neighbourhood has more than ``max_edges`` edges are halved until it fits.
+
+    Returns:
+        Number of suggestions stored
+    """
+    stored = done = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Follow.objects.filter(follower_id__gt=last_id)
+            .order_by('follower_id').values_list('follower_id', flat=True).distinct()[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1]
+        pending = [batch]
+        while pending:
+            source_ids = pending.pop()
+            edges = neighbourhood(source_ids, max_edges)
+            if edges is None:
+                half = len(source_ids) // 2
+                pending += [source_ids[half:], source_ids[:half]]
+                continue
+            stored += store_suggestions(source_ids, edges, k)
+        done += len(batch)
+        if log:
+            log(f'{done} profiles')
+    # Profiles that no longer follow anyone have nothing to suggest from
+    FollowSuggestion.objects.exclude(profile_id__in=Follow.objects.values('follower_id')).delete()
+    return stored
+
+
+def suggestions(profile_id, limit=SUGGESTION_COUNT):
+    """Stored suggestions of a profile, best first, without those it has followed since"""
+    return FollowSuggestion.objects.filter(profile_id=profile_id).exclude(
+        suggested_id__in=Follow.objects.filter(follower_id=profile_id).values('following_id')
+    ).order_by('-mutual_count', 'suggested_id')[:limit]
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from feed import graph
+
+
+class Command(BaseCommand):
+    help = 'Recompute the friend-of-friend follow suggestions of every profile; run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=graph.SUGGESTION_COUNT,
+            help='Suggestions kept per profile'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=graph.SUGGESTION_BATCH_SIZE,
+            help='Profiles scored and written per batch'
+        )
+        parser.add_argument(
+            '--max-edges',
+            type=int,
+            default=graph.MAX_NEIGHBOURHOOD_EDGES,
+            help='Follow edges loaded per batch at most; larger batches are split'
+        )
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        stored = graph.compute_suggestions(
+            k=options['top_k'],
+            batch_size=options['batch_size'],
+            max_edges=options['max_edges'],
+            log=log
+        )
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} follow suggestions'))
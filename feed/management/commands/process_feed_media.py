@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from feed import media
+from feed.models import FeedPost
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnails and video posters for posts whose media has not been processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of posts rendered per batch'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry posts whose media failed to process'
+        )
+
+    def handle(self, *args, **options):
+        posts = FeedPost.objects.exclude(media='').exclude(media_status=FeedPost.MEDIA_READY)
+        if not options['retry_failed']:
+            posts = posts.exclude(media_status=FeedPost.MEDIA_FAILED)
+        post_ids = list(posts.order_by('id').values_list('id', flat=True))
+
+        ready = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(post_ids), batch_size):
+            batch = post_ids[start:start + batch_size]
+            FeedPost.objects.filter(id__in=batch).update(media_status=FeedPost.MEDIA_PENDING)
+            ready += media.process(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed media of {ready}/{len(post_ids)} posts'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from feed import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending feed ranking from the engagement counters of recent posts; run periodically'
+
+    def handle(self, *args, **options):
+        ranking = trending.recompute()
+        self.stdout.write(self.style.SUCCESS(f'Ranked {len(ranking)} trending posts'))
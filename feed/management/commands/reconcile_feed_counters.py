@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from feed import counters
+from feed.models import Comment, FeedPost
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like, comment and reply counters of posts and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows checked per statement'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rows have drifted'
+        )
+
+    def handle(self, *args, **options):
+        for model in (FeedPost, Comment):
+            drifted = counters.reconcile(
+                model,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run']
+            )
+            verb = 'have drifted' if options['dry_run'] else 'fixed'
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: {drifted} {verb}'
+            ))
@@ -0,0 +1,210 @@
+"""
+Derived media for feed posts: downscaled image renditions and video posters.
+
+Uploads are stored as they come. Saving a post with new media marks it
+``pending`` and queues it on the outbox; the outbox worker then renders
+each batch in a thread pool (``FEED_MEDIA_WORKERS``), outside the
+transaction that claimed the events, and records the
+rendition URLs in ``FeedPost.media_renditions``, so that feed pages can
+serve a small thumbnail instead of the original.
+
+Renditions are JPEGs no wider than ``RENDITION_WIDTHS``, written to the
+``FEED_MEDIA_STORAGE`` backend (Cloudinary in deployments, the local
+filesystem in tests). Videos get a poster frame, grabbed with ffmpeg,
+and the same renditions made from it.
+
+The pool threads only read and write files; all database access happens
+in the calling thread.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from authapp import outbox
+
+from .models import FeedPost
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TOPIC = 'feed.media'
+
+RENDITION_WIDTHS = {'thumbnail': 320, 'display': 1080}
+JPEG_QUALITY = 82
+# Seconds into a video for the poster frame; very short videos fall back to the first frame
+POSTER_OFFSET = 1.0
+FFMPEG_TIMEOUT = 60
+
+
+class MediaError(Exception):
+    """The media of a post could not be processed"""
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        config = settings.FEED_MEDIA_STORAGE
+        _storage = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _storage
+
+
+def rendition_name(post_id, kind):
+    return f"feed_posts/{post_id}/{kind}.jpg"
+
+
+def encode_jpeg(image):
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def downscale(data):
+    """JPEG renditions of image ``data`` by kind, never wider than the source"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            renditions = {}
+            for kind, width in RENDITION_WIDTHS.items():
+                copy = image.copy()
+                copy.thumbnail((width, width * 4))
+                renditions[kind] = encode_jpeg(copy)
+            return renditions
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise MediaError(f'Unreadable image: {exc}') from exc
+
+
+def poster_frame(source):
+    """A JPEG frame of the video at ``source``, a local path or a URL"""
+    ffmpeg = shutil.which(settings.FEED_MEDIA_FFMPEG)
+    if not ffmpeg:
+        raise MediaError('ffmpeg is not installed')
+    for offset in (POSTER_OFFSET, 0):
+        try:
+            result = subprocess.run(
+                [ffmpeg, '-v', 'error', '-ss', str(offset), '-i', source,
+                 '-frames:v', '1', '-f', 'image2pipe', '-vcodec', 'mjpeg', '-'],
+                capture_output=True, timeout=FFMPEG_TIMEOUT, check=False
+            )
+        except subprocess.TimeoutExpired as exc:
+            raise MediaError('ffmpeg timed out') from exc
+        if result.stdout:
+            return result.stdout
+    raise MediaError(f"No frame in video: {result.stderr.decode(errors='replace').strip()}")
+
+
+def video_source(field):
+    """Where ffmpeg can read an uploaded video from"""
+    try:
+        return field.path
+    except NotImplementedError:
+        return field.url
+
+
+def render(post_id, field, media_type):
+    """
+    Create and store the renditions of one post; runs in a pool thread.
+
+    Returns:
+        ``{kind: url}``
+    """
+    if media_type == 'video':
+        source = poster_frame(video_source(field))
+        renditions = {'poster': source, **downscale(source)}
+    else:
+        with field.open('rb') as original:
+            renditions = downscale(original.read())
+
+    storage = get_storage()
+    urls = {}
+    for kind, data in renditions.items():
+        name = rendition_name(post_id, kind)
+        if storage.exists(name):
+            storage.delete(name)
+        urls[kind] = storage.url(storage.save(name, ContentFile(data)))
+    return urls
+
+
+def process(post_ids):
+    """
+    Render the media of pending posts in ``post_ids`` in the worker pool
+    and record the results.
+
+    Returns:
+        Number of posts whose renditions are ready
+    """
+    posts = list(
+        FeedPost.objects.filter(id__in=post_ids, media_status=FeedPost.MEDIA_PENDING).exclude(media='')
+    )
+    if not posts:
+        return 0
+
+    def job(post):
+        try:
+            return render(post.id, post.media, post.media_type), None
+        except MediaError as exc:
+            return None, str(exc)
+        except Exception as exc:
+            logger.exception('Processing media of post %s failed', post.id)
+            return None, str(exc)
+
+    workers = max(1, min(settings.FEED_MEDIA_WORKERS, len(posts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(job, posts))
+
+    ready = 0
+    for post, (urls, error) in zip(posts, results):
+        if urls is not None:
+            fields = {
+                'media_status': FeedPost.MEDIA_READY,
+                'media_renditions': {**urls, 'source': post.media.name},
+            }
+            ready += 1
+        else:
+            logger.warning('Media of post %s not processed: %s', post.id, error)
+            fields = {'media_status': FeedPost.MEDIA_FAILED, 'media_renditions': {'source': post.media.name}}
+        # The post may have been given new media meanwhile; that upload is queued on its own
+        FeedPost.objects.filter(id=post.id, media=post.media.name).update(**fields)
+    return ready
+
+
+def needs_processing(post):
+    return bool(post.media) and post.media_renditions.get('source') != post.media.name
+
+
+def queue(post):
+    """Mark a post's media pending and queue it; it is processed once the post commits"""
+    FeedPost.objects.filter(id=post.id).update(media_status=FeedPost.MEDIA_PENDING, media_renditions={})
+    post.media_status, post.media_renditions = FeedPost.MEDIA_PENDING, {}
+    outbox.enqueue(MEDIA_TOPIC, {'post_id': post.id})
+
+
+def discard(post):
+    """Delete a post's renditions from storage, after the deletion commits"""
+    names = [rendition_name(post.id, kind) for kind in (*RENDITION_WIDTHS, 'poster')]
+
+    def delete():
+        storage = get_storage()
+        for name in names:
+            if storage.exists(name):
+                storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+# Rendering takes seconds per post, so it runs after the outbox claim commits
+@outbox.register(MEDIA_TOPIC, deferred=True)
+def deliver_media(payloads):
+    process({payload['post_id'] for payload in payloads})
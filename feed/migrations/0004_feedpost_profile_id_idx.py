@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0003_alter_commentlike_options_commentlike_is_like"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="feedpost",
+            index=models.Index(
+                fields=["profile", "-id"], name="feedpost_profile_id_idx"
+            ),
+        ),
+    ]
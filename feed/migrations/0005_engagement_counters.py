@@ -0,0 +1,63 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, link):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{link: OuterRef('pk')})
+            .order_by().values(link).annotate(total=Count('pk')).values('total')[:1]
+        ),
+        0
+    )
+
+
+def backfill_counters(apps, schema_editor):
+    FeedPost = apps.get_model('feed', 'FeedPost')
+    FeedLike = apps.get_model('feed', 'FeedLike')
+    Comment = apps.get_model('feed', 'Comment')
+    CommentLike = apps.get_model('feed', 'CommentLike')
+    FeedPost.objects.update(
+        likes_count=count_of(FeedLike, 'post'),
+        comments_count=count_of(Comment, 'post'),
+    )
+    Comment.objects.update(
+        likes_count=count_of(CommentLike, 'comment'),
+        replies_count=count_of(Comment, 'parent'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0004_feedpost_profile_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="replies_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="feedpost",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Comments and replies on the post"
+            ),
+        ),
+        migrations.AddField(
+            model_name="feedpost",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
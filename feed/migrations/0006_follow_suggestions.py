@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0005_engagement_counters"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FollowSuggestion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "mutual_count",
+                    models.PositiveIntegerField(
+                        help_text="Followed profiles that follow the suggested profile"
+                    ),
+                ),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="follow_suggestions",
+                        to="userprofile.profile",
+                    ),
+                ),
+                (
+                    "suggested",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="userprofile.profile",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["profile", "-mutual_count"],
+                        name="followsuggestion_rank_idx",
+                    )
+                ],
+                "unique_together": {("profile", "suggested")},
+            },
+        ),
+    ]
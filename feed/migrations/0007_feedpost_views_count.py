@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0006_follow_suggestions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feedpost",
+            name="views_count",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0007_feedpost_views_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feedpost",
+            name="media_renditions",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="feedpost",
+            name="media_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="",
+                max_length=10,
+            ),
+        ),
+    ]
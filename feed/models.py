@@ -2,17 +2,42 @@
 
 from django.db import models
 from userprofile.models import Profile
+from authapp import impressions
 
+@impressions.counted('views_count')
 class FeedPost(models.Model):
+    MEDIA_PENDING = 'pending'
+    MEDIA_READY = 'ready'
+    MEDIA_FAILED = 'failed'
+    MEDIA_STATUS_CHOICES = [
+        (MEDIA_PENDING, 'Pending'),
+        (MEDIA_READY, 'Ready'),
+        (MEDIA_FAILED, 'Failed'),
+    ]
+
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='feed_posts')
     content = models.TextField()
     media = models.FileField(upload_to='media/feed_posts/', blank=True, null=True)
     media_type = models.CharField(max_length=10, choices=[('image', 'Image'), ('video', 'Video')])
+    # Derived from media after upload by feed.media: {'thumbnail': url, 'display': url, 'poster': url, 'source': name}
+    media_renditions = models.JSONField(default=dict, blank=True)
+    media_status = models.CharField(max_length=10, choices=MEDIA_STATUS_CHOICES, blank=True, default='')
     project_title = models.CharField(max_length=200)
     project_type = models.CharField(max_length=100)
     location = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, help_text="Date and time when the post was last updated")
+    # Denormalized counters, maintained by feed.signals (see feed.counters)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0, help_text="Comments and replies on the post")
+    # Buffered, deduplicated per viewer; written by flush_impressions (see authapp.impressions)
+    views_count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Timeline rebuilds and celebrity posts read a profile's posts newest first
+            models.Index(fields=['profile', '-id'], name='feedpost_profile_id_idx'),
+        ]
 
 class FeedLike(models.Model):
     post = models.ForeignKey(FeedPost, on_delete=models.CASCADE, related_name='likes')
@@ -30,12 +55,27 @@ class Follow(models.Model):
     class Meta:
         unique_together = ('follower', 'following')
 
+class FollowSuggestion(models.Model):
+    """A precomputed "who to follow" entry; rewritten by ``compute_follow_suggestions`` (see feed.graph)"""
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField(help_text="Followed profiles that follow the suggested profile")
+
+    class Meta:
+        unique_together = ('profile', 'suggested')
+        indexes = [
+            models.Index(fields=['profile', '-mutual_count'], name='followsuggestion_rank_idx'),
+        ]
+
 class Comment(models.Model):
     post = models.ForeignKey(FeedPost, on_delete=models.CASCADE, related_name='comments')
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     parent = models.ForeignKey('self', null=True, blank=True, related_name='replies', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized counters, maintained by feed.signals (see feed.counters)
+    likes_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)
 
 
 class CommentLike(models.Model):
@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Keyset pages, newest first, for feed lists.
+
+    Ordering on the primary key keeps the cursor unique and index-backed,
+    so a deep page costs the same as the first one.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = '-id'
+
+
+class ReplyCursorPagination(FeedCursorPagination):
+    """Replies read as a conversation, oldest first"""
+    ordering = 'id'
@@ -1,35 +1,129 @@
 # feed/serializers.py
 
+from django.db import models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from .models import FeedPost, FeedLike, Follow, Comment, CommentLike
-from userprofile.serializers import ProfileSerializer
+from . import graph
+from userprofile.serializers import HEADSHOT_THUMBNAIL_SIZE, ProfileSerializer, thumbnail_url
 from userprofile.models import Profile
 
-class FeedPostSerializer(serializers.ModelSerializer):
-    profile = ProfileSerializer(read_only=True)
-    likes_count = serializers.SerializerMethodField()
+
+class LikedStateListSerializer(serializers.ListSerializer):
+    """
+    Resolves which items of the whole list the viewer has liked with one
+    ``IN`` query before the items are serialized, instead of one EXISTS
+    query per item.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.resolve_liked(items)
+        return super().to_representation(items)
+
+
+class LikedStateMixin:
+    """
+    ``user_has_liked`` backed by a ``{pk: liked}`` map in the serializer
+    context, shared by every serializer of the same response. Items that
+    are not in the map yet (single objects) are looked up on demand.
+    """
+    like_model = None
+    like_field = None
+
+    @property
+    def liked_context_key(self):
+        return f'liked_{self.like_field}_ids'
+
+    def viewer_profile(self):
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return None
+        try:
+            return request.user.profile
+        except Profile.DoesNotExist:
+            return None
+
+    def resolve_liked(self, items):
+        liked = self.context.setdefault(self.liked_context_key, {})
+        missing = [item.pk for item in items if item.pk not in liked]
+        if not missing:
+            return liked
+        found = set()
+        profile = self.viewer_profile()
+        if profile is not None:
+            found = set(
+                self.like_model.objects.filter(
+                    profile=profile,
+                    **{f'{self.like_field}_id__in': missing}
+                ).values_list(f'{self.like_field}_id', flat=True)
+            )
+        liked.update((pk, pk in found) for pk in missing)
+        return liked
+
+    def get_user_has_liked(self, obj):
+        return self.resolve_liked([obj])[obj.pk]
+
+
+class ProfileCardSerializer(serializers.ModelSerializer):
+    """
+    Compact profile for lists: id, name and a headshot thumbnail.
+    Querysets should ``select_related('user', 'headshot')`` on the profile.
+    """
+    name = serializers.CharField(source='user.name', read_only=True)
+    headshot = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Profile
+        fields = ['id', 'name', 'headshot']
+
+    def get_headshot(self, obj):
+        try:
+            image = obj.headshot.professional_headshot
+        except Profile.headshot.RelatedObjectDoesNotExist:
+            return None
+        return thumbnail_url(image, HEADSHOT_THUMBNAIL_SIZE) if image else None
+
+
+class FeedPostSerializer(LikedStateMixin, serializers.ModelSerializer):
+    like_model = FeedLike
+    like_field = 'post'
+
+    profile = ProfileCardSerializer(read_only=True)
     user_has_liked = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = FeedPost
         fields = [
-            'id', 'profile', 'content', 'media_type', 'media',
+            'id', 'profile', 'content', 'media_type', 'media', 'thumbnail', 'renditions', 'media_status',
             'project_title', 'project_type', 'location', 'created_at',
-            'likes_count', 'user_has_liked'
+            'likes_count', 'comments_count', 'views_count', 'user_has_liked'
+        ]
+        read_only_fields = [
+            'id', 'profile', 'created_at', 'likes_count', 'comments_count', 'views_count', 'user_has_liked',
+            'media_status'
         ]
-        read_only_fields = ['id', 'profile', 'created_at', 'likes_count', 'user_has_liked']
+        list_serializer_class = LikedStateListSerializer
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+    def get_thumbnail(self, obj):
+        """Small image for feed pages; None until the media has been processed"""
+        return obj.media_renditions.get('thumbnail')
 
-    def get_user_has_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                return obj.likes.filter(profile=request.user.profile).exists()
-            except:
-                return False
-        return False
+    def get_renditions(self, obj):
+        return {
+            kind: url for kind, url in obj.media_renditions.items() if kind != 'source'
+        }
+
+class ImpressionSerializer(serializers.Serializer):
+    post_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+        help_text='Posts shown to the user'
+    )
 
 class FeedProfileSerializer(serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
@@ -44,10 +138,10 @@ class FeedProfileSerializer(serializers.ModelSerializer):
         ]
 
     def get_follower_count(self, obj):
-        return obj.followers.count()
+        return graph.counts(obj.id)['followers']
 
     def get_following_count(self, obj):
-        return obj.following.count()
+        return graph.counts(obj.id)['following']
 
 class FeedLikeSerializer(serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
@@ -57,29 +151,31 @@ class FeedLikeSerializer(serializers.ModelSerializer):
         fields = ['id', 'profile', 'post', 'created_at']
         read_only_fields = ['id', 'profile', 'post', 'created_at']
 
+class FollowSuggestionSerializer(serializers.Serializer):
+    profile = ProfileCardSerializer(source='suggested', read_only=True)
+    mutual_count = serializers.IntegerField(read_only=True)
+
 class FollowSerializer(serializers.ModelSerializer):
-    follower = ProfileSerializer(read_only=True)
-    following = ProfileSerializer(read_only=True)
+    follower = ProfileCardSerializer(read_only=True)
+    following = ProfileCardSerializer(read_only=True)
 
     class Meta:
         model = Follow
         fields = ['id', 'follower', 'following', 'created_at']
         read_only_fields = ['id', 'follower', 'following', 'created_at']
 
-class ProfileMiniSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Profile  # or your profile model
-        fields = ['id', 'name', 'headshot']  # Add only what you need
 
 class ProfileIdSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile  # or your profile model
         fields = ['id']
 
-class CommentReplySerializer(serializers.ModelSerializer):
+class CommentReplySerializer(LikedStateMixin, serializers.ModelSerializer):
+    like_model = CommentLike
+    like_field = 'comment'
+
     profile_id = serializers.IntegerField(source='profile.id', read_only=True)
     profile_name = serializers.CharField(source='profile.name', read_only=True)
-    likes_count = serializers.SerializerMethodField()
     user_has_liked = serializers.SerializerMethodField()
 
     class Meta:
@@ -88,23 +184,47 @@ class CommentReplySerializer(serializers.ModelSerializer):
             'id', 'content', 'created_at', 'profile_id', 'profile_name',
             'parent', 'post', 'likes_count', 'user_has_liked'
         ]
+        read_only_fields = ['likes_count']
+        list_serializer_class = LikedStateListSerializer
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+REPLY_PREVIEW_COUNT = 2
 
-    def get_user_has_liked(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return obj.likes.filter(profile=user.profile).exists()
-        return False
 
-class CommentSerializer(serializers.ModelSerializer):
+def reply_previews(parent_ids, limit=REPLY_PREVIEW_COUNT):
+    """
+    The first ``limit`` replies of each parent in ``parent_ids``, oldest
+    first, as ``{parent_id: [reply, ...]}``, from one windowed query.
+    """
+    replies = Comment.objects.filter(parent_id__in=parent_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('parent_id')],
+            order_by=[F('created_at').asc(), F('id').asc()]
+        )
+    ).filter(position__lte=limit).select_related('profile__user').order_by('parent_id', 'position')
+    previews = {parent_id: [] for parent_id in parent_ids}
+    for reply in replies:
+        previews[reply.parent_id].append(reply)
+    return previews
+
+
+class CommentListSerializer(LikedStateListSerializer):
+    """Loads the reply previews of the whole page before serializing it"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.resolve_replies(items)
+        return super().to_representation(items)
+
+
+class CommentSerializer(LikedStateMixin, serializers.ModelSerializer):
+    like_model = CommentLike
+    like_field = 'comment'
+
     profile_id = serializers.IntegerField(source='profile.id', read_only=True)
     profile_name = serializers.CharField(source='profile.name', read_only=True)
     replies = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
     user_has_liked = serializers.SerializerMethodField()
-    replies_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
@@ -116,23 +236,23 @@ class CommentSerializer(serializers.ModelSerializer):
             'id', 'created_at', 'profile_id', 'profile_name',
             'likes_count', 'user_has_liked', 'replies_count', 'replies'
         ]
+        list_serializer_class = CommentListSerializer
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
-    def get_user_has_liked(self, obj):
-        user = self.context['request'].user
-        return obj.likes.filter(profile=user.profile).exists()
-
-    def get_replies_count(self, obj):
-        return obj.replies.count()
+    def resolve_replies(self, items):
+        """Reply previews of ``items``, kept in the context; liked state is resolved for comments and replies together"""
+        previews = self.context.setdefault('reply_previews', {})
+        missing = [item.pk for item in items if item.pk not in previews]
+        if missing:
+            previews.update(reply_previews(missing))
+            self.resolve_liked(list(items) + [reply for pk in missing for reply in previews[pk]])
+        return previews
 
     def get_replies(self, obj):
-        replies_qs = obj.replies.all()[:2]  # or whatever limit you want
-        return CommentReplySerializer(replies_qs, many=True, context=self.context).data
+        replies = self.resolve_replies([obj])[obj.pk]
+        return CommentReplySerializer(replies, many=True, context=self.context).data
 
 class CommentLikeSerializer(serializers.ModelSerializer):
-    profile = ProfileSerializer(read_only=True)
+    profile = ProfileCardSerializer(read_only=True)
 
     class Meta:
         model = CommentLike
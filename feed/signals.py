@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import FeedPost, FeedLike, Comment
+from .models import FeedPost, FeedLike, Comment, CommentLike, Follow
+from . import counters, graph, media, timeline, trending
 import logging
 from authapp.services import notify_new_feed_posted, notify_new_like, notify_new_comment,notify_new_follower
 logger = logging.getLogger(__name__)
@@ -42,4 +43,86 @@ def handle_new_follower(sender, instance, created, **kwargs):
         followed_user = instance.following.user
         follower_name = instance.follower.user.username or instance.follower.user.email  # Adjusted to use user.username
         notify_new_follower(followed_user=followed_user, follower_name=follower_name)
-        logger.debug(f"Notification sent to {followed_user.email} for new follower {follower_name}")
\ No newline at end of file
+        logger.debug(f"Notification sent to {followed_user.email} for new follower {follower_name}")
+
+# Home timelines
+@receiver(post_save, sender=FeedPost)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.queue_fan_out(instance)
+
+@receiver(post_delete, sender=FeedPost)
+def retract_deleted_post(sender, instance, **kwargs):
+    timeline.queue_retract(instance)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def rebuild_follower_timeline(sender, instance, **kwargs):
+    # The follower's timeline is rebuilt with or without the followed posts on next read
+    if kwargs.get('created', True):
+        timeline.invalidate_on_commit(instance.follower_id)
+
+# Denormalized engagement counters; links written by feed.toggles arrive already counted
+@receiver(post_save, sender=FeedLike)
+def count_new_post_like(sender, instance, created, **kwargs):
+    if created and not kwargs.get('counted'):
+        counters.adjust(FeedPost, instance.post_id, 'likes_count', 1)
+
+@receiver(post_delete, sender=FeedLike)
+def count_removed_post_like(sender, instance, **kwargs):
+    if not kwargs.get('counted'):
+        counters.adjust(FeedPost, instance.post_id, 'likes_count', -1)
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(FeedPost, instance.post_id, 'comments_count', 1)
+        if instance.parent_id:
+            counters.adjust(Comment, instance.parent_id, 'replies_count', 1)
+
+@receiver(post_delete, sender=Comment)
+def count_removed_comment(sender, instance, **kwargs):
+    # Replies deleted along with their parent are counted off one by one
+    counters.adjust(FeedPost, instance.post_id, 'comments_count', -1)
+    if instance.parent_id:
+        counters.adjust(Comment, instance.parent_id, 'replies_count', -1)
+
+@receiver(post_save, sender=CommentLike)
+def count_new_comment_like(sender, instance, created, **kwargs):
+    if created and not kwargs.get('counted'):
+        counters.adjust(Comment, instance.comment_id, 'likes_count', 1)
+
+@receiver(post_delete, sender=CommentLike)
+def count_removed_comment_like(sender, instance, **kwargs):
+    if not kwargs.get('counted'):
+        counters.adjust(Comment, instance.comment_id, 'likes_count', -1)
+
+# Trending ranking
+@receiver(post_save, sender=FeedLike)
+@receiver(post_delete, sender=FeedLike)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def rescore_trending_post(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        trending.bump_on_commit(instance.post_id)
+
+# Cached follow counts
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        graph.adjust_counts_on_commit(instance, 1)
+
+@receiver(post_delete, sender=Follow)
+def count_removed_follow(sender, instance, **kwargs):
+    graph.adjust_counts_on_commit(instance, -1)
+
+# Media renditions
+@receiver(post_save, sender=FeedPost)
+def queue_media_processing(sender, instance, **kwargs):
+    if media.needs_processing(instance):
+        media.queue(instance)
+
+@receiver(post_delete, sender=FeedPost)
+def discard_media_renditions(sender, instance, **kwargs):
+    if instance.media_renditions:
+        media.discard(instance)
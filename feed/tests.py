@@ -1,3 +1,772 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import BytesIO, StringIO
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from authapp import impressions, outbox
+from authapp.models import Notification, OutboxEvent
+from userprofile.models import Profile
+
+from . import graph, media, timeline, trending
+from .models import Comment, CommentLike, FeedLike, FeedPost, Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+def make_profile(name):
+    user = User.objects.create_user(
+        email=f'{name}@test.com',
+        username=name,
+        password='testpass123',
+        name=name.title()
+    )
+    return Profile.objects.create(user=user)
+
+
+def make_post(profile, title='Post'):
+    return FeedPost.objects.create(
+        profile=profile,
+        content='Content',
+        media_type='image',
+        project_title=title,
+        project_type='Film',
+        location='Addis Ababa'
+    )
+
+
+class HomeTimelineTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        timeline.get_store().clear()
+        self.reader = make_profile('reader')
+        self.author = make_profile('author')
+        self.stranger = make_profile('stranger')
+        Follow.objects.create(follower=self.reader, following=self.author)
+        self.client.force_authenticate(user=self.reader.user)
+
+    def post_as(self, profile, title='Post'):
+        post = make_post(profile, title)
+        outbox.drain()
+        return post
+
+    def read(self, **params):
+        response = self.client.get(reverse('home-timeline'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_new_post_is_pushed_to_follower_timeline(self):
+        self.assertEqual(self.read()['results'], [])
+
+        post = self.post_as(self.author)
+        self.post_as(self.stranger)
+
+        key = timeline.timeline_key(self.reader.id)
+        self.assertEqual(timeline.get_store().page(key, None, 10), [post.id])
+        self.assertEqual([item['id'] for item in self.read()['results']], [post.id])
+
+    def test_cold_timeline_is_rebuilt_from_database(self):
+        older = self.post_as(self.author, 'Older')
+        own = self.post_as(self.reader, 'Own')
+        self.post_as(self.stranger)
+        timeline.get_store().clear()
+
+        self.assertEqual([item['id'] for item in self.read()['results']], [own.id, older.id])
+
+    def test_pages_walk_back_with_before(self):
+        self.read()
+        posts = [self.post_as(self.author, f'Post {i}') for i in range(5)]
+
+        first = self.read(page_size=2)
+        self.assertEqual([item['id'] for item in first['results']], [posts[4].id, posts[3].id])
+        second = self.read(page_size=2, before=first['next'])
+        self.assertEqual([item['id'] for item in second['results']], [posts[2].id, posts[1].id])
+        last = self.read(page_size=2, before=second['next'])
+        self.assertEqual([item['id'] for item in last['results']], [posts[0].id])
+        self.assertIsNone(last['next'])
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=1)
+    def test_celebrity_posts_are_merged_in_on_read(self):
+        Follow.objects.create(follower=self.stranger, following=self.author)
+        self.read()
+
+        post = self.post_as(self.author)
+
+        self.assertIn(self.author.id, timeline.get_store().celebrities())
+        key = timeline.timeline_key(self.reader.id)
+        self.assertEqual(timeline.get_store().page(key, None, 10), [])
+        self.assertEqual([item['id'] for item in self.read()['results']], [post.id])
+
+    def test_unfollow_and_delete_leave_the_timeline(self):
+        self.read()
+        post = self.post_as(self.author)
+        kept = self.post_as(self.reader)
+
+        post_id = post.id
+        post.delete()
+        outbox.drain()
+        self.assertEqual([item['id'] for item in self.read()['results']], [kept.id])
+
+        other = self.post_as(self.author)
+        self.assertIn(other.id, [item['id'] for item in self.read()['results']])
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(follower=self.reader, following=self.author).delete()
+        ids = [item['id'] for item in self.read()['results']]
+        self.assertNotIn(other.id, ids)
+        self.assertNotIn(post_id, ids)
+
+    @override_settings(FEED_TIMELINE=None)
+    def test_pulls_from_database_without_a_shared_store(self):
+        posts = [self.post_as(self.author, f'Post {i}') for i in range(3)]
+        own = self.post_as(self.reader, 'Own')
+        self.post_as(self.stranger)
+        self.assertFalse(OutboxEvent.objects.filter(topic=timeline.FANOUT_TOPIC).exists())
+
+        first = self.read(page_size=2)
+        self.assertEqual([item['id'] for item in first['results']], [own.id, posts[2].id])
+        second = self.read(page_size=2, before=first['next'])
+        self.assertEqual([item['id'] for item in second['results']], [posts[1].id, posts[0].id])
+        self.assertIsNone(second['next'])
+
+    def test_invalid_before(self):
+        response = self.client.get(reverse('home-timeline'), {'before': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EngagementCounterTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_profile('author')
+        self.reader = make_profile('reader')
+        self.post = make_post(self.author)
+        self.client.force_authenticate(user=self.reader.user)
+
+    def test_like_toggle_returns_stored_counter(self):
+        url = reverse('feed-like-toggle', kwargs={'post_id': self.post.id})
+        response = self.client.post(url)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        response = self.client.post(url)
+        self.assertEqual(response.data['likes_count'], 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_comments_replies_and_comment_likes(self):
+        comment = Comment.objects.create(post=self.post, profile=self.reader, content='Nice')
+        Comment.objects.create(post=self.post, profile=self.author, content='Thanks', parent=comment)
+        Comment.objects.create(post=self.post, profile=self.reader, content='Welcome', parent=comment)
+        CommentLike.objects.create(comment=comment, profile=self.author)
+
+        comment.refresh_from_db()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertEqual(comment.replies_count, 2)
+        self.assertEqual(comment.likes_count, 1)
+
+        response = self.client.get(reverse('comment-list-create', kwargs={'post_id': self.post.id}))
+        self.assertEqual(response.data['results'][0]['replies_count'], 2)
+        self.assertEqual(response.data['results'][0]['likes_count'], 1)
+
+        # Deleting a comment takes its replies with it
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        FeedLike.objects.create(post=self.post, profile=self.reader)
+        comment = Comment.objects.create(post=self.post, profile=self.reader, content='Nice')
+        FeedPost.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=0)
+        Comment.objects.filter(pk=comment.pk).update(replies_count=3)
+
+        out = StringIO()
+        call_command('reconcile_feed_counters', dry_run=True, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 7)
+        self.assertIn('1 have drifted', out.getvalue())
+
+        call_command('reconcile_feed_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+        self.assertEqual(comment.replies_count, 0)
+
+
+class LikedStateTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_profile('author')
+        self.reader = make_profile('reader')
+        self.posts = [make_post(self.author, f'Post {i}') for i in range(6)]
+        for post in self.posts[:2]:
+            FeedLike.objects.create(post=post, profile=self.reader)
+        self.client.force_authenticate(user=self.reader.user)
+
+    def test_post_page_resolves_likes_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('feedpost-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        liked = {item['id'] for item in response.data['results'] if item['user_has_liked']}
+        self.assertEqual(liked, {post.id for post in self.posts[:2]})
+        like_queries = [q for q in ctx.captured_queries if 'feed_feedlike' in q['sql']]
+        self.assertEqual(len(like_queries), 1)
+
+    def test_single_post_and_anonymous_viewer(self):
+        response = self.client.get(reverse('feedpost-detail', kwargs={'id': self.posts[0].id}))
+        self.assertTrue(response.data['user_has_liked'])
+
+        comment = Comment.objects.create(post=self.posts[0], profile=self.author, content='First')
+        reply = Comment.objects.create(post=self.posts[0], profile=self.author, content='Reply', parent=comment)
+        CommentLike.objects.create(comment=reply, profile=self.reader)
+
+        response = self.client.get(reverse('comment-replies', kwargs={'parent_id': comment.id}))
+        self.assertTrue(response.data['results'][0]['user_has_liked'])
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('comment-replies', kwargs={'parent_id': comment.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['results'][0]['user_has_liked'])
+
+    def test_comment_page_with_reply_previews(self):
+        comment = Comment.objects.create(post=self.posts[0], profile=self.author, content='First')
+        other = Comment.objects.create(post=self.posts[0], profile=self.author, content='Second')
+        reply = Comment.objects.create(post=self.posts[0], profile=self.author, content='Reply', parent=comment)
+        CommentLike.objects.create(comment=other, profile=self.reader)
+        CommentLike.objects.create(comment=reply, profile=self.reader)
+
+        response = self.client.get(reverse('comment-list-create', kwargs={'post_id': self.posts[0].id}))
+        by_id = {item['id']: item for item in response.data['results']}
+        self.assertFalse(by_id[comment.id]['user_has_liked'])
+        self.assertTrue(by_id[other.id]['user_has_liked'])
+        self.assertTrue(by_id[comment.id]['replies'][0]['user_has_liked'])
+
+
+class FeedPaginationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.target = make_profile('target')
+        self.followers = [make_profile(f'fan{i}') for i in range(5)]
+        for profile in self.followers:
+            Follow.objects.create(follower=profile, following=self.target)
+        self.client.force_authenticate(user=self.target.user)
+
+    def test_followers_are_cursor_paged_cards(self):
+        url = reverse('followers-list')
+        first = self.client.get(url, {'page_size': 3})
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first.data['results']), 3)
+        self.assertEqual(set(first.data['results'][0]['follower']), {'id', 'name', 'headshot'})
+        self.assertIsNone(first.data['results'][0]['follower']['headshot'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 2)
+        self.assertIsNone(second.data['next'])
+        seen = [item['follower']['id'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(sorted(seen), sorted(profile.id for profile in self.followers))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('followers-list'), {'cursor': 'junk'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_post_page_queries_do_not_grow_with_authors(self):
+        make_post(self.followers[0])
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('feedpost-list'))
+        for profile in self.followers[1:]:
+            make_post(profile)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('feedpost-list'))
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+
+class TrendingFeedTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_profile('author')
+        self.reader = make_profile('reader')
+        self.client.force_authenticate(user=self.reader.user)
+
+    def age(self, post, hours):
+        FeedPost.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(hours=hours))
+
+    def read(self, **params):
+        response = self.client.get(reverse('trending-feed'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_engagement_decays_with_age(self):
+        quiet = make_post(self.author, 'Quiet')
+        liked = make_post(self.author, 'Liked')
+        stale = make_post(self.author, 'Stale')
+        expired = make_post(self.author, 'Expired')
+        FeedPost.objects.filter(pk=liked.pk).update(likes_count=3)
+        # Three half-lives old: 1 + 2 * 10 comments decays below a fresh post with 3 likes
+        FeedPost.objects.filter(pk=stale.pk).update(comments_count=10)
+        self.age(stale, 72)
+        self.age(expired, 24 * 30)
+
+        out = StringIO()
+        call_command('rank_trending_feed', stdout=out)
+        self.assertIn('Ranked 3 trending posts', out.getvalue())
+        self.assertEqual([item['id'] for item in self.read()['results']], [liked.id, stale.id, quiet.id])
+
+    def test_engagement_events_rescore_after_commit(self):
+        first = make_post(self.author, 'First')
+        second = make_post(self.author, 'Second')
+        self.assertEqual([item['id'] for item in self.read()['results']], [second.id, first.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeedLike.objects.create(post=first, profile=self.reader)
+        self.assertEqual([item['id'] for item in self.read()['results']], [first.id, second.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeedLike.objects.filter(post=first).delete()
+        self.assertEqual([item['id'] for item in self.read()['results']], [second.id, first.id])
+
+    @override_settings(FEED_TRENDING_SIZE=3)
+    def test_pages_and_bounded_ranking(self):
+        posts = [make_post(self.author, f'Post {i}') for i in range(5)]
+
+        first = self.read(page_size=2)
+        self.assertEqual([item['id'] for item in first['results']], [posts[4].id, posts[3].id])
+        last = self.read(page_size=2, offset=first['next'])
+        self.assertEqual([item['id'] for item in last['results']], [posts[2].id])
+        self.assertIsNone(last['next'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=posts[0], profile=self.reader, content='Nice')
+        self.assertEqual(self.read()['results'][0]['id'], posts[0].id)
+        self.assertEqual(len(trending.ranking()), 3)
+
+    def test_invalid_offset(self):
+        response = self.client.get(reverse('trending-feed'), {'offset': '-1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CommentTreeTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_profile('author')
+        self.reader = make_profile('reader')
+        self.post = make_post(self.author)
+        self.client.force_authenticate(user=self.reader.user)
+
+    def comment(self, parent=None, content='Comment'):
+        return Comment.objects.create(post=self.post, profile=self.author, content=content, parent=parent)
+
+    def list_comments(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('comment-list-create', kwargs={'post_id': self.post.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(ctx.captured_queries)
+
+    def test_page_loads_with_fixed_queries(self):
+        first = self.comment()
+        replies = [self.comment(first, f'Reply {i}') for i in range(3)]
+        CommentLike.objects.create(comment=replies[1], profile=self.reader)
+        _, few = self.list_comments()
+
+        for _ in range(4):
+            parent = self.comment()
+            self.comment(parent)
+            self.comment(parent)
+        data, many = self.list_comments()
+
+        self.assertEqual(many, few)
+        self.assertEqual(len(data['results']), 5)
+        by_id = {item['id']: item for item in data['results']}
+        previews = by_id[first.id]['replies']
+        self.assertEqual([reply['id'] for reply in previews], [replies[0].id, replies[1].id])
+        self.assertEqual([reply['user_has_liked'] for reply in previews], [False, True])
+        self.assertEqual(by_id[first.id]['replies_count'], 3)
+
+    def test_replies_are_cursor_paged_oldest_first(self):
+        parent = self.comment()
+        replies = [self.comment(parent, f'Reply {i}') for i in range(3)]
+        url = reverse('comment-replies', kwargs={'parent_id': parent.id})
+
+        first = self.client.get(url, {'page_size': 2})
+        self.assertEqual([item['id'] for item in first.data['results']], [replies[0].id, replies[1].id])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([item['id'] for item in second.data['results']], [replies[2].id])
+        self.assertIsNone(second.data['next'])
+
+
+class FollowGraphTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.me, self.a, self.b, self.c, self.d = (make_profile(name) for name in ('me', 'amy', 'ben', 'cal', 'dan'))
+        self.client.force_authenticate(user=self.me.user)
+
+    def follow(self, follower, following):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Follow.objects.create(follower=follower, following=following)
+
+    def test_counts_are_cached_and_kept_in_step(self):
+        self.follow(self.a, self.me)
+        url = reverse('profile-follow-counts', kwargs={'profile_id': self.me.id})
+        self.assertEqual(self.client.get(url).data, {'follower_count': 1, 'following_count': 0})
+
+        follow = self.follow(self.b, self.me)
+        self.follow(self.me, self.c)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(graph.counts(self.me.id), {'followers': 2, 'following': 1})
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow.delete()
+        self.assertEqual(graph.counts(self.me.id)['followers'], 1)
+        self.assertEqual(self.client.get(reverse('profile-follow-counts', kwargs={'profile_id': 0})).status_code, 404)
+
+    def test_friend_of_friend_suggestions(self):
+        self.follow(self.me, self.a)
+        self.follow(self.me, self.b)
+        self.follow(self.a, self.c)
+        self.follow(self.b, self.c)
+        self.follow(self.b, self.d)
+        self.follow(self.a, self.me)
+        self.follow(self.a, self.b)
+
+        out = StringIO()
+        call_command('compute_follow_suggestions', top_k=2, stdout=out)
+        self.assertIn('Stored', out.getvalue())
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(profile=self.me).order_by('-mutual_count').values_list('suggested_id', 'mutual_count')),
+            [(self.c.id, 2), (self.d.id, 1)]
+        )
+        # amy already follows me, ben and cal, which leaves dan through ben
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(profile=self.a).values_list('suggested_id', flat=True)),
+            [self.d.id]
+        )
+
+        response = self.client.get(reverse('follow-suggestions'))
+        self.assertEqual([item['profile']['id'] for item in response.data], [self.c.id, self.d.id])
+        self.assertEqual(response.data[0]['mutual_count'], 2)
+
+        self.follow(self.me, self.c)
+        response = self.client.get(reverse('follow-suggestions'))
+        self.assertEqual([item['profile']['id'] for item in response.data], [self.d.id])
+
+    def test_batches_give_the_same_suggestions(self):
+        profiles = [self.me, self.a, self.b, self.c, self.d]
+        for i, follower in enumerate(profiles):
+            for following in profiles[i + 1:i + 3]:
+                self.follow(follower, following)
+        graph.compute_suggestions(batch_size=100)
+        whole = set(FollowSuggestion.objects.values_list('profile_id', 'suggested_id', 'mutual_count'))
+        graph.compute_suggestions(batch_size=2)
+        self.assertEqual(set(FollowSuggestion.objects.values_list('profile_id', 'suggested_id', 'mutual_count')), whole)
+        # Six edges fit any single profile's neighbourhood but not the whole graph's
+        graph.compute_suggestions(batch_size=100, max_edges=6)
+        self.assertEqual(set(FollowSuggestion.objects.values_list('profile_id', 'suggested_id', 'mutual_count')), whole)
+        self.assertTrue(whole)
+
+
+class IdempotentToggleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_profile('author')
+        self.reader = make_profile('reader')
+        self.post = make_post(self.author)
+        self.comment = Comment.objects.create(post=self.post, profile=self.author, content='Nice')
+        self.client.force_authenticate(user=self.reader.user)
+
+    def test_post_like_toggle(self):
+        url = reverse('feed-like-toggle', kwargs={'post_id': self.post.id})
+        liked = self.client.post(url)
+        self.assertEqual((liked.data['action'], liked.data['likes_count']), ('liked', 1))
+        self.assertEqual(FeedLike.objects.filter(post=self.post).count(), 1)
+
+        unliked = self.client.post(url)
+        self.assertEqual((unliked.data['has_liked'], unliked.data['likes_count']), (False, 0))
+        self.assertFalse(FeedLike.objects.exists())
+
+        missing = self.client.post(reverse('feed-like-toggle', kwargs={'post_id': self.post.id + 100}))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_repeated_comment_likes_are_not_errors(self):
+        url = reverse('comment-like', kwargs={'comment_id': self.comment.id})
+        first = self.client.post(url, {'is_like': True}, format='json')
+        again = self.client.post(url, {'is_like': True}, format='json')
+        self.assertEqual((first.status_code, again.status_code), (status.HTTP_201_CREATED, status.HTTP_200_OK))
+        self.assertEqual(again.data['likes_count'], 1)
+        self.assertTrue(again.data['has_liked'])
+
+        for _ in range(2):
+            response = self.client.post(url, {'is_like': False}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((response.data['has_liked'], response.data['likes_count']), (False, 0))
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.likes_count, 0)
+
+        missing = self.client.post(reverse('comment-like', kwargs={'comment_id': 0}))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_follow_is_idempotent_and_keeps_side_effects(self):
+        body = {'profile_id': self.reader.id, 'following_id': self.author.id}
+        first = self.client.post(reverse('follow-user'), body, format='json')
+        again = self.client.post(reverse('follow-user'), body, format='json')
+        self.assertEqual((first.status_code, again.status_code), (status.HTTP_201_CREATED, status.HTTP_200_OK))
+        self.assertEqual(again.data['follower_count'], 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Notification.objects.filter(user=self.author.user).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            gone = self.client.delete(reverse('unfollow-user'), body, format='json')
+        self.assertEqual(gone.data['message'], 'Unfollowed successfully.')
+        self.assertEqual(graph.counts(self.author.id)['followers'], 0)
+        self.assertEqual(self.client.delete(reverse('unfollow-user'), body, format='json').status_code, status.HTTP_200_OK)
+
+        missing = self.client.post(reverse('follow-user'), {'profile_id': self.reader.id, 'following_id': 0}, format='json')
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_like_runs_in_fixed_statements(self):
+        url = reverse('feed-like-toggle', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(url)
+        like_writes = [q for q in ctx.captured_queries if 'feed_feedlike' in q['sql']]
+        self.assertEqual(len(like_writes), 2 if connection.vendor != 'postgresql' else 1)
+
+
+class ImpressionTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        impressions.get_store().clear()
+        self.author = make_profile('author')
+        self.reader = make_profile('reader')
+        self.posts = [make_post(self.author, f'Post {i}') for i in range(3)]
+        self.client.force_authenticate(user=self.reader.user)
+
+    def view(self, *posts):
+        return self.client.post(
+            reverse('feedpost-impressions'), {'post_ids': [post.id for post in posts]}, format='json'
+        )
+
+    def test_views_are_deduplicated_and_flushed_in_batches(self):
+        self.assertEqual(self.view(*self.posts).status_code, status.HTTP_202_ACCEPTED)
+        self.view(self.posts[0])
+        impressions.record(FeedPost, [self.posts[0].id, self.posts[1].id], 'other-viewer')
+
+        # Nothing reaches the database until the flush
+        self.assertEqual(FeedPost.objects.filter(views_count__gt=0).count(), 0)
+        with CaptureQueriesContext(connection) as ctx:
+            out = StringIO()
+            call_command('flush_impressions', '--once', stdout=out)
+        self.assertIn('Flushed 5 views', out.getvalue())
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        # One statement for the posts seen twice, one for the post seen once
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            list(FeedPost.objects.order_by('id').values_list('views_count', flat=True)), [2, 2, 1]
+        )
+        self.assertEqual(impressions.flush(), 0)
+
+    def test_failed_flush_keeps_counts(self):
+        self.view(self.posts[0])
+        with mock.patch.object(impressions, 'write', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                impressions.flush()
+        self.assertEqual(impressions.flush(), 1)
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].views_count, 1)
+
+    def test_worker_survives_a_failed_flush(self):
+        class Stop(Exception):
+            pass
+
+        self.view(self.posts[0])
+        write = impressions.write
+        failures = [RuntimeError('database went away')]
+
+        def flaky_write(growth):
+            if failures:
+                raise failures.pop()
+            write(growth)
+
+        err = StringIO()
+        with mock.patch.object(impressions, 'write', side_effect=flaky_write), \
+                mock.patch('time.sleep', side_effect=[None, Stop]):
+            with self.assertRaises(Stop):
+                call_command('flush_impressions', '--interval', '0', stdout=StringIO(), stderr=err)
+        self.assertIn('database went away', err.getvalue())
+        self.posts[0].refresh_from_db()
+        self.assertEqual(self.posts[0].views_count, 1)
+
+    def test_memory_store_flushes_itself(self):
+        class Stop(Exception):
+            pass
+
+        store = impressions.InMemoryImpressionStore(flush_interval=10)
+        with mock.patch.object(impressions, '_store', store):
+            with mock.patch.object(store, '_start_flusher') as start:
+                self.view(self.posts[0], self.posts[1])
+            start.assert_called()
+            with mock.patch.object(impressions, 'close_old_connections'), \
+                    mock.patch('time.sleep', side_effect=[None, Stop]):
+                with self.assertRaises(Stop):
+                    store._flush_periodically()
+        self.assertEqual(
+            list(FeedPost.objects.order_by('id').values_list('views_count', flat=True)), [1, 1, 0]
+        )
+
+    def test_memory_store_expires_sketches_after_flushing_them(self):
+        store = impressions.InMemoryImpressionStore()
+        store.record(['old'], 'viewer', -1)
+        store.record(['new'], 'viewer', 60)
+        growth = store.collect()
+        self.assertEqual(growth, {'old': 1, 'new': 1})
+        # A failed write can still put the expired sketch back
+        store.restore(['old'])
+        self.assertEqual(store.collect(), {'old': 1})
+        store.credit({'old': 1})
+        self.assertEqual(store.collect(), {})
+        self.assertEqual(store.record(['old'], 'viewer', 60), 1)
+
+    def test_invalid_payload(self):
+        response = self.client.post(reverse('feedpost-impressions'), {'post_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_popular_post_is_counted_within_sketch_error(self):
+        post = self.posts[0]
+        for viewer in range(3000):
+            impressions.record(FeedPost, [post.id], viewer)
+        impressions.flush()
+        for viewer in range(6000):
+            impressions.record(FeedPost, [post.id], viewer)
+        impressions.flush()
+
+        post.refresh_from_db()
+        self.assertAlmostEqual(post.views_count, 6000, delta=300)
+
+
+def image_upload(width, height, name='photo.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class MediaPipelineTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, media.get_storage().location, ignore_errors=True)
+        self.author = make_profile('author')
+        self.client.force_authenticate(user=self.author.user)
+
+    def post_with(self, upload, media_type='image'):
+        return FeedPost.objects.create(
+            profile=self.author, content='Content', media=upload, media_type=media_type,
+            project_title='Shoot', project_type='Film', location='Addis Ababa'
+        )
+
+    def test_image_renditions_are_made_off_request(self):
+        post = self.post_with(image_upload(2000, 1000))
+        self.assertEqual(post.media_status, FeedPost.MEDIA_PENDING)
+
+        outbox.drain()
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, FeedPost.MEDIA_READY)
+        storage = media.get_storage()
+        with storage.open(media.rendition_name(post.id, 'thumbnail')) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (320, 160))
+        with storage.open(media.rendition_name(post.id, 'display')) as display:
+            self.assertEqual(Image.open(display).size, (1080, 540))
+
+        response = self.client.get(reverse('feedpost-list'))
+        item = response.data['results'][0]
+        self.assertEqual(item['thumbnail'], post.media_renditions['thumbnail'])
+        self.assertEqual(set(item['renditions']), {'thumbnail', 'display'})
+
+        # Saving the post again does not reprocess unchanged media
+        post.content = 'Edited'
+        post.save()
+        self.assertEqual(post.media_status, FeedPost.MEDIA_READY)
+
+    def test_video_posters(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1920, 1080)).save(buffer, 'JPEG')
+        with mock.patch.object(media, 'poster_frame', return_value=buffer.getvalue()):
+            post = self.post_with(SimpleUploadedFile('clip.mp4', b'video', content_type='video/mp4'), 'video')
+            outbox.drain()
+        post.refresh_from_db()
+        self.assertEqual(set(post.media_renditions) - {'source'}, {'poster', 'thumbnail', 'display'})
+
+    def test_rendering_runs_after_the_outbox_claim_commits(self):
+        post = self.post_with(image_upload(400, 400))
+        depths = []
+        process = media.process
+
+        def watched(post_ids):
+            depths.append(len(connection.atomic_blocks))
+            return process(post_ids)
+
+        outside = len(connection.atomic_blocks)
+        with mock.patch.object(media, 'process', side_effect=watched):
+            self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(depths, [outside])
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, FeedPost.MEDIA_READY)
+        self.assertTrue(OutboxEvent.objects.get(topic=media.MEDIA_TOPIC).processed_at)
+
+    def test_failed_rendering_is_retried(self):
+        self.post_with(image_upload(400, 400))
+        with mock.patch.object(media, 'process', side_effect=RuntimeError('disk full')):
+            outbox.drain()
+        event = OutboxEvent.objects.get(topic=media.MEDIA_TOPIC)
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('disk full', event.last_error)
+
+        OutboxEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), 1)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.processed_at)
+
+    @override_settings(FEED_MEDIA_FFMPEG='missing-ffmpeg-binary')
+    def test_unprocessable_media_is_marked_failed(self):
+        video = self.post_with(SimpleUploadedFile('clip.mp4', b'video', content_type='video/mp4'), 'video')
+        broken = self.post_with(SimpleUploadedFile('broken.png', b'not an image', content_type='image/png'))
+        outbox.drain()
+        for post in (video, broken):
+            post.refresh_from_db()
+            self.assertEqual(post.media_status, FeedPost.MEDIA_FAILED)
+            self.assertNotIn('thumbnail', post.media_renditions)
+
+    def test_media_delete(self):
+        post = self.post_with(image_upload(400, 400))
+        outbox.drain()
+        post.refresh_from_db()
+        url = reverse('feedpost-media', kwargs={'id': post.id})
+
+        self.client.force_authenticate(user=make_profile('stranger').user)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.author.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        post.refresh_from_db()
+        self.assertFalse(post.media)
+        self.assertEqual(post.media_renditions, {})
+        self.assertFalse(media.get_storage().exists(media.rendition_name(post.id, 'thumbnail')))
@@ -0,0 +1,326 @@
+"""
+Home timelines: the posts of the profiles someone follows, newest first.
+
+Timelines are built on write. When a post is created its id is pushed
+into a bounded sorted set per follower (scored by post id, which grows
+with creation time), so reading a page is one range query on the reader's
+set. The push runs in the outbox worker, not in the request.
+
+Profiles with more than ``FEED_CELEBRITY_FOLLOWERS`` followers are not
+fanned out. Their posts are merged in at read time from the database,
+for the few such profiles a reader follows. A profile stays a celebrity
+once promoted, so none of its posts fall between the two paths.
+
+A timeline that does not exist (new reader, expired, store flushed, or
+dropped after a follow or unfollow) is rebuilt from the database on first
+read, and only existing timelines receive fan-out writes.
+
+With ``FEED_TIMELINE = None`` (no store shared by the web processes and the
+outbox worker) nothing is fanned out and every page is pulled from the
+database.
+"""
+
+import threading
+import time
+from heapq import nlargest
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from authapp import outbox
+
+from .models import FeedPost, Follow
+
+FANOUT_TOPIC = 'feed.fanout'
+RETRACT_TOPIC = 'feed.retract'
+
+# Timelines of readers who stop coming back expire and are rebuilt lazily
+TIMELINE_TTL = 30 * 24 * 3600
+FANOUT_BATCH_SIZE = 1000
+
+
+def timeline_key(profile_id):
+    return f"feed:timeline:{profile_id}"
+
+
+CELEBRITIES_KEY = 'feed:celebrities'
+
+# Kept in every timeline so that "follows nobody" is not mistaken for "not built"
+EMPTY_MARKER = 'empty'
+
+
+class InMemoryTimelineStore:
+    """Sorted sets in process memory; for tests and single-process development"""
+
+    def __init__(self, **options):
+        self._sets = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        if key in self._expires and self._expires[key] < time.monotonic():
+            self._sets.pop(key, None)
+            self._expires.pop(key, None)
+        return self._sets.get(key)
+
+    def push(self, keys, member, max_length):
+        """Add ``member`` to those of ``keys`` that exist, keeping the newest ``max_length``"""
+        with self._lock:
+            for key in keys:
+                members = self._live(key)
+                if members is None:
+                    continue
+                members[member] = member
+                if len(members) > max_length + 1:
+                    for oldest in sorted(m for m in members if m != EMPTY_MARKER)[:len(members) - max_length - 1]:
+                        del members[oldest]
+                self._expires[key] = time.monotonic() + TIMELINE_TTL
+
+    def replace(self, key, members):
+        with self._lock:
+            self._sets[key] = {EMPTY_MARKER: 0, **{member: member for member in members}}
+            self._expires[key] = time.monotonic() + TIMELINE_TTL
+
+    def delete(self, key):
+        with self._lock:
+            self._sets.pop(key, None)
+            self._expires.pop(key, None)
+
+    def remove(self, keys, members):
+        with self._lock:
+            for key in keys:
+                existing = self._live(key)
+                if existing is not None:
+                    for member in members:
+                        existing.pop(member, None)
+
+    def page(self, key, before, limit):
+        """Up to ``limit`` members below ``before``, highest first; None when the timeline does not exist"""
+        with self._lock:
+            members = self._live(key)
+            if members is None:
+                return None
+            self._expires[key] = time.monotonic() + TIMELINE_TTL
+            return nlargest(limit, (
+                m for m in members
+                if m != EMPTY_MARKER and (before is None or m < before)
+            ))
+
+    def add_celebrity(self, profile_id):
+        with self._lock:
+            self._sets.setdefault(CELEBRITIES_KEY, {})[profile_id] = profile_id
+
+    def celebrities(self):
+        with self._lock:
+            return set(self._sets.get(CELEBRITIES_KEY, ()))
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+            self._expires.clear()
+
+
+class RedisTimelineStore:
+    """Redis sorted sets; one pipeline round trip per batch of writes"""
+
+    def __init__(self, url, **options):
+        import redis
+        self.client = redis.Redis.from_url(url, **options)
+
+    def push(self, keys, member, max_length):
+        # Timelines nobody has read are not kept warm; they are built on read
+        keys = list(keys)
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        keys = [key for key, exists in zip(keys, pipe.execute()) if exists]
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zadd(key, {member: member, EMPTY_MARKER: 0})
+            # Keep the marker (rank 0) and the newest max_length posts
+            pipe.zremrangebyrank(key, 1, -(max_length + 1))
+            pipe.expire(key, TIMELINE_TTL)
+        pipe.execute()
+
+    def replace(self, key, members):
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.zadd(key, {EMPTY_MARKER: 0, **{member: member for member in members}})
+        pipe.expire(key, TIMELINE_TTL)
+        pipe.execute()
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def remove(self, keys, members):
+        members = list(members)
+        if not members:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrem(key, *members)
+        pipe.execute()
+
+    def page(self, key, before, limit):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrangebyscore(key, f'({before}' if before is not None else '+inf', '(0', start=0, num=limit)
+        pipe.expire(key, TIMELINE_TTL)
+        members, exists = pipe.execute()
+        if not exists:
+            return None
+        return [int(member) for member in members]
+
+    def add_celebrity(self, profile_id):
+        self.client.sadd(CELEBRITIES_KEY, profile_id)
+
+    def celebrities(self):
+        return {int(member) for member in self.client.smembers(CELEBRITIES_KEY)}
+
+    def clear(self):
+        for key in self.client.scan_iter('feed:*'):
+            self.client.delete(key)
+
+
+_store = None
+
+
+def enabled():
+    """Whether timelines are stored, as opposed to pulled from the database on every read"""
+    return settings.FEED_TIMELINE is not None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        config = settings.FEED_TIMELINE
+        _store = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _store
+
+
+def follower_ids(profile_id):
+    return Follow.objects.filter(following_id=profile_id).values_list('follower_id', flat=True)
+
+
+def is_celebrity(profile_id, store=None):
+    """Whether posts of ``profile_id`` are read on demand instead of fanned out"""
+    store = store or get_store()
+    if profile_id in store.celebrities():
+        return True
+    if follower_ids(profile_id).count() > settings.FEED_CELEBRITY_FOLLOWERS:
+        store.add_celebrity(profile_id)
+        return True
+    return False
+
+
+def fan_out(post_id, profile_id):
+    """Push a new post into the author's timeline and, for non-celebrities, their followers'"""
+    store = get_store()
+    length = settings.FEED_TIMELINE_LENGTH
+    store.push([timeline_key(profile_id)], post_id, length)
+    if is_celebrity(profile_id, store):
+        return
+    batch = []
+    for follower_id in follower_ids(profile_id).iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(timeline_key(follower_id))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            store.push(batch, post_id, length)
+            batch = []
+    if batch:
+        store.push(batch, post_id, length)
+
+
+def retract(post_id, profile_id):
+    """Remove a deleted post from the timelines it was pushed to"""
+    store = get_store()
+    keys = [timeline_key(profile_id)] + [timeline_key(pk) for pk in follower_ids(profile_id)]
+    for start in range(0, len(keys), FANOUT_BATCH_SIZE):
+        store.remove(keys[start:start + FANOUT_BATCH_SIZE], [post_id])
+
+
+def home_posts(profile_id):
+    """Own posts and those of followed profiles, newest first"""
+    followed = Follow.objects.filter(follower_id=profile_id).values('following_id')
+    return FeedPost.objects.filter(
+        Q(profile_id=profile_id) | Q(profile_id__in=followed)
+    ).order_by('-id')
+
+
+def rebuild(profile_id):
+    """Build a timeline from the database"""
+    post_ids = list(home_posts(profile_id).values_list('id', flat=True)[:settings.FEED_TIMELINE_LENGTH])
+    get_store().replace(timeline_key(profile_id), post_ids)
+    return post_ids
+
+
+def invalidate(profile_id):
+    """Drop a timeline so that its next read rebuilds it"""
+    get_store().delete(timeline_key(profile_id))
+
+
+def page(profile_id, before=None, limit=20):
+    """
+    Post ids of one timeline page, newest first.
+
+    Costs one range read on the reader's timeline plus, when the reader
+    follows celebrities, one indexed query for their posts below ``before``.
+
+    Returns:
+        ``(post_ids, has_more)``
+    """
+    if not enabled():
+        posts = home_posts(profile_id)
+        if before is not None:
+            posts = posts.filter(id__lt=before)
+        post_ids = list(posts.values_list('id', flat=True)[:limit + 1])
+        return post_ids[:limit], len(post_ids) > limit
+
+    store = get_store()
+    post_ids = store.page(timeline_key(profile_id), before, limit + 1)
+    if post_ids is None:
+        rebuilt = rebuild(profile_id)
+        post_ids = [pk for pk in rebuilt if before is None or pk < before][:limit + 1]
+
+    celebrities = store.celebrities() - {profile_id}
+    if celebrities:
+        followed = Follow.objects.filter(
+            follower_id=profile_id,
+            following_id__in=celebrities
+        ).values('following_id')
+        pulled = FeedPost.objects.filter(profile_id__in=followed)
+        if before is not None:
+            pulled = pulled.filter(id__lt=before)
+        post_ids = set(post_ids)
+        post_ids.update(pulled.order_by('-id').values_list('id', flat=True)[:limit + 1])
+        post_ids = sorted(post_ids, reverse=True)
+
+    return post_ids[:limit], len(post_ids) > limit
+
+
+def queue_fan_out(post):
+    """Schedule the fan-out of a new post; it is delivered once the post commits"""
+    if enabled():
+        outbox.enqueue(FANOUT_TOPIC, {'post_id': post.id, 'profile_id': post.profile_id})
+
+
+def queue_retract(post):
+    if enabled():
+        outbox.enqueue(RETRACT_TOPIC, {'post_id': post.id, 'profile_id': post.profile_id})
+
+
+@outbox.register(FANOUT_TOPIC)
+def deliver_fan_outs(payloads):
+    for payload in payloads:
+        fan_out(payload['post_id'], payload['profile_id'])
+
+
+@outbox.register(RETRACT_TOPIC)
+def deliver_retractions(payloads):
+    for payload in payloads:
+        retract(payload['post_id'], payload['profile_id'])
+
+
+def invalidate_on_commit(profile_id):
+    if enabled():
+        transaction.on_commit(lambda: invalidate(profile_id))
@@ -0,0 +1,213 @@
+"""
+Likes and follows as single-statement, idempotent writes.
+
+A link (a like, a follow) is added with ``INSERT ... ON CONFLICT DO
+NOTHING`` and removed with ``DELETE ... RETURNING``, and the subject's
+denormalized counter is moved in the same statement, so double taps and
+concurrent clients can neither hit the unique constraint nor skew the
+counter. On PostgreSQL the whole toggle is one statement of writable
+CTEs; other backends, which cannot run writes in a CTE, run the same
+steps as a few ``RETURNING`` statements in one transaction.
+
+The model signals are still sent for links that changed, flagged with
+``counted=True`` so that ``feed.signals`` leaves the counters alone and
+only runs the other side effects (notifications, caches).
+"""
+
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import CommentLike, FeedLike, Follow
+
+ADD = 'add'
+REMOVE = 'remove'
+TOGGLE = 'toggle'
+
+# ``count`` is the subject's counter after the write, or None for links without one
+Result = namedtuple('Result', ['changed', 'present', 'count'])
+
+
+class Link:
+    """A unique (subject, actor) pair and the counter it feeds on the subject"""
+
+    def __init__(self, model, subject, actor, counter=None, defaults=None):
+        self.model = model
+        self.subject = subject
+        self.actor = actor
+        self.counter = counter
+        self.defaults = defaults or {}
+
+    def names(self):
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        subject_model = meta.get_field(self.subject).related_model
+        actor_model = meta.get_field(self.actor).related_model
+        extra = ['created_at', *self.defaults]
+        return {
+            'link': quote(meta.db_table),
+            'link_pk': quote(meta.pk.column),
+            'subject_col': quote(meta.get_field(self.subject).column),
+            'actor_col': quote(meta.get_field(self.actor).column),
+            'extra_cols': ', '.join(quote(meta.get_field(name).column) for name in extra),
+            'extra_values': ', '.join(f'%(extra_{name})s' for name in extra),
+            'subjects': quote(subject_model._meta.db_table),
+            'subject_pk': quote(subject_model._meta.pk.column),
+            'actors': quote(actor_model._meta.db_table),
+            'actor_pk': quote(actor_model._meta.pk.column),
+            'counter': quote(self.counter) if self.counter else None,
+        }
+
+    def params(self, subject_id, actor_id, mode):
+        params = {
+            'subject': subject_id,
+            'actor': actor_id,
+            'add': mode != REMOVE,
+            'remove': mode != ADD,
+            'extra_created_at': timezone.now(),
+        }
+        params.update((f'extra_{name}', value) for name, value in self.defaults.items())
+        return params
+
+    def instance(self, pk, subject_id, actor_id, created_at=None):
+        return self.model(pk=pk, created_at=created_at, **{
+            f'{self.subject}_id': subject_id,
+            f'{self.actor}_id': actor_id,
+        }, **self.defaults)
+
+
+POST_LIKE = Link(FeedLike, 'post', 'profile', counter='likes_count')
+COMMENT_LIKE = Link(CommentLike, 'comment', 'profile', counter='likes_count', defaults={'is_like': True})
+FOLLOW = Link(Follow, 'following', 'follower')
+
+# Both ends exist; the subject's counter, or 0 for links without one
+CURRENT = """
+    SELECT {current} FROM {subjects}
+    WHERE {subject_pk} = %(subject)s
+      AND EXISTS (SELECT 1 FROM {actors} WHERE {actor_pk} = %(actor)s)
+"""
+
+REMOVE_SQL = """
+    DELETE FROM {link}
+    WHERE {subject_col} = %(subject)s AND {actor_col} = %(actor)s AND %(remove)s
+    RETURNING {link_pk}
+"""
+
+ADD_SQL = """
+    INSERT INTO {link} ({subject_col}, {actor_col}, {extra_cols})
+    SELECT %(subject)s, %(actor)s, {extra_values}
+    WHERE %(add)s {not_removed}
+      AND EXISTS (SELECT 1 FROM {subjects} WHERE {subject_pk} = %(subject)s)
+      AND EXISTS (SELECT 1 FROM {actors} WHERE {actor_pk} = %(actor)s)
+    ON CONFLICT ({subject_col}, {actor_col}) DO NOTHING
+    RETURNING {link_pk}
+"""
+
+COUNT_SQL = """
+    UPDATE {subjects}
+    SET {counter} = CASE WHEN {counter} + {delta} < 0 THEN 0 ELSE {counter} + {delta} END
+    WHERE {subject_pk} = %(subject)s {changed}
+    RETURNING {counter}
+"""
+
+POSTGRESQL_SQL = """
+    WITH removed AS ({remove}),
+    added AS ({add}),
+    counted AS ({count})
+    SELECT
+        (SELECT {link_pk} FROM removed),
+        (SELECT {link_pk} FROM added),
+        COALESCE((SELECT {counter} FROM counted), ({current}))
+"""
+
+
+def postgresql_write(link, names, params):
+    if link.counter is None:
+        count = 'SELECT NULL AS {counter} WHERE false'
+        names = {**names, 'counter': 'counter'}
+        current = CURRENT.format(**names, current='0')
+    else:
+        count = COUNT_SQL.format(
+            **names,
+            delta='(SELECT count(*) FROM added) - (SELECT count(*) FROM removed)',
+            changed='AND EXISTS (SELECT 1 FROM added UNION ALL SELECT 1 FROM removed)'
+        )
+        current = CURRENT.format(**names, current=names['counter'])
+    sql = POSTGRESQL_SQL.format(
+        **names,
+        remove=REMOVE_SQL.format(**names),
+        add=ADD_SQL.format(**names, not_removed='AND NOT EXISTS (SELECT 1 FROM removed)'),
+        count=count.format(**names),
+        current=current,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def sequential_write(link, names, params):
+    with connection.cursor() as cursor:
+        removed = added = None
+        if params['remove']:
+            cursor.execute(REMOVE_SQL.format(**names), params)
+            removed = (cursor.fetchone() or [None])[0]
+        if params['add'] and removed is None:
+            cursor.execute(ADD_SQL.format(**names, not_removed=''), params)
+            added = (cursor.fetchone() or [None])[0]
+        row = None
+        if link.counter is not None and (removed or added):
+            delta = '1' if added else '-1'
+            cursor.execute(COUNT_SQL.format(**names, delta=delta, changed=''), params)
+            row = cursor.fetchone()
+        if row is None:
+            current = names['counter'] if link.counter is not None else '0'
+            cursor.execute(CURRENT.format(**names, current=current), params)
+            row = cursor.fetchone()
+        return removed, added, row[0] if row else None
+
+
+def write(link, subject_id, actor_id, mode=TOGGLE):
+    """
+    Add, remove or toggle the link between ``subject_id`` and ``actor_id``.
+
+    Returns:
+        A ``Result``, or None when the subject or the actor does not exist
+    """
+    names = link.names()
+    params = link.params(subject_id, actor_id, mode)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            removed, added, count = postgresql_write(link, names, params)
+        else:
+            removed, added, count = sequential_write(link, names, params)
+        if count is None:
+            return None
+
+        if removed:
+            instance = link.instance(removed, subject_id, actor_id)
+            post_delete.send(sender=link.model, instance=instance, using=connection.alias, origin=instance, counted=True)
+        elif added:
+            instance = link.instance(added, subject_id, actor_id, params['extra_created_at'])
+            post_save.send(
+                sender=link.model, instance=instance, created=True, update_fields=None,
+                raw=False, using=connection.alias, counted=True
+            )
+
+    changed = bool(removed or added)
+    # Nothing changed: a remove found no link, an add or toggle found one (a concurrent add)
+    present = bool(added) or (not removed and mode != REMOVE)
+    return Result(changed, present, count if link.counter is not None else None)
+
+
+def add(link, subject_id, actor_id):
+    return write(link, subject_id, actor_id, ADD)
+
+
+def remove(link, subject_id, actor_id):
+    return write(link, subject_id, actor_id, REMOVE)
+
+
+def toggle(link, subject_id, actor_id):
+    return write(link, subject_id, actor_id, TOGGLE)
@@ -0,0 +1,130 @@
+"""
+Trending feed: recent posts ranked by engagement with exponential time decay.
+
+A post's score is ``(1 + LIKE_WEIGHT * likes + COMMENT_WEIGHT * comments)``
+halved every ``FEED_TRENDING_HALF_LIFE_HOURS`` of age. Decay multiplies
+every post by the same factor as time passes, so the order is kept by the
+time-independent key ``log(engagement) + created * log(2) / half_life``,
+and a stored ranking never goes stale just because the clock moved.
+
+The top ``FEED_TRENDING_SIZE`` posts of the last ``FEED_TRENDING_WINDOW_DAYS``
+are kept in the cache as a ranked list of ``(post_id, key)``. Engagement
+events re-score their post and merge it in after commit; the
+``rank_trending_feed`` command recomputes the whole ranking, which also
+drops posts that aged out of the window and repairs updates lost to
+concurrent merges. Reading a page is one cache get.
+"""
+
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import FeedPost
+
+RANKING_KEY = 'feed:trending'
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+
+
+def decay_rate():
+    """Log-score lost per second of age"""
+    return math.log(2) / (settings.FEED_TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def rank_keys(created, likes, comments):
+    """
+    Ranking keys of posts, vectorized over arrays of creation timestamps
+    (seconds) and engagement counts.
+    """
+    engagement = 1 + LIKE_WEIGHT * np.asarray(likes, dtype=float) + COMMENT_WEIGHT * np.asarray(comments, dtype=float)
+    return np.log(engagement) + np.asarray(created, dtype=float) * decay_rate()
+
+
+def score(key, now=None):
+    """Decayed score of a ranking key at ``now``"""
+    now = (now or timezone.now()).timestamp()
+    return math.exp(key - now * decay_rate())
+
+
+def window_start():
+    return timezone.now() - timedelta(days=settings.FEED_TRENDING_WINDOW_DAYS)
+
+
+def recompute():
+    """
+    Score every post in the window and store the top ones.
+
+    Returns:
+        The ranking, a list of ``[post_id, key]`` best first
+    """
+    rows = list(
+        FeedPost.objects.filter(created_at__gte=window_start())
+        .values_list('id', 'created_at', 'likes_count', 'comments_count')
+    )
+    size = settings.FEED_TRENDING_SIZE
+    if not rows:
+        ranking = []
+    else:
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        keys = rank_keys(
+            [row[1].timestamp() for row in rows],
+            [row[2] for row in rows],
+            [row[3] for row in rows],
+        )
+        top = np.argpartition(-keys, size - 1)[:size] if len(rows) > size else np.arange(len(rows))
+        # Ties go to the newer post, as they would on the plain feed
+        top = top[np.lexsort((-ids[top], -keys[top]))]
+        ranking = [[int(ids[i]), float(keys[i])] for i in top]
+    cache.set(RANKING_KEY, ranking, None)
+    return ranking
+
+
+def ranking():
+    """The stored ranking, computed on first use"""
+    stored = cache.get(RANKING_KEY)
+    if stored is None:
+        stored = recompute()
+    return stored
+
+
+def bump(post_id):
+    """Re-score one post after its engagement changed and merge it into the ranking"""
+    stored = cache.get(RANKING_KEY)
+    if stored is None:
+        # Nothing to merge into; the next read computes it from scratch
+        return
+    ranked = [entry for entry in stored if entry[0] != post_id]
+    post = FeedPost.objects.filter(
+        id=post_id, created_at__gte=window_start()
+    ).values_list('created_at', 'likes_count', 'comments_count').first()
+    if post is not None:
+        created, likes, comments = post
+        key = float(rank_keys([created.timestamp()], [likes], [comments])[0])
+        size = settings.FEED_TRENDING_SIZE
+        if len(ranked) < size or key > ranked[-1][1]:
+            ranked.append([post_id, key])
+            ranked.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+            del ranked[size:]
+    if ranked != stored:
+        cache.set(RANKING_KEY, ranked, None)
+
+
+def bump_on_commit(post_id):
+    transaction.on_commit(lambda: bump(post_id))
+
+
+def page(offset=0, limit=20):
+    """
+    One page of the ranking.
+
+    Returns:
+        ``(entries, has_more)``, entries being ``[post_id, key]``
+    """
+    ranked = ranking()
+    return ranked[offset:offset + limit], len(ranked) > offset + limit
@@ -2,8 +2,10 @@
 
 from django.urls import path
 from .views import (
-    FeedPostListView, FeedPostDetailView, FeedPostMediaView,
+    FeedPostListView, FeedPostDetailView, FeedPostMediaView, HomeTimelineView,
+    TrendingFeedView, FeedPostImpressionView,
     FollowUserView, UnfollowUserView, FollowersListView, FollowingListView,
+    ProfileFollowCountsView, FollowSuggestionsView,
     FeedLikeToggleView,
     CommentListCreateView, CommentReplyCreateView, CommentLikeCreateView,
     CommentDeleteView, CommentRepliesListView,
@@ -12,12 +14,17 @@ from .views import (
 
 urlpatterns = [
     path('posts/', FeedPostListView.as_view(), name='feedpost-list'),
+    path('timeline/', HomeTimelineView.as_view(), name='home-timeline'),
+    path('trending/', TrendingFeedView.as_view(), name='trending-feed'),
+    path('posts/impressions/', FeedPostImpressionView.as_view(), name='feedpost-impressions'),
     path('posts/<int:id>/', FeedPostDetailView.as_view(), name='feedpost-detail'),
-    path('posts/<uuid:id>/media/', FeedPostMediaView.as_view(), name='feedpost-media'),
+    path('posts/<int:id>/media/', FeedPostMediaView.as_view(), name='feedpost-media'),
     path('follow/', FollowUserView.as_view(), name='follow-user'),
     path('unfollow/', UnfollowUserView.as_view(), name='unfollow-user'),
     path('followers/', FollowersListView.as_view(), name='followers-list'),
     path('following/', FollowingListView.as_view(), name='following-list'),
+    path('profiles/<int:profile_id>/follow-counts/', ProfileFollowCountsView.as_view(), name='profile-follow-counts'),
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow-suggestions'),
     path('posts/<int:post_id>/like/', FeedLikeToggleView.as_view(), name='feed-like-toggle'),
     path('posts/<int:post_id>/comments/', CommentListCreateView.as_view(), name='comment-list-create'),
     path('posts/<int:post_id>/comments/<int:parent_id>/reply/', CommentReplyCreateView.as_view(), name='comment-reply'),
@@ -6,35 +6,47 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-import os
+from rest_framework.exceptions import APIException
+from authapp import impressions
 from userprofile.models import Profile
 from .models import Follow
-from .serializers import FollowSerializer
+from .serializers import FollowSerializer, FollowSuggestionSerializer, ImpressionSerializer
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from .models import FeedLike
 from .serializers import FeedLikeSerializer
 from .models import Comment
-from .serializers import CommentSerializer, CommentCreateSerializer
+from .serializers import CommentSerializer, CommentCreateSerializer, CommentReplySerializer
 from .models import CommentLike
 from .serializers import CommentLikeSerializer, ReplyCreateSerializer
 from django.shortcuts import get_object_or_404
 from rest_framework.generics import RetrieveUpdateDestroyAPIView
 from rest_framework.generics import ListAPIView
+from . import graph, media, timeline, toggles, trending
+from .pagination import FeedCursorPagination, ReplyCursorPagination
+
+# Everything a profile card reads, for select_related through a profile relation
+CARD_RELATED = ('user', 'headshot')
+
+
+def card_related(*paths):
+    return [f'{path}__{related}' for path in paths for related in CARD_RELATED]
 
 # Create your views here.
 
 class FeedPostViewSet(viewsets.ModelViewSet):
-    queryset = FeedPost.objects.all().order_by('-created_at')
+    queryset = FeedPost.objects.select_related(*card_related('profile')).order_by('-id')
     serializer_class = FeedPostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = FeedCursorPagination
 
 class FeedPostListView(generics.ListCreateAPIView):
     serializer_class = FeedPostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FeedCursorPagination
 
     def get_queryset(self):
-        queryset = FeedPost.objects.all().order_by('-created_at')
+        queryset = FeedPost.objects.select_related(*card_related('profile')).order_by('-id')
         profile_id = self.request.query_params.get('profile_id')
         if profile_id:
             queryset = queryset.filter(profile_id=profile_id)
@@ -44,6 +56,111 @@ class FeedPostListView(generics.ListCreateAPIView):
         # This sets the profile automatically from the logged-in user
         serializer.save(profile=self.request.user.profile)
 
+class HomeTimelineView(APIView):
+    """Posts of the profiles the user follows, and their own, newest first"""
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 50
+
+    @swagger_auto_schema(
+        operation_summary='Home timeline',
+        operation_description='Posts from followed profiles, newest first. Pass the returned "next" as "before" for the following page.',
+        manual_parameters=[
+            openapi.Parameter('before', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description='Only posts older than this post id'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description='Posts per page (default 20, max 50)'),
+        ],
+        responses={200: FeedPostSerializer(many=True)}
+    )
+    def get(self, request):
+        try:
+            profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response({'error': 'Profile not found'}, status=404)
+
+        before = request.query_params.get('before')
+        if before is not None and not before.isdigit():
+            return Response({'error': 'Invalid before. Must be a post id.'}, status=400)
+        before = int(before) if before else None
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+
+        post_ids, has_more = timeline.page(profile.id, before=before, limit=page_size)
+        posts = FeedPost.objects.filter(id__in=post_ids).select_related(*card_related('profile'))
+        by_id = {post.id: post for post in posts}
+        # Posts deleted since they were pushed are skipped
+        page = [by_id[post_id] for post_id in post_ids if post_id in by_id]
+
+        serializer = FeedPostSerializer(page, many=True, context={'request': request})
+        return Response({
+            'next': post_ids[-1] if has_more else None,
+            'results': serializer.data,
+        })
+
+class TrendingFeedView(APIView):
+    """Recent posts ranked by time-decayed engagement, from the precomputed ranking"""
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 50
+
+    @swagger_auto_schema(
+        operation_summary='Trending feed',
+        operation_description='Recent posts ranked by likes and comments, decaying with age. Pass the returned "next" as "offset" for the following page.',
+        manual_parameters=[
+            openapi.Parameter('offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description='Rank to start from (default 0)'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description='Posts per page (default 20, max 50)'),
+        ],
+        responses={200: FeedPostSerializer(many=True)}
+    )
+    def get(self, request):
+        offset = request.query_params.get('offset', '0')
+        if not offset.isdigit():
+            return Response({'error': 'Invalid offset. Must be a number.'}, status=400)
+        offset = int(offset)
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+
+        entries, has_more = trending.page(offset, page_size)
+        posts = FeedPost.objects.filter(id__in=[post_id for post_id, _ in entries]).select_related(*card_related('profile'))
+        by_id = {post.id: post for post in posts}
+        # Posts deleted since the ranking was stored are skipped
+        page = [by_id[post_id] for post_id, _ in entries if post_id in by_id]
+
+        serializer = FeedPostSerializer(page, many=True, context={'request': request})
+        return Response({
+            'next': offset + page_size if has_more else None,
+            'results': serializer.data,
+        })
+
+class FeedPostImpressionView(APIView):
+    """Count views of posts the client displayed; counts reach the posts on the next flush"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary='Record post views',
+        operation_description='Report posts shown to the user. Each user counts once per post per day; views_count is updated in the background.',
+        request_body=ImpressionSerializer,
+        responses={202: openapi.Response(description='Views accepted')}
+    )
+    def post(self, request):
+        serializer = ImpressionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            viewer = request.user.profile.id
+        except Profile.DoesNotExist:
+            return Response({'error': 'Profile not found'}, status=404)
+
+        # Ids of deleted or unknown posts are dropped when the counts are written
+        impressions.record(FeedPost, set(serializer.validated_data['post_ids']), viewer)
+        return Response(status=status.HTTP_202_ACCEPTED)
+
 class FeedPostDetailView(RetrieveUpdateDestroyAPIView):
     queryset = FeedPost.objects.all()
     serializer_class = FeedPostSerializer
@@ -55,20 +172,29 @@ class FeedPostMediaView(APIView):
     def delete(self, request, *args, **kwargs):
         post_id = kwargs.get('id')
         try:
-            post = FeedPost.objects.get(id=post_id)
+            post = FeedPost.objects.select_related('profile').get(id=post_id)
         except FeedPost.DoesNotExist:
             return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        if post.media_url:
-            try:
-                if os.path.isfile(post.media_url.path):
-                    os.remove(post.media_url.path)
-                post.media_url = None
-                post.save()
-                return Response({"message": "Media deleted successfully"}, status=status.HTTP_200_OK)
-            except Exception as e:
-                return Response({"error": f"Error deleting media: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response({"message": "No media to delete"}, status=status.HTTP_200_OK)
+        if post.profile.user_id != request.user.id:
+            return Response({"error": "You can only delete media of your own posts"}, status=status.HTTP_403_FORBIDDEN)
+
+        if not post.media:
+            return Response({"message": "No media to delete"}, status=status.HTTP_200_OK)
+
+        post.media.delete(save=False)
+        if post.media_renditions:
+            media.discard(post)
+        post.media_renditions = {}
+        post.media_status = ''
+        post.save(update_fields=['media', 'media_renditions', 'media_status', 'updated_at'])
+        return Response({"message": "Media deleted successfully"}, status=status.HTTP_200_OK)
+
+def follow_ids(request):
+    """``(profile_id, following_id)`` from the request body, or None when missing or not numbers"""
+    try:
+        return int(request.data['profile_id']), int(request.data['following_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
 
 class FollowUserView(APIView):
     permission_classes = [IsAuthenticated]
@@ -90,7 +216,18 @@ class FollowUserView(APIView):
                 schema=openapi.Schema(
                     type=openapi.TYPE_OBJECT,
                     properties={
-                        'message': openapi.Schema(type=openapi.TYPE_STRING, example='Followed successfully.')
+                        'message': openapi.Schema(type=openapi.TYPE_STRING, example='Followed successfully.'),
+                        'follower_count': openapi.Schema(type=openapi.TYPE_INTEGER, example=12)
+                    }
+                )
+            ),
+            200: openapi.Response(
+                description="Already following; nothing changed",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'message': openapi.Schema(type=openapi.TYPE_STRING, example='Already following this profile.'),
+                        'follower_count': openapi.Schema(type=openapi.TYPE_INTEGER, example=12)
                     }
                 )
             ),
@@ -99,7 +236,7 @@ class FollowUserView(APIView):
                 schema=openapi.Schema(
                     type=openapi.TYPE_OBJECT,
                     properties={
-                        'error': openapi.Schema(type=openapi.TYPE_STRING, example='Already following this profile')
+                        'error': openapi.Schema(type=openapi.TYPE_STRING, example='profile_id and following_id are required')
                     }
                 )
             ),
@@ -115,56 +252,42 @@ class FollowUserView(APIView):
         }
     )
     def post(self, request, *args, **kwargs):
-        profile_id = request.data.get('profile_id')
-        following_id = request.data.get('following_id')
-        if not profile_id or not following_id:
+        ids = follow_ids(request)
+        if ids is None:
             return Response({'error': 'profile_id and following_id are required'}, status=400)
-        try:
-            follower = Profile.objects.get(id=profile_id)
-            following = Profile.objects.get(id=following_id)
-        except Profile.DoesNotExist:
+        follower_id, following_id = ids
+
+        # One idempotent insert; repeating it is not an error
+        result = toggles.add(toggles.FOLLOW, following_id, follower_id)
+        if result is None:
             return Response({'error': 'Profile not found'}, status=404)
-        
-        # Check if already following
-        if Follow.objects.filter(follower=follower, following=following).exists():
+
+        follower_count = graph.counts(following_id)['followers']
+        if not result.changed:
             return Response({
-                'error': 'Already following this profile'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create follow relationship
-        Follow.objects.create(follower=follower, following=following)
-        
+                'message': 'Already following this profile.',
+                'follower_count': follower_count
+            }, status=status.HTTP_200_OK)
         return Response({
-            'message': 'Followed successfully.'
+            'message': 'Followed successfully.',
+            'follower_count': follower_count
         }, status=status.HTTP_201_CREATED)
 
 class UnfollowUserView(APIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, *args, **kwargs):
-        profile_id = request.data.get('profile_id')
-        following_id = request.data.get('following_id')
-        if not profile_id or not following_id:
+        ids = follow_ids(request)
+        if ids is None:
             return Response({'error': 'profile_id and following_id are required'}, status=400)
-        try:
-            user_profile = Profile.objects.get(id=profile_id)
-            following_profile = Profile.objects.get(id=following_id)
-        except Profile.DoesNotExist:
-            return Response({'error': 'Profile not found'}, status=404)
-
-        follow_relationship = Follow.objects.filter(
-            follower=user_profile, 
-            following=following_profile
-        ).first()
+        follower_id, following_id = ids
 
-        if not follow_relationship:
-            return Response({
-                'error': 'Not following this profile'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        follow_relationship.delete()
+        result = toggles.remove(toggles.FOLLOW, following_id, follower_id)
+        if result is None:
+            return Response({'error': 'Profile not found'}, status=404)
         return Response({
-            'message': 'Unfollowed successfully.'
+            'message': 'Unfollowed successfully.' if result.changed else 'Not following this profile.',
+            'follower_count': graph.counts(following_id)['followers']
         }, status=status.HTTP_200_OK)
 
 class FollowersListView(APIView):
@@ -192,17 +315,24 @@ class FollowersListView(APIView):
                 # If no profile_id provided, use current user's profile
                 target_profile = request.user.profile
             
-            # Get followers
-            followers = Follow.objects.filter(following=target_profile)
-            serializer = FollowSerializer(followers, many=True)
-            
-            return Response(serializer.data)
+            # Get followers, a page at a time
+            followers = Follow.objects.filter(
+                following=target_profile
+            ).select_related(*card_related('follower', 'following'))
+            paginator = FeedCursorPagination()
+            page = paginator.paginate_queryset(followers, request, view=self)
+            serializer = FollowSerializer(page, many=True)
+
+            return paginator.get_paginated_response(serializer.data)
             
         except Profile.DoesNotExist:
             return Response(
                 {"error": "Profile not found"}, 
                 status=404
             )
+        except APIException:
+            # e.g. an invalid cursor; let DRF render it
+            raise
         except Exception as e:
             return Response(
                 {"error": f"An error occurred: {str(e)}"}, 
@@ -234,17 +364,24 @@ class FollowingListView(APIView):
                 # If no profile_id provided, use current user's profile
                 target_profile = request.user.profile
             
-            # Get following
-            following = Follow.objects.filter(follower=target_profile)
-            serializer = FollowSerializer(following, many=True)
-            
-            return Response(serializer.data)
+            # Get following, a page at a time
+            following = Follow.objects.filter(
+                follower=target_profile
+            ).select_related(*card_related('follower', 'following'))
+            paginator = FeedCursorPagination()
+            page = paginator.paginate_queryset(following, request, view=self)
+            serializer = FollowSerializer(page, many=True)
+
+            return paginator.get_paginated_response(serializer.data)
             
         except Profile.DoesNotExist:
             return Response(
                 {"error": "Profile not found"}, 
                 status=404
             )
+        except APIException:
+            # e.g. an invalid cursor; let DRF render it
+            raise
         except Exception as e:
             return Response(
                 {"error": f"An error occurred: {str(e)}"}, 
@@ -263,7 +400,7 @@ class FeedLikeToggleView(APIView):
             
             return Response({
                 'has_liked': has_liked,
-                'likes_count': post.likes.count()
+                'likes_count': post.likes_count
             })
         except FeedPost.DoesNotExist:
             return Response({'error': 'Post not found'}, status=404)
@@ -271,31 +408,20 @@ class FeedLikeToggleView(APIView):
     def post(self, request, post_id):
         """Toggle like/unlike for a post"""
         try:
-            post = FeedPost.objects.get(id=post_id)
             user_profile = request.user.profile
-            
-            # Check if user already liked this post
-            existing_like = FeedLike.objects.filter(post=post, profile=user_profile).first()
-            
-            if existing_like:
-                # Unlike: delete the existing like
-                existing_like.delete()
-                action = 'unliked'
-            else:
-                # Like: create a new like
-                FeedLike.objects.create(post=post, profile=user_profile)
-                action = 'liked'
-            
-            return Response({
-                'action': action,
-                'has_liked': not existing_like,  # True if we just liked, False if we just unliked
-                'likes_count': post.likes.count()
-            })
-            
-        except FeedPost.DoesNotExist:
+        except Profile.DoesNotExist:
+            return Response({'error': 'Profile not found'}, status=404)
+
+        # Delete-or-insert and counter update in one statement; safe to double tap
+        result = toggles.toggle(toggles.POST_LIKE, post_id, user_profile.id)
+        if result is None:
             return Response({'error': 'Post not found'}, status=404)
-        except Exception as e:
-            return Response({'error': str(e)}, status=500)
+
+        return Response({
+            'action': 'liked' if result.present else 'unliked',
+            'has_liked': result.present,
+            'likes_count': result.count
+        })
 
 # class CommentListCreateView(generics.ListCreateAPIView):
 #     serializer_class = CommentCreateSerializer
@@ -311,10 +437,11 @@ class FeedLikeToggleView(APIView):
 
 class CommentListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedCursorPagination
 
     def get_queryset(self):
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id, parent=None).order_by('-created_at')
+        return Comment.objects.filter(post_id=post_id, parent=None).select_related('profile__user').order_by('-id')
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -361,6 +488,15 @@ class CommentReplyCreateView(generics.CreateAPIView):
         headers = self.get_success_headers(serializer.data)
         return Response(full_serializer.data, status=201, headers=headers)
 
+COMMENT_LIKE_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'message': openapi.Schema(type=openapi.TYPE_STRING, example='Comment liked successfully.'),
+        'has_liked': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+        'likes_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+    }
+)
+
 class CommentLikeCreateView(generics.CreateAPIView):
     serializer_class = CommentLikeSerializer
     permission_classes = [IsAuthenticated]
@@ -376,41 +512,42 @@ class CommentLikeCreateView(generics.CreateAPIView):
         ),
         responses={
             200: openapi.Response(
-                description="Comment like toggled successfully.",
-                schema=CommentLikeSerializer()
+                description="Nothing to change: already liked, or not liked.",
+                schema=COMMENT_LIKE_SCHEMA
             ),
             201: openapi.Response(
                 description="Comment liked successfully.",
-                schema=CommentLikeSerializer()
+                schema=COMMENT_LIKE_SCHEMA
             ),
-            400: openapi.Response(description="Validation Error"),
-            401: openapi.Response(description="Authentication Required")
+            401: openapi.Response(description="Authentication Required"),
+            404: openapi.Response(description="Comment not found")
         }
     )
     def post(self, request, *args, **kwargs):
         comment_id = self.kwargs['comment_id']
-        profile = self.request.user.profile
+        try:
+            profile = self.request.user.profile
+        except Profile.DoesNotExist:
+            return Response({'error': 'Profile not found'}, status=404)
         is_like = request.data.get('is_like', True)
+        if isinstance(is_like, str):
+            is_like = is_like.lower() not in ('false', '0', '')
 
-        # Try to find an existing like
-        existing_like = CommentLike.objects.filter(comment_id=comment_id, profile=profile).first()
+        # Idempotent: liking twice or unliking twice is not an error
+        write = toggles.add if is_like else toggles.remove
+        result = write(toggles.COMMENT_LIKE, comment_id, profile.id)
+        if result is None:
+            return Response({'error': 'Comment not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if existing_like:
-            # If is_like is False or user wants to unlike, delete the like
-            if not is_like:
-                existing_like.delete()
-                return Response({'message': 'Comment unliked successfully.'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'message': 'Comment already liked.'}, status=status.HTTP_200_OK)
+        if is_like:
+            message = 'Comment liked successfully.' if result.changed else 'Comment already liked.'
         else:
-            # If is_like is True or not provided, create a like
-            if is_like:
-                serializer = self.get_serializer(data={'comment': comment_id, 'is_like': True})
-                serializer.is_valid(raise_exception=True)
-                serializer.save(profile=profile)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            else:
-                return Response({'message': 'Comment is not liked yet.'}, status=status.HTTP_400_BAD_REQUEST)
+            message = 'Comment unliked successfully.' if result.changed else 'Comment is not liked yet.'
+        return Response({
+            'message': message,
+            'has_liked': result.present,
+            'likes_count': result.count
+        }, status=status.HTTP_201_CREATED if is_like and result.changed else status.HTTP_200_OK)
 
 class CommentDeleteView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
@@ -464,22 +601,50 @@ class CommentDeleteView(generics.DestroyAPIView):
 
 class ProfileFollowCountsView(APIView):
     def get(self, request, profile_id):
-        profile = Profile.objects.get(id=profile_id)
-        follower_count = profile.followers.count()
-        following_count = profile.following.count()
+        if not Profile.objects.filter(id=profile_id).exists():
+            return Response({"error": "Profile not found"}, status=404)
+        counts = graph.counts(profile_id)
         return Response({
-            "follower_count": follower_count,
-            "following_count": following_count
+            "follower_count": counts['followers'],
+            "following_count": counts['following']
         })
 
+class FollowSuggestionsView(APIView):
+    """Precomputed "who to follow" for the current user"""
+    permission_classes = [IsAuthenticated]
+    max_page_size = 50
+
+    @swagger_auto_schema(
+        operation_summary='Who to follow',
+        operation_description='Profiles followed by the profiles you follow, ranked by how many of them follow each one. Refreshed by a periodic job.',
+        manual_parameters=[
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description=f'Number of suggestions (default {graph.SUGGESTION_COUNT}, max 50)'),
+        ],
+        responses={200: FollowSuggestionSerializer(many=True)}
+    )
+    def get(self, request):
+        try:
+            profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response({'error': 'Profile not found'}, status=404)
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', graph.SUGGESTION_COUNT)), 1), self.max_page_size)
+        except ValueError:
+            page_size = graph.SUGGESTION_COUNT
+
+        entries = graph.suggestions(profile.id, page_size).select_related(*card_related('suggested'))
+        return Response(FollowSuggestionSerializer(entries, many=True).data)
+
 class CommentRepliesListView(generics.ListAPIView):
-    serializer_class = CommentSerializer
+    serializer_class = CommentReplySerializer
     permission_classes = [permissions.AllowAny]  # or IsAuthenticated if needed
+    pagination_class = ReplyCursorPagination
 
     @swagger_auto_schema(
         operation_summary='List replies to a comment',
-        operation_description='Get all replies for a specific comment by parent_id',
-        responses={200: CommentSerializer(many=True)}
+        operation_description='Get the replies of a specific comment by parent_id, oldest first, a page at a time',
+        responses={200: CommentReplySerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
         """List replies to a comment"""
@@ -487,11 +652,12 @@ class CommentRepliesListView(generics.ListAPIView):
 
     def get_queryset(self):
         parent_id = self.kwargs['parent_id']
-        return Comment.objects.filter(parent_id=parent_id).order_by('created_at')
+        return Comment.objects.filter(parent_id=parent_id).select_related('profile__user').order_by('id')
 
 class CommentLikeListView(generics.ListAPIView):
     serializer_class = CommentLikeSerializer
     permission_classes = [permissions.AllowAny]  # or IsAuthenticated if you want
+    pagination_class = FeedCursorPagination
 
     @swagger_auto_schema(
         operation_summary='List likes for a comment',
@@ -503,4 +669,4 @@ class CommentLikeListView(generics.ListAPIView):
 
     def get_queryset(self):
         comment_id = self.kwargs['comment_id']
-        return CommentLike.objects.filter(comment_id=comment_id)
+        return CommentLike.objects.filter(comment_id=comment_id).select_related(*card_related('profile'))
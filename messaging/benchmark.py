@@ -0,0 +1,439 @@
+"""
+Messaging load benchmark.
+
+``seed`` fills the database with synthetic profiles, direct threads and
+messages at a chosen scale; ``run`` replays the hot messaging requests
+(inbox, inbox revalidation, thread open, send, mark read) against the real
+views and reports latency percentiles, queries per request and throughput.
+Results are plain dicts so they can be saved as JSON and compared with a
+previous run by ``regressions``.
+
+Requests are dispatched straight to the resolved views, without the
+middleware stack or the rate limits, so the numbers measure
+``messaging.views`` and the queries behind it.
+"""
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from userprofile.models import Profile
+
+from . import membership
+from .models import Message, MessageThread, ThreadParticipantState
+
+User = get_user_model()
+
+# Seeded accounts are recognised (and cleared) by this email domain
+EMAIL_DOMAIN = 'bench.invalid'
+PASSWORD = 'bench-password'
+
+SCENARIOS = ('inbox', 'inbox_poll', 'thread_open', 'send', 'mark_read')
+
+WORDS = (
+    'hello', 'thanks', 'tomorrow', 'meeting', 'contract', 'audition', 'schedule',
+    'photo', 'shoot', 'rate', 'available', 'studio', 'call', 'script', 'location',
+    'weekend', 'confirm', 'invoice', 'great', 'sorry', 'later', 'agency', 'casting',
+)
+
+
+def seeded_profiles():
+    return Profile.objects.filter(user__email__endswith=f'@{EMAIL_DOMAIN}')
+
+
+def seed(profiles=1000, threads=5000, messages=100000, read_ratio=0.7,
+         batch_size=5000, random_seed=0, log=None):
+    """
+    Create ``profiles`` accounts, ``threads`` direct conversations between
+    random pairs of them and ``messages`` spread over those conversations.
+
+    Everything is inserted with ``bulk_create``; the denormalized thread and
+    read state (last message, watermarks, unread counts) is then filled in
+    with set-based updates. A ``read_ratio`` share of participants has read
+    their conversation up to the newest message.
+
+    Messages get their creation time at insert, so history order follows ids.
+
+    Returns:
+        dict of the number of rows created per kind
+    """
+    log = log or (lambda text: None)
+    rng = random.Random(random_seed)
+    if profiles < 2:
+        raise ValueError('At least two profiles are needed')
+    threads = min(threads, profiles * (profiles - 1) // 2)
+
+    # Accounts: hash the shared password once rather than per user
+    password = make_password(PASSWORD)
+    start = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').count()
+    for offset in range(0, profiles, batch_size):
+        users = User.objects.bulk_create([
+            User(
+                email=f'user{start + i}@{EMAIL_DOMAIN}',
+                username=f'bench_user{start + i}',
+                name=f'Bench User {start + i}',
+                password=password,
+            )
+            for i in range(offset, min(offset + batch_size, profiles))
+        ])
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+        log(f'Created {min(offset + batch_size, profiles)} profiles')
+    profile_ids = list(
+        seeded_profiles().order_by('-id').values_list('id', flat=True)[:profiles]
+    )
+
+    # Direct threads between distinct random pairs
+    pairs = set()
+    while len(pairs) < threads:
+        a, b = rng.sample(profile_ids, 2)
+        pairs.add((min(a, b), max(a, b)))
+    pairs = list(pairs)
+
+    Participant = MessageThread.participants.through
+    thread_pairs = []
+    for offset in range(0, len(pairs), batch_size):
+        chunk = pairs[offset:offset + batch_size]
+        created = MessageThread.objects.bulk_create([
+            MessageThread(
+                title=f'Conversation {a} / {b}',
+                participant_key=MessageThread.make_participant_key([a, b])
+            )
+            for a, b in chunk
+        ])
+        if created and created[0].pk is None:
+            by_key = dict(
+                MessageThread.objects.filter(
+                    participant_key__in=[thread.participant_key for thread in created],
+                    is_active=True
+                ).values_list('participant_key', 'id')
+            )
+            for thread in created:
+                thread.pk = by_key[thread.participant_key]
+        rows = [(thread.pk, pair) for thread, pair in zip(created, chunk)]
+        Participant.objects.bulk_create([
+            Participant(messagethread_id=thread_id, profile_id=profile_id)
+            for thread_id, pair in rows
+            for profile_id in pair
+        ])
+        ThreadParticipantState.objects.bulk_create([
+            ThreadParticipantState(thread_id=thread_id, profile_id=profile_id)
+            for thread_id, pair in rows
+            for profile_id in pair
+        ])
+        thread_pairs += rows
+        log(f'Created {len(thread_pairs)} threads')
+    membership.invalidate(thread_id for thread_id, _ in thread_pairs)
+
+    # Messages, each in a random thread from a random side of it
+    for offset in range(0, messages, batch_size):
+        batch = []
+        for _ in range(min(batch_size, messages - offset)):
+            thread_id, pair = rng.choice(thread_pairs)
+            sender, receiver = pair if rng.random() < 0.5 else pair[::-1]
+            batch.append(Message(
+                thread_id=thread_id,
+                sender_id=sender,
+                receiver_id=receiver,
+                message=' '.join(rng.choices(WORDS, k=rng.randint(3, 30))),
+            ))
+        Message.objects.bulk_create(batch)
+        log(f'Created {offset + len(batch)} messages')
+
+    # Denormalized thread and read state
+    thread_ids = [thread_id for thread_id, _ in thread_pairs]
+    newest = Message.objects.filter(thread=OuterRef('pk')).order_by('-id').values('id')[:1]
+    for offset in range(0, len(thread_ids), 1000):
+        MessageThread.objects.filter(id__in=thread_ids[offset:offset + 1000]).update(
+            last_message=Subquery(newest)
+        )
+
+    state_ids = list(
+        ThreadParticipantState.objects.filter(thread_id__in=thread_ids).values_list('id', flat=True)
+    )
+    rng.shuffle(state_ids)
+    read_count = int(len(state_ids) * read_ratio)
+    last_message = MessageThread.objects.filter(pk=OuterRef('thread_id')).values('last_message_id')[:1]
+    from_others = Message.objects.filter(
+        thread=OuterRef('thread_id')
+    ).exclude(
+        sender=OuterRef('profile_id')
+    ).order_by().values('thread').annotate(total=Count('id')).values('total')[:1]
+    read_ids, unread_ids = state_ids[:read_count], state_ids[read_count:]
+    for offset in range(0, len(read_ids), 1000):
+        ThreadParticipantState.objects.filter(id__in=read_ids[offset:offset + 1000]).update(
+            last_read_message_id=Coalesce(Subquery(last_message), 0),
+            unread_count=0,
+            updated_at=timezone.now()
+        )
+    for offset in range(0, len(unread_ids), 1000):
+        ThreadParticipantState.objects.filter(id__in=unread_ids[offset:offset + 1000]).update(
+            last_read_message_id=0,
+            unread_count=Coalesce(Subquery(from_others), 0),
+            updated_at=timezone.now()
+        )
+    log('Filled in thread and read state')
+
+    return {'profiles': len(profile_ids), 'threads': len(thread_pairs), 'messages': messages}
+
+
+def clear(batch_size=500, log=None):
+    """Delete everything ``seed`` created, a batch of threads at a time"""
+    log = log or (lambda text: None)
+    profiles = seeded_profiles()
+    thread_ids = list(
+        MessageThread.objects.filter(participants__in=profiles).values_list('id', flat=True).distinct()
+    )
+    for offset in range(0, len(thread_ids), batch_size):
+        chunk = thread_ids[offset:offset + batch_size]
+        with transaction.atomic():
+            MessageThread.objects.filter(id__in=chunk).update(last_message=None)
+            Message.objects.filter(thread_id__in=chunk).delete()
+            MessageThread.objects.filter(id__in=chunk).delete()
+        log(f'Deleted {offset + len(chunk)} threads')
+    membership.invalidate(thread_ids)
+    deleted, _ = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+    log(f'Deleted seeded accounts ({deleted} rows)')
+
+
+@contextmanager
+def throttling_disabled(views):
+    """Take the rate limits off ``views`` for the duration of a run"""
+    saved = [(view, view.throttle_classes) for view in views]
+    for view, _ in saved:
+        view.throttle_classes = ()
+    try:
+        yield
+    finally:
+        for view, throttle_classes in saved:
+            view.throttle_classes = throttle_classes
+
+
+class Runner:
+    """Dispatches API requests to the resolved views as a given profile"""
+
+    def __init__(self):
+        self.factory = APIRequestFactory()
+
+    def view_class(self, name, **kwargs):
+        return resolve(reverse(name, kwargs=kwargs)).func.view_class
+
+    def call(self, profile, method, name, kwargs=None, data=None, headers=None):
+        """
+        Returns:
+            ``(response, seconds, queries)`` of one request, rendering included
+        """
+        path = reverse(name, kwargs=kwargs or {})
+        match = resolve(path)
+        request = getattr(self.factory, method)(path, data=data, format='json', **(headers or {}))
+        force_authenticate(request, user=profile.user)
+
+        with CountQueries() as counter:
+            started = time.perf_counter()
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            elapsed = time.perf_counter() - started
+        return response, elapsed, counter.count
+
+
+class CountQueries:
+    """Count the statements run on the default connection"""
+
+    def __enter__(self):
+        self.count = 0
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+
+def percentile(cuts, p):
+    return round(cuts[p - 1], 3)
+
+
+def summarize(samples, ok):
+    """Latency percentiles, query counts and throughput of one scenario"""
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    else:
+        cuts = latencies * 99
+    total = sum(seconds for seconds, _, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status in samples if status not in ok),
+        'p50_ms': percentile(cuts, 50),
+        'p95_ms': percentile(cuts, 95),
+        'p99_ms': percentile(cuts, 99),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries_mean': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+        'throughput_rps': round(len(samples) / total, 1) if total else None,
+    }
+
+
+def load_participants(sample_size, rng):
+    """
+    A sample of seeded profiles that take part in conversations, each with
+    its threads, the other side of each and the newest message it received.
+    """
+    Participant = MessageThread.participants.through
+    candidates = list(
+        Participant.objects.filter(
+            profile__in=seeded_profiles(),
+            messagethread__is_active=True
+        ).values_list('profile_id', flat=True).distinct()
+    )
+    if not candidates:
+        raise ValueError('No seeded conversations; run seed_messaging first')
+    chosen = rng.sample(candidates, min(sample_size, len(candidates)))
+    profiles = {
+        profile.id: {'profile': profile, 'threads': [], 'received': None}
+        for profile in Profile.objects.filter(id__in=chosen).select_related('user')
+    }
+    joined = Participant.objects.filter(
+        profile_id__in=chosen,
+        messagethread__is_active=True
+    ).values_list('messagethread_id', 'profile_id')
+    viewers = {}
+    for thread_id, profile_id in joined:
+        viewers.setdefault(thread_id, []).append(profile_id)
+    others = Participant.objects.filter(messagethread_id__in=list(viewers)).values_list('messagethread_id', 'profile_id')
+    for thread_id, other in others:
+        for viewer in viewers[thread_id]:
+            if other != viewer:
+                profiles[viewer]['threads'].append((thread_id, other))
+    received = Message.objects.filter(receiver_id__in=chosen).values('receiver_id').annotate(newest=Max('id'))
+    for row in received:
+        profiles[row['receiver_id']]['received'] = row['newest']
+    return list(profiles.values())
+
+
+def run(requests=200, warmup=10, scenarios=SCENARIOS, sample_size=200, random_seed=0, log=None):
+    """
+    Time ``requests`` calls of each scenario, after ``warmup`` untimed ones,
+    as profiles drawn from a sample of the seeded ones.
+
+    ``send`` and ``mark_read`` write to the database like real traffic does.
+
+    Returns:
+        dict with the dataset size and a summary per scenario
+    """
+    log = log or (lambda text: None)
+    rng = random.Random(random_seed)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    participants = load_participants(sample_size, rng)
+    runner = Runner()
+
+    def inbox(ctx):
+        return runner.call(ctx['profile'], 'get', 'thread-list')
+
+    def inbox_poll(ctx):
+        # The client already holds the current inbox and revalidates it
+        response, _, _ = runner.call(ctx['profile'], 'get', 'thread-list')
+        return runner.call(
+            ctx['profile'], 'get', 'thread-list',
+            headers={'HTTP_IF_NONE_MATCH': response.get('ETag', '')}
+        )
+
+    def thread_open(ctx):
+        thread_id, _ = rng.choice(ctx['threads'])
+        return runner.call(ctx['profile'], 'get', 'thread-detail', {'thread_id': thread_id})
+
+    def send(ctx):
+        _, receiver_id = rng.choice(ctx['threads'])
+        return runner.call(ctx['profile'], 'post', 'message-list', data={
+            'receiver_id': receiver_id,
+            'message': ' '.join(rng.choices(WORDS, k=rng.randint(3, 30))),
+        })
+
+    def mark_read(ctx):
+        return runner.call(
+            ctx['profile'], 'patch', 'message-detail', {'message_id': ctx['received']},
+            data={'is_read': True}
+        )
+
+    handlers = {
+        'inbox': (inbox, {200}),
+        'inbox_poll': (inbox_poll, {200, 304}),
+        'thread_open': (thread_open, {200}),
+        'send': (send, {201}),
+        'mark_read': (mark_read, {200}),
+    }
+    views = {
+        runner.view_class('thread-list'),
+        runner.view_class('thread-detail', thread_id=1),
+        runner.view_class('message-list'),
+        runner.view_class('message-detail', message_id=1),
+    }
+
+    results = {}
+    with throttling_disabled(views):
+        for name in scenarios:
+            handler, ok = handlers[name]
+            eligible = [ctx for ctx in participants if name != 'mark_read' or ctx['received']]
+            samples = []
+            for i in range(warmup + requests):
+                response, seconds, queries = handler(rng.choice(eligible))
+                if i >= warmup:
+                    samples.append((seconds, queries, response.status_code))
+            results[name] = summarize(samples, ok)
+            log(f"{name}: p50 {results[name]['p50_ms']} ms, p95 {results[name]['p95_ms']} ms, "
+                f"{results[name]['queries_mean']} queries")
+
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'dataset': {
+            'profiles': seeded_profiles().count(),
+            'threads': MessageThread.objects.filter(participants__in=seeded_profiles()).distinct().count(),
+            'messages': Message.objects.count(),
+        },
+        'settings': {'requests': requests, 'warmup': warmup, 'sample_size': len(participants)},
+        'scenarios': results,
+    }
+
+
+def regressions(results, baseline, tolerance=0.2):
+    """
+    Compare a run with a previous one.
+
+    A scenario regresses when it runs more queries per request, fails more
+    often, or its p95 latency grows by more than ``tolerance``.
+
+    Returns:
+        list of human-readable regression descriptions
+    """
+    found = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if current['queries_max'] > previous['queries_max']:
+            found.append(f"{name}: up to {current['queries_max']} queries per request "
+                         f"(was {previous['queries_max']})")
+        if current['errors'] > previous['errors']:
+            found.append(f"{name}: {current['errors']} errors (was {previous['errors']})")
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {current['p95_ms']} ms (was {previous['p95_ms']} ms)")
+    return found
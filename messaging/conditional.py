@@ -0,0 +1,80 @@
+"""
+Conditional GET for the polled thread endpoints.
+
+The ETag summarizes everything a thread listing shows: thread and
+read-state timestamps, deletions, membership, and presence. Computing it
+costs a few aggregate queries and cache reads, so an unchanged inbox is
+answered with 304 before anything is serialized.
+
+No Last-Modified is sent and If-Modified-Since is not honoured. Presence,
+typing and membership changes have no timestamp, a thread leaving the
+listing can move the newest timestamp backwards, and HTTP dates only have
+one-second resolution, so a date cannot tell a client its copy is current.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from . import presence
+from .models import MessageThread, MessageTombstone, ThreadParticipantState
+
+
+def thread_validators(profile, threads, extra=''):
+    """
+    ETag of ``threads`` as seen by ``profile``.
+
+    Args:
+        profile: Viewing profile
+        threads: Queryset of the threads the response covers
+        extra: Anything else the response depends on, such as page parameters
+
+    Returns:
+        Quoted strong ETag
+    """
+    thread_ids = threads.values('id')
+    stats = threads.aggregate(count=Count('id'), updated=Max('updated_at'))
+    states_updated = ThreadParticipantState.objects.filter(
+        thread__in=thread_ids
+    ).aggregate(updated=Max('updated_at'))['updated']
+    deleted = MessageTombstone.objects.filter(
+        thread__in=thread_ids
+    ).aggregate(deleted=Max('deleted_at'))['deleted']
+
+    pairs = list(
+        MessageThread.participants.through.objects.filter(
+            messagethread__in=thread_ids
+        ).values_list('messagethread_id', 'profile_id')
+    )
+    # Only who is online is shown; heartbeat times change on every ping
+    online = sorted(presence.last_seen(profile_id for _, profile_id in pairs))
+    typing = sorted(
+        (thread_id, sorted(profile_ids))
+        for thread_id, profile_ids in presence.typing(pairs).items()
+    )
+
+    timestamps = [t for t in (stats['updated'], states_updated, deleted) if t is not None]
+
+    fingerprint = '|'.join(str(part) for part in (
+        profile.id,
+        stats['count'],
+        len(pairs),
+        *timestamps,
+        online,
+        typing,
+        extra,
+    ))
+    return '"%s"' % hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+def not_modified(request, etag):
+    """The 304 response when the client's copy is still current, otherwise None"""
+    return get_conditional_response(request, etag=etag)
+
+
+def set_validators(response, etag):
+    response['ETag'] = etag
+    # Per-user data: clients may keep it, but must revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,73 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from userprofile.models import Profile
+from . import presence
+from .models import MessageThread
+from .realtime import profile_group_name
+
+
+class MessagingConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Delivers new messages, read receipts and thread updates to a profile.
+
+    Clients keep sending messages over the REST API. Over the socket they
+    only send a ``ping`` keep-alive, which doubles as the presence heartbeat,
+    and ``typing`` updates: ``{"type": "typing", "thread_id": 1, "typing": true}``.
+    """
+    group_name = None
+    profile_id = None
+
+    @database_sync_to_async
+    def heartbeat(self):
+        presence.heartbeat_and_announce(self.profile_id)
+
+    @database_sync_to_async
+    def set_typing(self, thread_id, is_typing):
+        thread = MessageThread.objects.filter(id=thread_id, is_active=True).only('id').first()
+        if thread and thread.has_participant(Profile(pk=self.profile_id)):
+            presence.set_typing(thread, self.profile_id, is_typing)
+
+    @database_sync_to_async
+    def get_profile_id(self, user):
+        return Profile.objects.filter(user=user).values_list('id', flat=True).first()
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        profile_id = await self.get_profile_id(user)
+        if profile_id is None:
+            await self.close(code=4403)
+            return
+
+        if self.channel_layer is None:
+            # Realtime is disabled (no channel layer configured); clients poll instead
+            await self.close(code=4503)
+            return
+
+        self.profile_id = profile_id
+        self.group_name = profile_group_name(profile_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.heartbeat()
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get('type')
+        if message_type == 'ping':
+            await self.heartbeat()
+            await self.send_json({'type': 'pong'})
+        elif message_type == 'typing':
+            try:
+                thread_id = int(content.get('thread_id'))
+            except (TypeError, ValueError):
+                return
+            await self.set_typing(thread_id, bool(content.get('typing', True)))
+
+    async def messaging_event(self, event):
+        await self.send_json({'type': event['event'], 'data': event['data']})
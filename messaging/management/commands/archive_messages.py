@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from messaging.models import ArchivedMessage, Message
+
+
+class Command(BaseCommand):
+    help = 'Move old messages from the active table into the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.MESSAGING_ARCHIVE_AFTER_DAYS,
+            help='Archive messages older than this many days'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of messages moved per transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many messages are old enough'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = Message.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f'{count} messages are older than {cutoff:%Y-%m-%d %H:%M}')
+            return
+
+        total = 0
+        while True:
+            moved = ArchivedMessage.objects.archive_before(cutoff, batch_size=options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            self.stdout.write(f'Archived {total} messages...')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} messages older than {cutoff:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure latency and queries per request of the messaging endpoints on seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Timed requests per scenario'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help='Untimed requests per scenario before measuring'
+        )
+        parser.add_argument(
+            '--scenarios',
+            default=','.join(benchmark.SCENARIOS),
+            help=f"Comma-separated scenarios to run ({', '.join(benchmark.SCENARIOS)})"
+        )
+        parser.add_argument(
+            '--sample-size',
+            type=int,
+            default=200,
+            help='Number of seeded profiles the requests are made as'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed, for a reproducible request mix'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results JSON of a previous run; fail when this run regresses against it'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed relative growth of p95 latency over the baseline'
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        try:
+            results = benchmark.run(
+                requests=options['requests'],
+                warmup=options['warmup'],
+                scenarios=[name.strip() for name in options['scenarios'].split(',') if name.strip()],
+                sample_size=options['sample_size'],
+                random_seed=options['seed'],
+                log=self.stdout.write
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        else:
+            self.stdout.write(json.dumps(results, indent=2))
+
+        if baseline is not None:
+            found = benchmark.regressions(results, baseline, tolerance=options['tolerance'])
+            if found:
+                raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(found))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic profiles, threads and messages for the messaging benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=1000,
+            help='Number of profiles to create'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=5000,
+            help='Number of direct conversations between random pairs of profiles'
+        )
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=100000,
+            help='Number of messages spread over the conversations'
+        )
+        parser.add_argument(
+            '--read-ratio',
+            type=float,
+            default=0.7,
+            help='Share of participants who have read their conversation'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of rows inserted per statement'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed, for a reproducible dataset'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete previously seeded data and exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            benchmark.clear(log=self.stdout.write)
+            self.stdout.write(self.style.SUCCESS('Cleared seeded messaging data'))
+            return
+
+        try:
+            created = benchmark.seed(
+                profiles=options['profiles'],
+                threads=options['threads'],
+                messages=options['messages'],
+                read_ratio=options['read_ratio'],
+                batch_size=options['batch_size'],
+                random_seed=options['seed'],
+                log=self.stdout.write
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {created['profiles']} profiles, {created['threads']} threads "
+            f"and {created['messages']} messages"
+        ))
@@ -0,0 +1,80 @@
+"""
+Cached participant-id sets of message threads.
+
+Membership is checked several times per message send, so it is served from a
+small in-process LRU first and the shared cache second, and only loaded from
+the database on a miss. Participant changes invalidate both levels through
+``m2m_changed``; other processes drop their local copy within
+``LOCAL_TTL`` seconds.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+LOCAL_TTL = 10
+LOCAL_MAX_ENTRIES = 10000
+SHARED_TTL = 60 * 60
+
+_local = OrderedDict()  # thread_id -> (expires_at, frozenset of profile ids)
+_lock = threading.Lock()
+
+
+def cache_key(thread_id):
+    return f"messaging:thread_participants:{thread_id}"
+
+
+def participant_ids(thread_id, load):
+    """
+    Participant profile ids of a thread.
+
+    Args:
+        thread_id: Primary key of the thread
+        load: Callable returning the ids from the database on a cache miss
+
+    Returns:
+        frozenset of profile ids
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _local.get(thread_id)
+        if entry is not None and entry[0] > now:
+            _local.move_to_end(thread_id)
+            return entry[1]
+
+    ids = cache.get(cache_key(thread_id))
+    if ids is None:
+        ids = list(load())
+        cache.set(cache_key(thread_id), ids, SHARED_TTL)
+    ids = frozenset(ids)
+
+    with _lock:
+        _local[thread_id] = (now + LOCAL_TTL, ids)
+        _local.move_to_end(thread_id)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+    return ids
+
+
+def invalidate(thread_ids):
+    """
+    Forget the cached participants of ``thread_ids``.
+
+    Runs again after commit, so a reader that cached the old membership while
+    the change was in flight does not keep it.
+    """
+    thread_ids = list(thread_ids)
+    if not thread_ids:
+        return
+
+    def forget():
+        with _lock:
+            for thread_id in thread_ids:
+                _local.pop(thread_id, None)
+        cache.delete_many([cache_key(thread_id) for thread_id in thread_ids])
+
+    forget()
+    transaction.on_commit(forget)
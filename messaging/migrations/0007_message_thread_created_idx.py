@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-16 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0006_create_missing_profiles"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["thread", "created_at", "id"], name="message_thread_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.1 on 2026-10-16 19:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_thread_state(apps, schema_editor):
+    MessageThread = apps.get_model('messaging', 'MessageThread')
+    Message = apps.get_model('messaging', 'Message')
+    ThreadParticipantState = apps.get_model('messaging', 'ThreadParticipantState')
+
+    for thread in MessageThread.objects.prefetch_related('participants'):
+        messages = list(
+            Message.objects.filter(thread=thread)
+            .order_by('id')
+            .values_list('id', 'sender_id', 'receiver_id', 'is_read')
+        )
+        if messages:
+            thread.last_message_id = max(m[0] for m in messages)
+            thread.save(update_fields=['last_message'])
+
+        states = []
+        for profile in thread.participants.all():
+            # Everything below the first unread message addressed to the profile counts as read
+            first_unread = next(
+                (m[0] for m in messages if m[2] == profile.id and not m[3]),
+                None
+            )
+            if first_unread is None:
+                watermark = thread.last_message_id or 0
+            else:
+                watermark = first_unread - 1
+            unread = sum(1 for m in messages if m[0] > watermark and m[1] != profile.id)
+            states.append(ThreadParticipantState(
+                thread=thread,
+                profile=profile,
+                last_read_message_id=watermark,
+                unread_count=unread
+            ))
+        ThreadParticipantState.objects.bulk_create(states, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0007_message_thread_created_idx"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="messagethread",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Most recent message in the conversation (denormalized)",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="messaging.message",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ThreadParticipantState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "last_read_message_id",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Id of the newest message this profile has read in the thread",
+                    ),
+                ),
+                ("unread_count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="thread_states",
+                        to="userprofile.profile",
+                    ),
+                ),
+                (
+                    "thread",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="participant_states",
+                        to="messaging.messagethread",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("thread", "profile")},
+            },
+        ),
+        migrations.RunPython(backfill_thread_state, migrations.RunPython.noop),
+    ]
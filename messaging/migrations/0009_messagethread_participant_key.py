@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-16 19:48
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_participant_keys(apps, schema_editor):
+    MessageThread = apps.get_model('messaging', 'MessageThread')
+
+    seen = set()
+    # The most recently active thread keeps the key when a pair has duplicates
+    for thread in MessageThread.objects.filter(is_active=True).order_by('-updated_at').prefetch_related('participants'):
+        profile_ids = sorted(p.id for p in thread.participants.all())
+        if len(profile_ids) != 2:
+            continue
+        key = hashlib.sha256(','.join(str(pk) for pk in profile_ids).encode('utf-8')).hexdigest()
+        if key in seen:
+            continue
+        seen.add(key)
+        thread.participant_key = key
+        thread.save(update_fields=['participant_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0008_thread_participant_state"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="messagethread",
+            name="participant_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Hash of the sorted participant ids of a direct conversation",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.RunPython(backfill_participant_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="messagethread",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_active", True)),
+                fields=("participant_key",),
+                name="unique_active_participant_key",
+            ),
+        ),
+    ]
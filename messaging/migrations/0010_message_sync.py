@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-16 19:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0009_messagethread_participant_key"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("message_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["updated_at", "id"], name="message_updated_idx"),
+        ),
+        migrations.AddField(
+            model_name="messagetombstone",
+            name="thread",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="tombstones",
+                to="messaging.messagethread",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="messagetombstone",
+            index=models.Index(
+                fields=["thread", "deleted_at"], name="tombstone_thread_deleted_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE messaging_message
+    ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(message, ''))) STORED
+    """,
+    "CREATE INDEX message_search_idx ON messaging_message USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS message_search_idx",
+    "ALTER TABLE messaging_message DROP COLUMN IF EXISTS search_vector",
+]
+
+# External-content FTS5 table kept in step with messaging_message by triggers.
+# SQLite drops triggers with their table, so a later migration that rebuilds
+# messaging_message has to recreate them.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE messaging_message_fts USING fts5(
+        message,
+        content='messaging_message',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER messaging_message_fts_insert AFTER INSERT ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(rowid, message) VALUES (new.id, new.message);
+    END
+    """,
+    """
+    CREATE TRIGGER messaging_message_fts_delete AFTER DELETE ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message)
+        VALUES ('delete', old.id, old.message);
+    END
+    """,
+    """
+    CREATE TRIGGER messaging_message_fts_update AFTER UPDATE OF message ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message)
+        VALUES ('delete', old.id, old.message);
+        INSERT INTO messaging_message_fts(rowid, message) VALUES (new.id, new.message);
+    END
+    """,
+    "INSERT INTO messaging_message_fts(messaging_message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS messaging_message_fts_update",
+    "DROP TRIGGER IF EXISTS messaging_message_fts_delete",
+    "DROP TRIGGER IF EXISTS messaging_message_fts_insert",
+    "DROP TABLE IF EXISTS messaging_message_fts",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0010_message_sync"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0011_message_search_index"),
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="message",
+            options={},
+        ),
+        migrations.CreateModel(
+            name="ArchivedMessage",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("message", models.TextField()),
+                ("is_read", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "receiver",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_received_messages",
+                        to="userprofile.profile",
+                    ),
+                ),
+                (
+                    "sender",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_sent_messages",
+                        to="userprofile.profile",
+                    ),
+                ),
+                (
+                    "thread",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_messages",
+                        to="messaging.messagethread",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["thread", "created_at", "id"],
+                        name="archived_thread_created_idx",
+                    ),
+                    models.Index(fields=["created_at"], name="archived_created_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-16 22:40
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_archived_until(apps, schema_editor):
+    MessageThread = apps.get_model('messaging', 'MessageThread')
+    ArchivedMessage = apps.get_model('messaging', 'ArchivedMessage')
+    newest = (
+        ArchivedMessage.objects.filter(thread=OuterRef('pk'))
+        .order_by().values('thread').annotate(newest=Max('created_at')).values('newest')[:1]
+    )
+    MessageThread.objects.filter(id__in=ArchivedMessage.objects.values('thread_id')).update(
+        archived_until=Subquery(newest)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0012_archived_message"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="messagethread",
+            name="archived_until",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="created_at of the newest archived message; null while nothing is archived",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(backfill_archived_until, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,35 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import MinLengthValidator, MaxLengthValidator
 from django.core.exceptions import ValidationError
 from django.utils.html import strip_tags
 from django.utils import timezone
 import bleach
+import hashlib
+from . import membership
+from .realtime import MESSAGE_READ, publish_on_commit
+
+MESSAGE_VALIDATORS = [
+    MinLengthValidator(1, message="Message cannot be empty"),
+    MaxLengthValidator(5000, message="Message cannot exceed 5000 characters")
+]
+
+
+def sanitize_message(text):
+    """Message text with all HTML removed"""
+    # First strip HTML tags, then sanitize using bleach
+    return bleach.clean(
+        strip_tags(text),
+        strip=True,
+        strip_comments=True,
+        tags=[],  # No HTML tags allowed
+        attributes={},
+        protocols=[]
+    )
 
 class MessageThread(models.Model):
     participants = models.ManyToManyField(
@@ -22,9 +46,38 @@ class MessageThread(models.Model):
         null=True,
         help_text="Optional title for the conversation"
     )
+    last_message = models.ForeignKey(
+        'Message',
+        related_name='+',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Most recent message in the conversation (denormalized)"
+    )
+    participant_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Hash of the sorted participant ids of a direct conversation"
+    )
+    archived_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="created_at of the newest archived message; null while nothing is archived"
+    )
 
     class Meta:
         ordering = ['-updated_at']
+        constraints = [
+            # At most one active direct conversation per participant set
+            models.UniqueConstraint(
+                fields=['participant_key'],
+                condition=models.Q(is_active=True),
+                name='unique_active_participant_key'
+            ),
+        ]
 
     def __str__(self):
         if self.title:
@@ -36,12 +89,21 @@ class MessageThread(models.Model):
                 names.append(p.name)
             else:
                 names.append(p.user.email if p.user else 'Unknown Profile')
-        if len(self.participants.all()) > 2:
-            names.append(f"+{len(self.participants.all()) - 2} more")
+        participant_count = len(self.get_participant_ids())
+        if participant_count > 2:
+            names.append(f"+{participant_count - 2} more")
         return " - ".join(names)
 
+    @staticmethod
+    def make_participant_key(profile_ids):
+        """Canonical key for a set of profile ids, independent of their order"""
+        canonical = ','.join(str(pk) for pk in sorted(set(int(pk) for pk in profile_ids)))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
     def get_last_message(self):
         """Get the most recent message in the thread"""
+        if self.last_message_id:
+            return self.last_message
         return self.messages.order_by('-created_at').first()
 
     @classmethod
@@ -51,26 +113,57 @@ class MessageThread(models.Model):
             'sender', 'receiver'
         ).order_by('-created_at').first()
 
-    def mark_as_read(self, profile):
-        """Mark all messages in thread as read for a specific profile"""
-        # Mark messages where profile is the receiver as read
-        self.messages.filter(receiver=profile, is_read=False).update(is_read=True)
-        
-        # In group conversations, also mark messages sent by the profile as "read by sender"
-        # This provides better UX for group chats
-        self.messages.filter(sender=profile, is_read=False).update(is_read=True)
+    def get_participant_ids(self):
+        """Ids of the profiles participating in this thread, served from the membership cache"""
+        return membership.participant_ids(
+            self.pk,
+            lambda: self.participants.values_list('id', flat=True)
+        )
+
+    @classmethod
+    def contact_ids(cls, profile_id):
+        """Ids of the profiles sharing an active thread with ``profile_id``"""
+        Participant = cls.participants.through
+        return set(
+            Participant.objects.filter(
+                messagethread__is_active=True,
+                messagethread__participants=profile_id
+            ).exclude(
+                profile_id=profile_id
+            ).values_list('profile_id', flat=True)
+        )
+
+    def has_participant(self, profile):
+        return profile is not None and profile.pk in self.get_participant_ids()
+
+    def mark_as_read(self, profile, up_to=None):
+        """
+        Mark the thread as read for a specific profile up to ``up_to``
+        (by default the newest message). Only the profile's read watermark
+        moves; nothing is written when it is already there.
+        """
+        up_to = up_to or self.last_message_id
+        if not up_to:
+            return False
+        advanced = ThreadParticipantState.objects.advance_watermark(self.pk, profile.pk, up_to)
+        if advanced:
+            # Read receipt for the other participants' open chats
+            publish_on_commit(self.get_participant_ids(), MESSAGE_READ, {
+                'thread_id': self.pk,
+                'profile_id': profile.pk,
+                'last_read_message_id': up_to,
+            })
+        return advanced
 
     def mark_all_as_read_for_profile(self, profile):
         """Mark all messages in thread as read for a specific profile (alternative method)"""
-        # Mark all messages in the thread as read for this profile
-        # This is useful for group conversations where we want to mark everything as read
-        self.messages.filter(is_read=False).update(is_read=True)
+        return self.mark_as_read(profile)
 
     def validate_participants(self, sender, receiver):
         """Validate that sender and receiver are participants in this thread"""
-        if sender not in self.participants.all():
+        if not self.has_participant(sender):
             raise ValidationError("Sender must be a participant in the thread")
-        if receiver not in self.participants.all():
+        if not self.has_participant(receiver):
             raise ValidationError("Receiver must be a participant in the thread")
 
 class Message(models.Model):
@@ -95,18 +188,22 @@ class Message(models.Model):
         help_text="Profile who should receive the message"
     )
     message = models.TextField(
-        validators=[
-            MinLengthValidator(1, message="Message cannot be empty"),
-            MaxLengthValidator(5000, message="Message cannot exceed 5000 characters")
-        ],
+        validators=MESSAGE_VALIDATORS,
         help_text="The message content"
     )
+    # Legacy flag; read state now lives in ThreadParticipantState watermarks
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['created_at']
+        # No default ordering: every listing orders explicitly on an index
+        indexes = [
+            # Backs keyset pagination of a thread's history on (created_at, id)
+            models.Index(fields=['thread', 'created_at', 'id'], name='message_thread_created_idx'),
+            # Backs delta sync, which scans changes on (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='message_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender} to {self.receiver} at {self.created_at}"
@@ -119,22 +216,275 @@ class Message(models.Model):
 
         # Sanitize message content
         if self.message:
-            # First strip HTML tags
-            clean_message = strip_tags(self.message)
-            # Then sanitize using bleach
-            self.message = bleach.clean(
-                clean_message,
-                strip=True,
-                strip_comments=True,
-                tags=[],  # No HTML tags allowed
-                attributes={},
-                protocols=[]
-            )
+            self.message = sanitize_message(self.message)
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
-        # Update thread's updated_at timestamp if thread exists
-        if self.thread:
-            # Use update() to avoid race conditions and unnecessary database writes
-            MessageThread.objects.filter(id=self.thread.id).update(updated_at=timezone.now())
+        is_new = self.pk is None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Update thread's updated_at timestamp if thread exists
+            if self.thread_id:
+                thread_updates = {'updated_at': timezone.now()}
+                if is_new:
+                    thread_updates['last_message'] = self
+                # Use update() to avoid race conditions and unnecessary database writes
+                MessageThread.objects.filter(id=self.thread_id).update(**thread_updates)
+                if is_new:
+                    if self._meta.get_field('thread').is_cached(self):
+                        self.thread.last_message = self
+                    # Every other participant has one more message to read
+                    ThreadParticipantState.objects.filter(
+                        thread_id=self.thread_id
+                    ).exclude(
+                        profile_id=self.sender_id
+                    ).update(
+                        unread_count=F('unread_count') + 1,
+                        updated_at=thread_updates['updated_at']
+                    )
+
+    def delete(self, *args, **kwargs):
+        thread_id, message_id, sender_id = self.thread_id, self.pk, self.sender_id
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if thread_id:
+                # Leave a tombstone so syncing clients learn about the delete
+                MessageTombstone.objects.create(message_id=message_id, thread_id=thread_id)
+                # Participants who had not read this message yet have one less to read
+                ThreadParticipantState.objects.filter(
+                    thread_id=thread_id,
+                    last_read_message_id__lt=message_id,
+                    unread_count__gt=0
+                ).exclude(
+                    profile_id=sender_id
+                ).update(unread_count=F('unread_count') - 1, updated_at=timezone.now())
+                # Deleting the last message nulls the pointer; repoint it at the newest remaining one
+                MessageThread.objects.filter(id=thread_id, last_message__isnull=True).update(
+                    last_message=Subquery(
+                        Message.objects.filter(
+                            thread_id=OuterRef('pk')
+                        ).order_by('-created_at', '-id').values('id')[:1]
+                    )
+                )
+        return result
+
+
+class ArchivedMessageManager(models.Manager):
+    HORIZON_CACHE_KEY = 'messaging:archive_horizon'
+
+    def horizon(self):
+        """
+        ``created_at`` of the newest archived message, or None if the archive
+        is empty. Listings only read the archive once they page past it.
+        """
+        horizon = cache.get(self.HORIZON_CACHE_KEY)
+        if horizon is None:
+            horizon = self.order_by('-created_at').values_list('created_at', flat=True).first()
+            # Cache "empty" too, as an explicit marker
+            cache.set(self.HORIZON_CACHE_KEY, horizon or '', 300)
+        return horizon or None
+
+    def archive_before(self, cutoff, batch_size=1000):
+        """
+        Move one batch of messages created before ``cutoff`` into the archive.
+
+        A thread's last message stays in the active table so the inbox never
+        has to look in the archive. Returns the number of messages moved.
+        """
+        with transaction.atomic():
+            batch = list(
+                Message.objects.filter(created_at__lt=cutoff).exclude(
+                    id__in=MessageThread.objects.filter(
+                        last_message__isnull=False
+                    ).values('last_message_id')
+                ).order_by('id')[:batch_size]
+            )
+            if not batch:
+                return 0
+            self.bulk_create(
+                [
+                    ArchivedMessage(
+                        id=message.id,
+                        thread_id=message.thread_id,
+                        sender_id=message.sender_id,
+                        receiver_id=message.receiver_id,
+                        message=message.message,
+                        is_read=message.is_read,
+                        created_at=message.created_at,
+                        updated_at=message.updated_at
+                    )
+                    for message in batch
+                ],
+                ignore_conflicts=True
+            )
+            # A queryset delete skips Message.delete: archiving is not deleting,
+            # so no tombstones and no unread-counter changes
+            Message.objects.filter(id__in=[message.id for message in batch]).delete()
+            # Per-thread horizons let history pages skip the archive for
+            # threads that have nothing in it
+            newest = {}
+            for message in batch:
+                if message.thread_id:
+                    newest[message.thread_id] = max(newest.get(message.thread_id, message.created_at), message.created_at)
+            if newest:
+                MessageThread.objects.filter(id__in=newest).update(
+                    archived_until=Case(
+                        *[
+                            When(id=thread_id, then=Greatest(
+                                Coalesce('archived_until', Value(created_at)), Value(created_at)
+                            ))
+                            for thread_id, created_at in newest.items()
+                        ],
+                        output_field=models.DateTimeField()
+                    )
+                )
+        cache.delete(self.HORIZON_CACHE_KEY)
+        return len(batch)
+
+
+class ArchivedMessage(models.Model):
+    """
+    Cold tier of ``Message``.
+
+    Messages older than ``MESSAGING_ARCHIVE_AFTER_DAYS`` are moved here by the
+    ``archive_messages`` command with their ids and timestamps intact, which
+    keeps the active table and its indexes small. Rows serialize like
+    messages.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    thread = models.ForeignKey(
+        MessageThread,
+        related_name='archived_messages',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    sender = models.ForeignKey(
+        'userprofile.Profile',
+        related_name='archived_sent_messages',
+        on_delete=models.CASCADE
+    )
+    receiver = models.ForeignKey(
+        'userprofile.Profile',
+        related_name='archived_received_messages',
+        on_delete=models.CASCADE
+    )
+    message = models.TextField()
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArchivedMessageManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['thread', 'created_at', 'id'], name='archived_thread_created_idx'),
+            models.Index(fields=['created_at'], name='archived_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived message from {self.sender} to {self.receiver} at {self.created_at}"
+
+
+class MessageTombstone(models.Model):
+    """
+    Record of a hard-deleted message.
+
+    The message row is gone, so delta sync reads deletions from here instead
+    of from ``Message.updated_at``.
+    """
+    message_id = models.BigIntegerField()
+    thread = models.ForeignKey(
+        MessageThread,
+        related_name='tombstones',
+        on_delete=models.CASCADE
+    )
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['thread', 'deleted_at'], name='tombstone_thread_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted message {self.message_id} in thread {self.thread_id}"
+
+
+class ThreadParticipantStateManager(models.Manager):
+    def advance_watermark(self, thread_id, profile_id, message_id):
+        """
+        Upsert the (thread, profile) row with its watermark at ``message_id``.
+
+        One statement touching one row. The conflict branch only fires when the
+        watermark actually moves forward and recounts the handful of messages
+        above the new watermark, so a message that arrives concurrently is not
+        lost from the counter. Returns True when a row was written.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        state_table = qn(self.model._meta.db_table)
+        message_table = qn(Message._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {state_table}
+                    (thread_id, profile_id, last_read_message_id, unread_count, updated_at)
+                VALUES (%s, %s, %s, 0, %s)
+                ON CONFLICT (thread_id, profile_id) DO UPDATE SET
+                    last_read_message_id = excluded.last_read_message_id,
+                    unread_count = (
+                        SELECT COUNT(*) FROM {message_table} m
+                        WHERE m.thread_id = excluded.thread_id
+                          AND m.id > excluded.last_read_message_id
+                          AND m.sender_id <> excluded.profile_id
+                    ),
+                    updated_at = excluded.updated_at
+                WHERE {state_table}.last_read_message_id < excluded.last_read_message_id
+                """,
+                [thread_id, profile_id, message_id, timezone.now()]
+            )
+            return cursor.rowcount > 0
+
+    def watermarks_for(self, thread_ids):
+        """Map (thread_id, profile_id) to the read watermark for the given threads"""
+        return {
+            (thread_id, profile_id): last_read
+            for thread_id, profile_id, last_read in self.filter(
+                thread_id__in=set(thread_ids)
+            ).values_list('thread_id', 'profile_id', 'last_read_message_id')
+        }
+
+
+class ThreadParticipantState(models.Model):
+    """
+    Per-participant read state of a thread.
+
+    Holds a read watermark (the id of the newest message the profile has read)
+    and a running count of messages from other participants above it, so that
+    the inbox never has to count messages.
+    """
+    thread = models.ForeignKey(
+        MessageThread,
+        related_name='participant_states',
+        on_delete=models.CASCADE
+    )
+    profile = models.ForeignKey(
+        'userprofile.Profile',
+        related_name='thread_states',
+        on_delete=models.CASCADE
+    )
+    last_read_message_id = models.BigIntegerField(
+        default=0,
+        help_text="Id of the newest message this profile has read in the thread"
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ThreadParticipantStateManager()
+
+    class Meta:
+        unique_together = ('thread', 'profile')
+
+    def __str__(self):
+        return f"{self.profile} in thread {self.thread_id}: {self.unread_count} unread"
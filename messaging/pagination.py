@@ -0,0 +1,186 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def encode_sync_cursor(timestamp, pk=0):
+    """Opaque delta-sync position: everything changed after ``(timestamp, pk)``"""
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_sync_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise NotFound('Invalid sync cursor')
+    if timestamp is None:
+        raise NotFound('Invalid sync cursor')
+    return timestamp, pk
+
+
+def encode_search_cursor(score, pk):
+    """Opaque position in a ranked result list: hits ranked below ``(score, pk)``"""
+    raw = f"{score!r}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_search_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        score, pk = raw.rsplit('|', 1)
+        return float(score), int(pk)
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise NotFound('Invalid search cursor')
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination over ``(created_at, id)`` for message history.
+
+    Clients page backwards with ``?before=<cursor>`` and forwards with
+    ``?after=<cursor>``. Without a cursor the newest page is returned, so the
+    cost of opening a conversation does not depend on how old it is.
+    """
+    page_size = 50
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    before_query_param = 'before'
+    after_query_param = 'after'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ascending=True):
+        # Order in which a page is presented to the client. Thread history is
+        # chronological, the profile-wide message list is newest first.
+        self.ascending = ascending
+
+    @staticmethod
+    def encode_cursor(message):
+        raw = f"{message.created_at.isoformat()}|{message.pk}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            created_at, pk = raw.rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def apply_cursor(self, queryset, before, after):
+        """Rows beyond the cursor, ordered walking away from it"""
+        if after:
+            created_at, pk = after
+            return queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by('created_at', 'id')
+        if before:
+            created_at, pk = before
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        return queryset.order_by('-created_at', '-id')
+
+    def reaches_archive(self, items, limit, after, horizon):
+        """Whether rows of the archive may belong on this page"""
+        if after:
+            return after[0] <= horizon
+        return len(items) < limit or items[-1].created_at <= horizon
+
+    def paginate_queryset(self, queryset, request, view=None, archive=None, horizon=None):
+        """
+        ``archive`` is the same selection over ``ArchivedMessage``. It is
+        only read when the page reaches past the archive horizon, and its
+        rows are merged with the active ones in cursor order. ``horizon`` is
+        the newest ``created_at`` in ``archive`` when the caller knows it,
+        such as a thread's ``archived_until``; otherwise the cached horizon
+        of the whole archive is used.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        before = self.decode_cursor(before) if before else None
+        after = self.decode_cursor(after) if after else None
+
+        # Fetch one extra row to learn whether another page exists
+        limit = page_size + 1
+        items = list(self.apply_cursor(queryset, before, after)[:limit])
+
+        if archive is not None:
+            if horizon is None:
+                horizon = archive.model.objects.horizon()
+            if horizon is not None and self.reaches_archive(items, limit, after, horizon):
+                items += list(self.apply_cursor(archive, before, after)[:limit])
+                items.sort(key=lambda item: (item.created_at, item.pk), reverse=not after)
+                items = items[:limit]
+
+        has_more = len(items) > page_size
+        items = items[:page_size]
+
+        # Rows are fetched walking away from the cursor; normalise to oldest first
+        if not after:
+            items.reverse()
+
+        # The cursor row itself lies on the other side of the page
+        if after:
+            self.has_older = bool(items)
+            self.has_newer = has_more
+        else:
+            self.has_older = has_more
+            self.has_newer = bool(before) and bool(items)
+
+        self.oldest = items[0] if items else None
+        self.newest = items[-1] if items else None
+
+        if not self.ascending:
+            items.reverse()
+        return items
+
+    def get_cursors(self):
+        return {
+            self.before_query_param: (
+                self.encode_cursor(self.oldest) if self.has_older and self.oldest else None
+            ),
+            self.after_query_param: (
+                self.encode_cursor(self.newest) if self.has_newer and self.newest else None
+            ),
+        }
+
+    def get_paginated_data(self, data):
+        return {**self.get_cursors(), 'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                self.before_query_param: {'type': 'string', 'nullable': True},
+                self.after_query_param: {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
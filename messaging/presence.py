@@ -0,0 +1,110 @@
+"""
+Online presence and typing indicators.
+
+Both are short-lived keys in the default cache (Redis in production,
+local memory in development and tests) that expire on their own, so a
+heartbeat never writes to the database and going offline needs no cleanup.
+"""
+
+import time
+
+from django.core.cache import cache
+
+from .models import MessageThread
+from .realtime import PRESENCE_CHANGED, TYPING, publish
+
+# Clients heartbeat about every PRESENCE_TTL / 2 seconds
+PRESENCE_TTL = 60
+TYPING_TTL = 6
+
+
+def presence_key(profile_id):
+    return f"messaging:presence:{profile_id}"
+
+
+def typing_key(thread_id, profile_id):
+    return f"messaging:typing:{thread_id}:{profile_id}"
+
+
+def heartbeat(profile_id):
+    """
+    Mark a profile online for the next ``PRESENCE_TTL`` seconds.
+
+    Returns True when the profile was not online before this heartbeat.
+    """
+    now = time.time()
+    if cache.add(presence_key(profile_id), now, PRESENCE_TTL):
+        return True
+    cache.set(presence_key(profile_id), now, PRESENCE_TTL)
+    return False
+
+
+def go_offline(profile_id):
+    cache.delete(presence_key(profile_id))
+
+
+def announce(profile_id, online):
+    """Push a presence change to everyone the profile has a conversation with"""
+    publish(MessageThread.contact_ids(profile_id), PRESENCE_CHANGED, {
+        'profile_id': profile_id,
+        'online': online,
+    })
+
+
+def heartbeat_and_announce(profile_id):
+    """Heartbeat; contacts are only told when the profile comes online"""
+    if heartbeat(profile_id):
+        announce(profile_id, True)
+
+
+def last_seen(profile_ids):
+    """Map each online profile id to the time of its last heartbeat, in one cache round trip"""
+    profile_ids = set(profile_ids)
+    if not profile_ids:
+        return {}
+    found = cache.get_many([presence_key(profile_id) for profile_id in profile_ids])
+    return {
+        profile_id: found[presence_key(profile_id)]
+        for profile_id in profile_ids
+        if presence_key(profile_id) in found
+    }
+
+
+def start_typing(thread_id, profile_id):
+    cache.set(typing_key(thread_id, profile_id), 1, TYPING_TTL)
+
+
+def stop_typing(thread_id, profile_id):
+    cache.delete(typing_key(thread_id, profile_id))
+
+
+def set_typing(thread, profile_id, is_typing=True):
+    """Record and push a typing change to the other participants of ``thread``"""
+    if is_typing:
+        start_typing(thread.pk, profile_id)
+    else:
+        stop_typing(thread.pk, profile_id)
+    recipients = thread.get_participant_ids() - {profile_id}
+    publish(recipients, TYPING, {
+        'thread_id': thread.pk,
+        'profile_id': profile_id,
+        'typing': is_typing,
+    })
+
+
+def typing(pairs):
+    """
+    Which of the given ``(thread_id, profile_id)`` pairs are typing right
+    now, in one cache round trip.
+
+    Returns:
+        dict of thread id to the set of typing profile ids
+    """
+    keys = {typing_key(thread_id, profile_id): (thread_id, profile_id) for thread_id, profile_id in pairs}
+    if not keys:
+        return {}
+    result = {}
+    for key in cache.get_many(list(keys)):
+        thread_id, profile_id = keys[key]
+        result.setdefault(thread_id, set()).add(profile_id)
+    return result
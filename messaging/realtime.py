@@ -0,0 +1,45 @@
+"""
+Push messaging events to connected WebSocket clients through the channel layer.
+
+Each profile has its own group; a connection joins the group of the profile
+it authenticated as. Events are sent after the surrounding transaction commits
+so clients never see data they cannot fetch yet.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_CREATED = 'message.created'
+MESSAGE_READ = 'message.read'
+THREAD_UPDATED = 'thread.updated'
+PRESENCE_CHANGED = 'presence.changed'
+TYPING = 'thread.typing'
+
+
+def profile_group_name(profile_id):
+    return f"messaging.profile.{profile_id}"
+
+
+def publish(profile_ids, event, data):
+    """Send an event to every connection of the given profiles"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        for profile_id in set(profile_ids):
+            async_to_sync(channel_layer.group_send)(
+                profile_group_name(profile_id),
+                {'type': 'messaging.event', 'event': event, 'data': data}
+            )
+    except Exception as e:
+        # Real-time delivery is best effort; clients can always resync over REST
+        logger.error(f"Error publishing {event} to profiles {sorted(set(profile_ids))}: {str(e)}")
+
+
+def publish_on_commit(profile_ids, event, data):
+    profile_ids = list(profile_ids)
+    transaction.on_commit(lambda: publish(profile_ids, event, data))
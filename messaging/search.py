@@ -0,0 +1,132 @@
+"""
+Full-text search over message history.
+
+Backed by a generated ``tsvector`` column with a GIN index on PostgreSQL and
+an FTS5 table on SQLite (see migration 0011). Both backends return hits
+ordered by a score where higher is better, so results page by keyset on
+``(score, id)``. On both backends every term must match and the last one
+matches as a prefix.
+"""
+
+import re
+
+from django.db import connection
+
+from .models import Message, MessageThread
+
+SNIPPET_START = '<mark>'
+SNIPPET_STOP = '</mark>'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Words of ``query``; punctuation and operators are dropped"""
+    return _WORD_RE.findall(query or '')
+
+
+def _fts5_query(terms):
+    # Quote every term so user input cannot reach FTS5 query syntax;
+    # the last one matches as a prefix for search-as-you-type
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _visible_threads_sql():
+    participants = MessageThread.participants.through._meta.db_table
+    threads = MessageThread._meta.db_table
+    return (
+        f"SELECT p.messagethread_id FROM {participants} p "
+        f"JOIN {threads} t ON t.id = p.messagethread_id "
+        f"WHERE p.profile_id = %s AND t.is_active"
+    )
+
+
+def _sqlite_search(profile_id, terms, limit, after):
+    message_table = Message._meta.db_table
+    params = [_fts5_query(terms), profile_id]
+    keyset = ''
+    if after:
+        keyset = 'WHERE score < %s OR (score = %s AND id < %s)'
+        params += [after[0], after[0], after[1]]
+    params.append(limit)
+    sql = f"""
+        SELECT id, score, snip FROM (
+            SELECT m.id AS id,
+                   -bm25(messaging_message_fts) AS score,
+                   snippet(messaging_message_fts, 0, '{SNIPPET_START}', '{SNIPPET_STOP}', '...', 16) AS snip
+            FROM messaging_message_fts
+            JOIN {message_table} m ON m.id = messaging_message_fts.rowid
+            WHERE messaging_message_fts MATCH %s
+              AND m.thread_id IN ({_visible_threads_sql()})
+        ) hits
+        {keyset}
+        ORDER BY score DESC, id DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _tsquery(terms):
+    # Terms are plain words, so they can be joined into to_tsquery syntax
+    # directly; the last one matches as a prefix, like the FTS5 query
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+def _postgres_search(profile_id, terms, limit, after):
+    message_table = Message._meta.db_table
+    query = _tsquery(terms)
+    keyset = ''
+    keyset_params = []
+    if after:
+        keyset = 'WHERE score < %s OR (score = %s AND id < %s)'
+        keyset_params = [after[0], after[0], after[1]]
+    # ts_rank returns float4; widen it so the score handed out in the cursor
+    # compares equal to the row it came from on the next request.
+    # Headlines are expensive, so only build them for the page being returned
+    sql = f"""
+        SELECT hits.id, hits.score,
+               ts_headline('english', m.message, to_tsquery('english', %s),
+                           'StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxWords=20, MinWords=8')
+        FROM (
+            SELECT id, score FROM (
+                SELECT m.id AS id, ts_rank(m.search_vector, q)::float8 AS score
+                FROM {message_table} m, to_tsquery('english', %s) q
+                WHERE m.search_vector @@ q
+                  AND m.thread_id IN ({_visible_threads_sql()})
+            ) ranked
+            {keyset}
+            ORDER BY score DESC, id DESC
+            LIMIT %s
+        ) hits
+        JOIN {message_table} m ON m.id = hits.id
+        ORDER BY hits.score DESC, hits.id DESC
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, query, profile_id, *keyset_params, limit])
+        return cursor.fetchall()
+
+
+def search_messages(profile, terms, limit, after=None):
+    """
+    Rank the messages in ``profile``'s active threads against ``terms``.
+
+    Args:
+        profile: Profile whose conversations are searched
+        terms: Words to match, as returned by ``search_terms``
+        limit: Maximum number of hits
+        after: ``(score, id)`` of the last hit of the previous page
+
+    Returns:
+        List of ``(message_id, score, snippet)`` tuples, best first
+    """
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        return _postgres_search(profile.id, terms, limit, after)
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(profile.id, terms, limit, after)
+    raise NotImplementedError(f"Message search is not available on {connection.vendor}")
@@ -1,9 +1,7 @@
 from rest_framework import serializers
-from .models import Message, MessageThread
+from . import presence
+from .models import MESSAGE_VALIDATORS, Message, MessageThread, ThreadParticipantState, sanitize_message
 from django.contrib.auth import get_user_model
-from django.core.validators import MinLengthValidator, MaxLengthValidator
-from django.utils.html import strip_tags
-import bleach
 from userprofile.models import Profile
 
 User = get_user_model()
@@ -38,6 +36,7 @@ class MessageSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True
     )
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
@@ -45,6 +44,16 @@ class MessageSerializer(serializers.ModelSerializer):
                  'message', 'is_read', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at', 'sender', 'receiver']
 
+    def get_is_read(self, obj):
+        """Whether the receiver has read the message, derived from their read watermark"""
+        if not obj.thread_id:
+            return obj.is_read
+        # Views pass the watermarks of a whole page to avoid a query per message
+        watermarks = self.context.get('read_watermarks')
+        if watermarks is None:
+            watermarks = ThreadParticipantState.objects.watermarks_for([obj.thread_id])
+        return watermarks.get((obj.thread_id, obj.receiver_id), 0) >= obj.id
+
     def validate(self, data):
         """
         Validate that:
@@ -77,11 +86,11 @@ class MessageSerializer(serializers.ModelSerializer):
         # Validate thread participants (only if thread is explicitly provided)
         if thread:
             # If thread is provided, ensure both profiles are participants
-            if sender_profile not in thread.participants.all():
+            if not thread.has_participant(sender_profile):
                 raise serializers.ValidationError({
                     "thread_id": "You must be a participant in the specified thread to send messages"
                 })
-            if receiver not in thread.participants.all():
+            if not thread.has_participant(receiver):
                 raise serializers.ValidationError({
                     "receiver_id": "The receiver must be a participant in the specified thread"
                 })
@@ -89,20 +98,32 @@ class MessageSerializer(serializers.ModelSerializer):
 
         # Sanitize message content
         if message:
-            # First strip HTML tags
-            clean_message = strip_tags(message)
-            # Then sanitize using bleach
-            data['message'] = bleach.clean(
-                clean_message,
-                strip=True,
-                strip_comments=True,
-                tags=[],  # No HTML tags allowed
-                attributes={},
-                protocols=[]
-            )
+            data['message'] = sanitize_message(message)
 
         return data
 
+class BulkMessageSerializer(serializers.Serializer):
+    """Input of a broadcast: one message body for many receivers"""
+    MAX_RECEIVERS = 100
+
+    receiver_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_RECEIVERS
+    )
+    message = serializers.CharField(validators=MESSAGE_VALIDATORS)
+
+    def validate_receiver_ids(self, value):
+        # Keep the caller's order but send each receiver one copy
+        return list(dict.fromkeys(value))
+
+    def validate_message(self, value):
+        """Sanitize once for every receiver"""
+        clean_message = sanitize_message(value)
+        if not clean_message.strip():
+            raise serializers.ValidationError("Message cannot be empty")
+        return clean_message
+
 class MessageThreadSerializer(serializers.ModelSerializer):
     participants = ProfileSerializer(many=True, read_only=True)
     participant_ids = serializers.PrimaryKeyRelatedField(
@@ -113,46 +134,65 @@ class MessageThreadSerializer(serializers.ModelSerializer):
     )
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
+    online_participant_ids = serializers.SerializerMethodField()
+    typing_participant_ids = serializers.SerializerMethodField()
 
     class Meta:
         model = MessageThread
         fields = ['id', 'title', 'participants', 'participant_ids', 
-                 'last_message', 'unread_count', 'created_at', 'updated_at', 'is_active']
+                 'last_message', 'unread_count', 'online_participant_ids',
+                 'typing_participant_ids', 'created_at', 'updated_at', 'is_active']
         read_only_fields = ['id', 'created_at', 'updated_at', 'participants']
 
     def get_last_message(self, obj):
-        """Get the last message in the thread with optimized queries"""
-        # Use optimized query to prevent N+1 problems
-        last_message = obj.messages.select_related('sender', 'receiver').order_by('-created_at').first()
+        """Get the last message in the thread from the denormalized pointer"""
+        last_message = obj.get_last_message()
         if last_message:
-            return MessageSerializer(last_message).data
+            return MessageSerializer(last_message, context=self.context).data
         return None
 
     def get_unread_count(self, obj):
         """Get the number of unread messages for the current user's profile"""
+        # Annotated by the inbox query so that listing threads does not query per thread
+        if hasattr(obj, 'viewer_unread_count'):
+            return obj.viewer_unread_count or 0
+
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             try:
                 user_profile = request.user.profile
             except Profile.DoesNotExist:
                 return 0
-            
-            # Count unread messages where user's profile is the receiver
-            unread_received = obj.messages.filter(receiver=user_profile, is_read=False).count()
-            
-            # For group conversations, also consider messages sent by others that user hasn't seen
-            # This provides a more comprehensive unread count
-            unread_others = obj.messages.filter(
-                sender__in=obj.participants.all(),
-                receiver__in=obj.participants.all()
-            ).exclude(
-                sender=user_profile
-            ).filter(is_read=False).count()
-            
-            # Return the higher count to ensure user sees all unread activity
-            return max(unread_received, unread_others)
+
+            unread_count = ThreadParticipantState.objects.filter(
+                thread=obj,
+                profile=user_profile
+            ).values_list('unread_count', flat=True).first()
+            return unread_count or 0
         return 0
 
+    def _participant_ids(self, obj):
+        # Listings prefetch participants; use them rather than the membership cache
+        if 'participants' in getattr(obj, '_prefetched_objects_cache', {}):
+            return [participant.id for participant in obj.participants.all()]
+        return obj.get_participant_ids()
+
+    def get_online_participant_ids(self, obj):
+        """Participants with a live presence heartbeat"""
+        # Views look up the presence of every listed participant at once
+        last_seen = self.context.get('presence')
+        participant_ids = self._participant_ids(obj)
+        if last_seen is None:
+            last_seen = presence.last_seen(participant_ids)
+        return sorted(pid for pid in participant_ids if pid in last_seen)
+
+    def get_typing_participant_ids(self, obj):
+        """Participants currently typing in this thread"""
+        typing = self.context.get('typing')
+        if typing is None:
+            typing = presence.typing((obj.id, pid) for pid in self._participant_ids(obj))
+        return sorted(typing.get(obj.id, ()))
+
     def validate(self, data):
         """
         Validate that:
@@ -0,0 +1,92 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from . import membership
+from .models import Message, MessageThread, ThreadParticipantState
+from .realtime import MESSAGE_CREATED, THREAD_UPDATED, publish_on_commit
+from .serializers import MessageSerializer
+
+
+@receiver(m2m_changed, sender=MessageThread.participants.through)
+def sync_participant_states(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep one ThreadParticipantState row per (thread, participant) pair.
+    New participants start with everything already in the thread marked as read.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        membership.invalidate([instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        membership.invalidate(pk_set)
+    elif action == 'pre_clear' and reverse:
+        # profile.threads.clear(): the thread ids are only known beforehand
+        membership.invalidate(instance.threads.values_list('id', flat=True))
+    if action == 'post_add' and pk_set:
+        if reverse:
+            # profile.threads.add(...): instance is the profile, pk_set holds thread ids
+            threads = MessageThread.objects.filter(id__in=pk_set).values_list('id', 'last_message_id')
+            states = [
+                ThreadParticipantState(
+                    thread_id=thread_id,
+                    profile_id=instance.pk,
+                    last_read_message_id=last_message_id or 0
+                )
+                for thread_id, last_message_id in threads
+            ]
+        else:
+            states = [
+                ThreadParticipantState(
+                    thread_id=instance.pk,
+                    profile_id=profile_id,
+                    last_read_message_id=instance.last_message_id or 0
+                )
+                for profile_id in pk_set
+            ]
+        ThreadParticipantState.objects.bulk_create(states, ignore_conflicts=True)
+
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            ThreadParticipantState.objects.filter(profile_id=instance.pk, thread_id__in=pk_set).delete()
+        else:
+            ThreadParticipantState.objects.filter(thread_id=instance.pk, profile_id__in=pk_set).delete()
+
+    elif action == 'post_clear':
+        if reverse:
+            ThreadParticipantState.objects.filter(profile_id=instance.pk).delete()
+        else:
+            ThreadParticipantState.objects.filter(thread_id=instance.pk).delete()
+
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        drop_stale_participant_key(instance)
+        publish_thread_updated(instance)
+
+
+def drop_stale_participant_key(thread):
+    """A keyed direct conversation whose participants change is no longer that conversation"""
+    if not thread.participant_key:
+        return
+    profile_ids = thread.participants.values_list('id', flat=True)
+    if MessageThread.make_participant_key(profile_ids) != thread.participant_key:
+        MessageThread.objects.filter(pk=thread.pk).update(participant_key=None)
+        thread.participant_key = None
+
+
+def publish_thread_updated(thread):
+    publish_on_commit(thread.get_participant_ids(), THREAD_UPDATED, {
+        'thread_id': thread.pk,
+        'title': thread.title,
+        'is_active': thread.is_active,
+        'updated_at': thread.updated_at.isoformat() if thread.updated_at else None,
+    })
+
+
+@receiver(post_save, sender=MessageThread)
+def trigger_thread_updated(sender, instance, created, **kwargs):
+    # New threads have no participants yet; they are announced when participants are added
+    if not created:
+        publish_thread_updated(instance)
+
+
+@receiver(post_save, sender=Message)
+def trigger_message_created(sender, instance, created, **kwargs):
+    if created and instance.thread_id:
+        data = MessageSerializer(instance, context={'read_watermarks': {}}).data
+        publish_on_commit(instance.thread.get_participant_ids(), MESSAGE_CREATED, data)
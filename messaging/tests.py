@@ -1,15 +1,36 @@
 import json
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from userprofile.models import Profile
-from messaging.models import Message, MessageThread
+from messaging.models import ArchivedMessage, Message, MessageThread, MessageTombstone, ThreadParticipantState
 from messaging.serializers import MessageSerializer, MessageThreadSerializer
+from messaging import benchmark, membership, presence, realtime
+from messaging.pagination import MessageCursorPagination, encode_sync_cursor
+from messaging.views import MessageSyncView, MessageView
+from messaging.routing import websocket_urlpatterns
+from authapp.models import Notification, OutboxEvent
+from authapp.channels_auth import JWTAuthMiddleware
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from rest_framework_simplejwt.tokens import AccessToken
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from django.utils.http import http_date
 from datetime import timedelta
+import os
+import tempfile
 import time
+from unittest import skipUnless
+from unittest.mock import patch
+from io import StringIO
+from django.core.management import call_command
 
 User = get_user_model()
 
@@ -704,6 +725,20 @@ class MessageViewTest(APITestCase):
         self.assertEqual(message.sender, self.profile1)
         self.assertEqual(message.receiver, self.profile2)
 
+    def test_send_queues_notification(self):
+        """Sending only queues the receiver's notification for the outbox worker"""
+        cache.clear()
+        url = reverse('message-list')
+        response = self.client.post(
+            url,
+            {'thread_id': self.thread.id, 'receiver_id': self.profile2.id, 'message': 'Hello'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Notification.objects.filter(user=self.user2).exists())
+        event = OutboxEvent.objects.get(topic='notification')
+        self.assertEqual(event.payload['user_id'], self.user2.id)
+
     def test_list_messages(self):
         """Test listing messages in a thread"""
         # Create some test messages
@@ -757,3 +792,1187 @@ class MessageViewTest(APITestCase):
         # For now, just test normal operation
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class MessageCursorPaginationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+
+        self.messages = [
+            Message.objects.create(
+                thread=self.thread,
+                sender=self.profile1,
+                receiver=self.profile2,
+                message=f"Message {i}"
+            )
+            for i in range(7)
+        ]
+        self.client.force_authenticate(user=self.user1)
+
+    def test_latest_page_is_chronological(self):
+        """Without a cursor the newest page is returned oldest-first"""
+        response = self.client.get(
+            reverse('message-list'), {'thread_id': self.thread.id, 'page_size': 3}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [m['id'] for m in response.data['results']]
+        self.assertEqual(ids, [m.id for m in self.messages[-3:]])
+        self.assertIsNotNone(response.data['before'])
+        self.assertIsNone(response.data['after'])
+
+    def test_before_cursor_walks_history_without_gaps(self):
+        url = reverse('message-list')
+        params = {'thread_id': self.thread.id, 'page_size': 3}
+        seen = []
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen = [m['id'] for m in response.data['results']] + seen
+            if not response.data['before']:
+                break
+            params['before'] = response.data['before']
+        self.assertEqual(seen, [m.id for m in self.messages])
+
+    def test_after_cursor_returns_newer_messages(self):
+        url = reverse('message-list')
+        first = self.client.get(url, {'thread_id': self.thread.id, 'page_size': 2})
+        older = self.client.get(url, {
+            'thread_id': self.thread.id,
+            'page_size': 2,
+            'before': first.data['before'],
+        })
+        self.assertIsNotNone(older.data['after'])
+
+        newer = self.client.get(url, {
+            'thread_id': self.thread.id,
+            'page_size': 2,
+            'after': older.data['after'],
+        })
+        self.assertEqual(
+            [m['id'] for m in newer.data['results']],
+            [m['id'] for m in first.data['results']]
+        )
+        self.assertIsNone(newer.data['after'])
+
+    def test_profile_message_list_is_newest_first(self):
+        response = self.client.get(reverse('message-list'), {'page_size': 5})
+        ids = [m['id'] for m in response.data['results']]
+        self.assertEqual(ids, [m.id for m in reversed(self.messages)][:5])
+
+    def test_page_size_is_bounded(self):
+        response = self.client.get(
+            reverse('message-list'), {'thread_id': self.thread.id, 'page_size': 10000}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(
+            len(response.data['results']), MessageCursorPagination.max_page_size
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse('message-list'), {'thread_id': self.thread.id, 'before': 'not-a-cursor'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_thread_detail_includes_message_page(self):
+        url = reverse('thread-detail', kwargs={'thread_id': self.thread.id})
+        response = self.client.get(url, {'page_size': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page = response.data['messages']
+        self.assertEqual(
+            [m['id'] for m in page['results']],
+            [m.id for m in self.messages[-4:]]
+        )
+        self.assertIsNotNone(page['before'])
+
+
+class ThreadParticipantStateTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+        self.client.force_authenticate(user=self.user1)
+
+    def send(self, sender, receiver, text="Hello", thread=None):
+        return Message.objects.create(
+            thread=thread or self.thread,
+            sender=sender,
+            receiver=receiver,
+            message=text
+        )
+
+    def state(self, profile, thread=None):
+        return ThreadParticipantState.objects.get(thread=thread or self.thread, profile=profile)
+
+    def test_participants_get_state_rows(self):
+        self.assertEqual(self.thread.participant_states.count(), 2)
+        self.thread.participants.remove(self.profile2)
+        self.assertFalse(
+            ThreadParticipantState.objects.filter(thread=self.thread, profile=self.profile2).exists()
+        )
+
+    def test_new_message_updates_counters_and_last_message(self):
+        self.send(self.profile2, self.profile1, "First")
+        latest = self.send(self.profile2, self.profile1, "Second")
+
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.last_message_id, latest.id)
+        self.assertEqual(self.state(self.profile1).unread_count, 2)
+        self.assertEqual(self.state(self.profile2).unread_count, 0)
+
+    def test_opening_thread_resets_counter(self):
+        latest = self.send(self.profile2, self.profile1)
+        url = reverse('thread-detail', kwargs={'thread_id': self.thread.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 0)
+
+        state = self.state(self.profile1)
+        self.assertEqual(state.unread_count, 0)
+        self.assertEqual(state.last_read_message_id, latest.id)
+
+    def test_deleting_messages_keeps_state_consistent(self):
+        first = self.send(self.profile2, self.profile1, "First")
+        second = self.send(self.profile2, self.profile1, "Second")
+        second.delete()
+
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.last_message_id, first.id)
+        self.assertEqual(self.state(self.profile1).unread_count, 1)
+
+    def test_inbox_query_count_is_constant(self):
+        url = reverse('thread-list')
+
+        def inbox_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        self.send(self.profile2, self.profile1)
+        baseline = inbox_queries()
+
+        for i in range(5):
+            other_user = User.objects.create_user(
+                email=f'other{i}@test.com',
+                username=f'other{i}',
+                password='testpass123',
+                name=f'Other {i}'
+            )
+            other = Profile.objects.create(user=other_user)
+            thread = MessageThread.objects.create(title=f"Thread {i}")
+            thread.participants.add(self.profile1, other)
+            for _ in range(3):
+                self.send(other, self.profile1, thread=thread)
+
+        self.assertEqual(inbox_queries(), baseline)
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 6)
+        self.assertTrue(all(t['unread_count'] >= 1 for t in response.data))
+
+
+class ReadWatermarkTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+        self.message = Message.objects.create(
+            thread=self.thread,
+            sender=self.profile1,
+            receiver=self.profile2,
+            message="Hello"
+        )
+
+    def test_is_read_is_derived_from_receiver_watermark(self):
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('message-list')
+        response = self.client.get(url, {'thread_id': self.thread.id})
+        self.assertFalse(response.data['results'][0]['is_read'])
+
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(url, {'thread_id': self.thread.id})
+        self.assertTrue(response.data['results'][0]['is_read'])
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(url, {'thread_id': self.thread.id})
+        self.assertTrue(response.data['results'][0]['is_read'])
+
+    def test_opening_read_thread_writes_nothing(self):
+        self.thread.refresh_from_db()
+        self.assertTrue(self.thread.mark_as_read(self.profile2))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(self.thread.mark_as_read(self.profile2))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('messaging_message" SET', ctx.captured_queries[0]['sql'])
+
+    def test_watermark_never_moves_backwards(self):
+        newer = Message.objects.create(
+            thread=self.thread,
+            sender=self.profile1,
+            receiver=self.profile2,
+            message="Again"
+        )
+        self.thread.mark_as_read(self.profile2, up_to=newer.id)
+        self.thread.mark_as_read(self.profile2, up_to=self.message.id)
+
+        state = ThreadParticipantState.objects.get(thread=self.thread, profile=self.profile2)
+        self.assertEqual(state.last_read_message_id, newer.id)
+        self.assertEqual(state.unread_count, 0)
+
+    def test_partial_read_keeps_newer_messages_unread(self):
+        Message.objects.create(
+            thread=self.thread,
+            sender=self.profile1,
+            receiver=self.profile2,
+            message="Again"
+        )
+        self.client.force_authenticate(user=self.user2)
+        url = reverse('message-detail', kwargs={'message_id': self.message.id})
+        response = self.client.patch(url, {'is_read': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_read'])
+
+        state = ThreadParticipantState.objects.get(thread=self.thread, profile=self.profile2)
+        self.assertEqual(state.last_read_message_id, self.message.id)
+        self.assertEqual(state.unread_count, 1)
+
+
+class ParticipantKeyTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+        self.view = MessageView()
+
+    def test_key_is_order_independent(self):
+        self.assertEqual(
+            MessageThread.make_participant_key([self.profile1.id, self.profile2.id]),
+            MessageThread.make_participant_key([self.profile2.id, self.profile1.id])
+        )
+
+    def test_find_or_create_reuses_thread(self):
+        thread = self.view.find_or_create_thread(self.profile1, self.profile2)
+        self.assertIsNotNone(thread.participant_key)
+        self.assertEqual(self.view.find_or_create_thread(self.profile2, self.profile1), thread)
+        self.assertEqual(MessageThread.objects.count(), 1)
+
+    def test_duplicate_active_key_is_rejected(self):
+        thread = self.view.find_or_create_thread(self.profile1, self.profile2)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                MessageThread.objects.create(title="Duplicate", participant_key=thread.participant_key)
+
+    def test_soft_deleted_thread_frees_the_key(self):
+        thread = self.view.find_or_create_thread(self.profile1, self.profile2)
+        thread.is_active = False
+        thread.save()
+        self.assertNotEqual(self.view.find_or_create_thread(self.profile1, self.profile2), thread)
+
+    def test_changing_participants_drops_key(self):
+        thread = self.view.find_or_create_thread(self.profile1, self.profile2)
+        user3 = User.objects.create_user(
+            email='user3@test.com',
+            username='user3',
+            password='testpass123',
+            name='User Three'
+        )
+        thread.participants.add(Profile.objects.create(user=user3))
+        thread.refresh_from_db()
+        self.assertIsNone(thread.participant_key)
+
+
+class MessageSyncTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+        self.quiet_thread = MessageThread.objects.create(title="Quiet Thread")
+        self.quiet_thread.participants.add(self.profile1, self.profile2)
+        self.message = Message.objects.create(
+            thread=self.thread,
+            sender=self.profile1,
+            receiver=self.profile2,
+            message="Hello"
+        )
+        self.url = reverse('message-sync')
+        self.cursor = encode_sync_cursor(timezone.now())
+        self.client.force_authenticate(user=self.user2)
+
+    def send(self, text):
+        return Message.objects.create(
+            thread=self.thread,
+            sender=self.profile1,
+            receiver=self.profile2,
+            message=text
+        )
+
+    def test_without_cursor_returns_only_a_cursor(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['cursor'])
+        self.assertEqual(response.data['messages'], [])
+
+    def test_returns_only_changes_since_cursor(self):
+        new = self.send("Are you there?")
+        response = self.client.get(self.url, {'since': self.cursor})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['id'] for m in response.data['messages']], [new.id])
+        self.assertEqual([t['id'] for t in response.data['threads']], [self.thread.id])
+        self.assertEqual(response.data['threads'][0]['unread_count'], 2)
+        self.assertFalse(response.data['has_more'])
+
+    def test_edits_deletes_and_reads_are_reported(self):
+        self.message.message = "Hello again"
+        self.message.save()
+        doomed = self.send("Oops")
+        doomed_id = doomed.id
+        doomed.delete()
+        self.thread.refresh_from_db()
+        self.thread.mark_as_read(self.profile2)
+
+        response = self.client.get(self.url, {'since': self.cursor})
+        self.assertEqual([m['id'] for m in response.data['messages']], [self.message.id])
+        self.assertEqual(
+            response.data['deleted_messages'],
+            [{'id': doomed_id, 'thread_id': self.thread.id}]
+        )
+        self.assertTrue(MessageTombstone.objects.filter(message_id=doomed_id).exists())
+        own_state = next(
+            state for state in response.data['read_states']
+            if state['profile_id'] == self.profile2.id
+        )
+        self.assertEqual(own_state['last_read_message_id'], self.message.id)
+        self.assertEqual(own_state['unread_count'], 0)
+
+    def test_backlog_is_paged_with_cursor(self):
+        sent = [self.send(f"Message {i}").id for i in range(5)]
+        seen = []
+        cursor = self.cursor
+        with patch.object(MessageSyncView, 'max_messages', 2):
+            while True:
+                response = self.client.get(self.url, {'since': cursor})
+                seen.extend(m['id'] for m in response.data['messages'])
+                cursor = response.data['cursor']
+                if not response.data['has_more']:
+                    break
+        self.assertEqual(seen, sent)
+
+    def test_other_profiles_threads_are_not_synced(self):
+        user3 = User.objects.create_user(
+            email='user3@test.com',
+            username='user3',
+            password='testpass123',
+            name='User Three'
+        )
+        Profile.objects.create(user=user3)
+        self.send("Private")
+        self.client.force_authenticate(user=user3)
+        response = self.client.get(self.url, {'since': self.cursor})
+        self.assertEqual(response.data['messages'], [])
+        self.assertEqual(response.data['threads'], [])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MessageSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.user3 = User.objects.create_user(
+            email='user3@test.com',
+            username='user3',
+            password='testpass123',
+            name='User Three'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+        self.profile3 = Profile.objects.create(user=self.user3)
+
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+        self.other_thread = MessageThread.objects.create(title="Other Thread")
+        self.other_thread.participants.add(self.profile2, self.profile3)
+        self.url = reverse('message-search')
+        self.client.force_authenticate(user=self.user1)
+
+    def send(self, thread, sender, receiver, text):
+        return Message.objects.create(thread=thread, sender=sender, receiver=receiver, message=text)
+
+    def test_finds_ranked_hits_with_snippets(self):
+        weak = self.send(self.thread, self.profile1, self.profile2, "The audition went fine, see you later")
+        strong = self.send(self.thread, self.profile2, self.profile1, "Audition audition: the audition is on Monday")
+        self.send(self.thread, self.profile2, self.profile1, "Nothing relevant here")
+
+        response = self.client.get(self.url, {'q': 'audition'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([hit['message']['id'] for hit in response.data['results']], [strong.id, weak.id])
+        self.assertIn('<mark>', response.data['results'][0]['snippet'])
+        self.assertEqual(response.data['results'][0]['thread_id'], self.thread.id)
+        self.assertIsNone(response.data['next'])
+
+    def test_only_searches_own_threads(self):
+        self.send(self.other_thread, self.profile2, self.profile3, "Secret casting call")
+        response = self.client.get(self.url, {'q': 'casting'})
+        self.assertEqual(response.data['results'], [])
+
+        self.thread.is_active = False
+        self.thread.save()
+        self.send(self.thread, self.profile1, self.profile2, "Casting in an archived thread")
+        response = self.client.get(self.url, {'q': 'casting'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_index_follows_edits_and_deletes(self):
+        message = self.send(self.thread, self.profile1, self.profile2, "Rehearsal on Friday")
+        message.message = "Rehearsal moved to Saturday"
+        message.save()
+        response = self.client.get(self.url, {'q': 'saturday'})
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get(self.url, {'q': 'friday'})
+        self.assertEqual(response.data['results'], [])
+
+        message.delete()
+        response = self.client.get(self.url, {'q': 'rehearsal'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_pages_by_cursor(self):
+        sent = {self.send(self.thread, self.profile1, self.profile2, f"Callback number {i}").id for i in range(5)}
+        seen = []
+        params = {'q': 'callback', 'page_size': 2}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(hit['message']['id'] for hit in response.data['results'])
+            if not response.data['next']:
+                break
+            params['cursor'] = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), sent)
+
+    def test_last_term_matches_as_prefix(self):
+        message = self.send(self.thread, self.profile1, self.profile2, "Callback for the lead role")
+        response = self.client.get(self.url, {'q': 'lead callb'})
+        self.assertEqual([hit['message']['id'] for hit in response.data['results']], [message.id])
+        response = self.client.get(self.url, {'q': 'callb lead role extra'})
+        self.assertEqual(response.data['results'], [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'ts_rank keyset is PostgreSQL only')
+    def test_pages_through_tied_ranks_on_postgres(self):
+        # Identical text gives every hit the same float4 rank, so only the
+        # id breaks ties and the cursor score must compare equal to it
+        sent = [self.send(self.thread, self.profile1, self.profile2, "Callback tomorrow").id for _ in range(5)]
+        seen = []
+        params = {'q': 'callback', 'page_size': 2}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(hit['message']['id'] for hit in response.data['results'])
+            if not response.data['next']:
+                break
+            params['cursor'] = response.data['next']
+        self.assertEqual(seen, sorted(sent, reverse=True))
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.send(self.thread, self.profile1, self.profile2, "Meet at NEAR the stage")
+        response = self.client.get(self.url, {'q': 'NEAR(" stage'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_empty_query_is_rejected(self):
+        response = self.client.get(self.url, {'q': '  ?! '})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkMessageTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender_user = User.objects.create_user(
+            email='director@test.com',
+            username='director',
+            password='testpass123',
+            name='Casting Director'
+        )
+        self.sender = Profile.objects.create(user=self.sender_user)
+        self.talents = []
+        for i in range(4):
+            user = User.objects.create_user(
+                email=f'talent{i}@test.com',
+                username=f'talent{i}',
+                password='testpass123',
+                name=f'Talent {i}'
+            )
+            self.talents.append(Profile.objects.create(user=user))
+        self.existing = MessageView().find_or_create_thread(self.sender, self.talents[0])
+        self.url = reverse('message-bulk')
+        self.client.force_authenticate(user=self.sender_user)
+
+    def test_sends_to_every_receiver(self):
+        ids = [talent.id for talent in self.talents]
+        response = self.client.post(
+            self.url,
+            {'receiver_ids': ids, 'message': '<b>Callback</b> on Monday'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result['receiver_id'] for result in response.data['results']], ids)
+        self.assertTrue(all(result['status'] == 'sent' for result in response.data['results']))
+        self.assertEqual(response.data['results'][0]['thread_id'], self.existing.id)
+
+        for talent in self.talents:
+            message = Message.objects.get(receiver=talent)
+            self.assertEqual(message.message, 'Callback on Monday')
+            thread = message.thread
+            self.assertEqual(thread.last_message_id, message.id)
+            self.assertEqual(set(thread.get_participant_ids()), {self.sender.id, talent.id})
+            state = ThreadParticipantState.objects.get(thread=thread, profile=talent)
+            self.assertEqual(state.unread_count, 1)
+
+        # Direct threads created in bulk are found by the single-send path
+        self.assertEqual(
+            MessageView().find_or_create_thread(self.talents[3], self.sender),
+            Message.objects.get(receiver=self.talents[3]).thread
+        )
+        event = OutboxEvent.objects.get(topic='notification.batch')
+        self.assertEqual(len(event.payload['notifications']), 4)
+
+    def test_query_count_does_not_grow_with_receivers(self):
+        def send(receivers):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(
+                    self.url,
+                    {'receiver_ids': [talent.id for talent in receivers], 'message': 'Hello'},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(send(self.talents[1:2]), send(self.talents[2:]))
+
+    def test_reports_per_receiver_failures(self):
+        self.talents[1].availability_status = False
+        self.talents[1].save()
+        ids = [self.talents[0].id, self.talents[1].id, self.sender.id, 999999]
+        response = self.client.post(self.url, {'receiver_ids': ids, 'message': 'Hello'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['sent', 'failed', 'failed', 'failed']
+        )
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_rejects_empty_message(self):
+        response = self.client.post(
+            self.url,
+            {'receiver_ids': [self.talents[0].id], 'message': '<p></p>'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Message.objects.exists())
+
+    def test_sanitizes_like_single_send(self):
+        text = '<script>alert(1)</script><a href="javascript:x">Call</a> <!-- c -->me'
+        self.client.post(self.url, {'receiver_ids': [self.talents[0].id], 'message': text}, format='json')
+        single = Message(
+            thread=self.existing, sender=self.sender, receiver=self.talents[0], message=text
+        )
+        single.clean()
+        self.assertEqual(Message.objects.get().message, single.message)
+
+
+class ParticipantMembershipCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.profiles = []
+        for i in range(3):
+            user = User.objects.create_user(
+                email=f'user{i}@test.com',
+                username=f'user{i}',
+                password='testpass123',
+                name=f'User {i}'
+            )
+            self.profiles.append(Profile.objects.create(user=user))
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profiles[0], self.profiles[1])
+
+    def test_warm_validation_costs_no_queries(self):
+        self.thread.validate_participants(self.profiles[0], self.profiles[1])
+        with self.assertNumQueries(0):
+            self.thread.validate_participants(self.profiles[0], self.profiles[1])
+
+        # Another process only has the shared copy
+        membership._local.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.thread.has_participant(self.profiles[1]))
+
+    def test_participant_changes_invalidate(self):
+        self.assertFalse(self.thread.has_participant(self.profiles[2]))
+        self.thread.participants.add(self.profiles[2])
+        self.assertTrue(self.thread.has_participant(self.profiles[2]))
+
+        self.profiles[2].threads.remove(self.thread)
+        self.assertFalse(self.thread.has_participant(self.profiles[2]))
+
+        self.thread.participants.clear()
+        self.assertFalse(self.thread.has_participant(self.profiles[0]))
+
+    def test_message_clean_uses_cached_membership(self):
+        with self.assertRaises(ValidationError):
+            Message(
+                thread=self.thread,
+                sender=self.profiles[2],
+                receiver=self.profiles[0],
+                message="Let me in"
+            ).clean()
+
+
+class MessageArchiveTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+
+        # Ten old messages followed by five recent ones
+        now = timezone.now()
+        self.messages = []
+        for i in range(15):
+            message = Message.objects.create(
+                thread=self.thread,
+                sender=self.profile1,
+                receiver=self.profile2,
+                message=f"Message {i}"
+            )
+            age = timedelta(days=400 - i) if i < 10 else timedelta(minutes=15 - i)
+            Message.objects.filter(id=message.id).update(created_at=now - age)
+            self.messages.append(message)
+        self.client.force_authenticate(user=self.user1)
+
+    def archive(self):
+        call_command('archive_messages', '--days', '180', '--batch-size', '4', stdout=StringIO())
+
+    def test_command_moves_old_messages(self):
+        self.archive()
+        self.assertEqual(ArchivedMessage.objects.count(), 10)
+        self.assertEqual(Message.objects.count(), 5)
+        archived = ArchivedMessage.objects.get(id=self.messages[0].id)
+        self.assertEqual(archived.message, "Message 0")
+        self.assertFalse(MessageTombstone.objects.exists())
+
+    def test_last_message_stays_active(self):
+        for message in self.messages[10:]:
+            message.delete()
+        self.archive()
+        self.thread.refresh_from_db()
+        self.assertTrue(Message.objects.filter(id=self.thread.last_message_id).exists())
+        self.assertEqual(self.thread.last_message_id, self.messages[9].id)
+
+    def test_history_falls_through_to_archive(self):
+        self.archive()
+        url = reverse('message-list')
+        seen = []
+        params = {'thread_id': self.thread.id, 'page_size': 4}
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen = [m['id'] for m in response.data['results']] + seen
+            if not response.data['before']:
+                break
+            params = {'thread_id': self.thread.id, 'page_size': 4, 'before': response.data['before']}
+        self.assertEqual(seen, [m.id for m in self.messages])
+
+    def test_recent_page_does_not_read_archive(self):
+        self.archive()
+        url = reverse('message-list')
+        ArchivedMessage.objects.horizon()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'thread_id': self.thread.id, 'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertFalse(any('archivedmessage' in q['sql'] for q in ctx.captured_queries))
+
+    def test_unarchived_thread_skips_archive_on_short_pages(self):
+        self.archive()
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.archived_until, ArchivedMessage.objects.latest('created_at').created_at)
+
+        quiet = MessageThread.objects.create(title="Quiet Thread")
+        quiet.participants.add(self.profile1, self.profile2)
+        Message.objects.create(thread=quiet, sender=self.profile2, receiver=self.profile1, message="Hi")
+        for url, params in (
+            (reverse('message-list'), {'thread_id': quiet.id}),
+            (reverse('thread-detail', kwargs={'thread_id': quiet.id}), {}),
+        ):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any('archivedmessage' in q['sql'] for q in ctx.captured_queries))
+
+    def test_archived_message_opens_by_id(self):
+        self.archive()
+        url = reverse('message-detail', args=[self.messages[0].id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['message'], "Message 0")
+
+        # Archived messages are read-only
+        self.assertEqual(self.client.patch(url, {'message': 'Edited'}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(ArchivedMessage.objects.filter(id=self.messages[0].id).exists())
+
+        outsider = User.objects.create_user(
+            email='user3@test.com', username='user3', password='testpass123', name='User Three'
+        )
+        Profile.objects.create(user=outsider)
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PresenceTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+
+    def test_heartbeat_writes_nothing_to_the_database(self):
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('presence'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [q['sql'] for q in ctx.captured_queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_thread_list_shows_presence_and_typing(self):
+        self.client.force_authenticate(user=self.user2)
+        self.client.post(reverse('presence'))
+        self.client.post(reverse('thread-typing', kwargs={'thread_id': self.thread.id}))
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse('thread-list'))
+        self.assertEqual(response.data[0]['online_participant_ids'], [self.profile2.id])
+        self.assertEqual(response.data[0]['typing_participant_ids'], [self.profile2.id])
+
+        self.client.force_authenticate(user=self.user2)
+        self.client.delete(reverse('presence'))
+        self.client.delete(reverse('thread-typing', kwargs={'thread_id': self.thread.id}))
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse('thread-list'))
+        self.assertEqual(response.data[0]['online_participant_ids'], [])
+        self.assertEqual(response.data[0]['typing_participant_ids'], [])
+
+    def test_presence_expires(self):
+        presence.heartbeat(self.profile2.id)
+        self.assertIn(self.profile2.id, presence.last_seen([self.profile2.id]))
+        with patch.object(presence, 'PRESENCE_TTL', 0):
+            presence.heartbeat(self.profile2.id)
+        self.assertEqual(presence.last_seen([self.profile2.id]), {})
+
+    def test_typing_requires_participation(self):
+        user3 = User.objects.create_user(
+            email='user3@test.com',
+            username='user3',
+            password='testpass123',
+            name='User Three'
+        )
+        Profile.objects.create(user=user3)
+        self.client.force_authenticate(user=user3)
+        response = self.client.post(reverse('thread-typing', kwargs={'thread_id': self.thread.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_typing_rejects_inactive_thread(self):
+        self.thread.is_active = False
+        self.thread.save()
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(reverse('thread-typing', kwargs={'thread_id': self.thread.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(presence.typing([(self.thread.id, self.profile1.id)]), {})
+
+
+class ConditionalThreadGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+        Message.objects.create(
+            thread=self.thread,
+            sender=self.profile2,
+            receiver=self.profile1,
+            message="Hello"
+        )
+        self.client.force_authenticate(user=self.user1)
+
+    def test_unchanged_inbox_is_not_modified(self):
+        response = self.client.get(reverse('thread-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        with patch.object(MessageThreadSerializer, 'to_representation') as serialize:
+            response = self.client.get(reverse('thread-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        serialize.assert_not_called()
+
+    def test_new_message_changes_inbox_etag(self):
+        etag = self.client.get(reverse('thread-list'))['ETag']
+        Message.objects.create(
+            thread=self.thread,
+            sender=self.profile2,
+            receiver=self.profile1,
+            message="Again"
+        )
+        response = self.client.get(reverse('thread-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_read_receipt_and_presence_change_inbox_etag(self):
+        etag = self.client.get(reverse('thread-list'))['ETag']
+
+        self.thread.refresh_from_db()
+        self.thread.mark_as_read(self.profile2)
+        response = self.client.get(reverse('thread-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        presence.heartbeat(self.profile2.id)
+        response = self.client.get(reverse('thread-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Later heartbeats keep the profile online and change nothing shown
+        presence.heartbeat(self.profile2.id)
+        response = self.client.get(reverse('thread-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_thread_detail_etag_survives_its_own_read(self):
+        url = reverse('thread-detail', kwargs={'thread_id': self.thread.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # A different page is a different representation
+        response = self.client.get(url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        Message.objects.create(
+            thread=self.thread,
+            sender=self.profile2,
+            receiver=self.profile1,
+            message="New"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            ThreadParticipantState.objects.get(thread=self.thread, profile=self.profile1).unread_count,
+            0
+        )
+
+    def test_if_modified_since_is_ignored(self):
+        # Presence moves no timestamp, so a date-only revalidation would miss it
+        self.client.get(reverse('thread-list'))
+        presence.heartbeat(self.profile2.id)
+        since = http_date(time.time() + 60)
+        response = self.client.get(reverse('thread-list'), HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['online_participant_ids'], [self.profile2.id])
+
+        url = reverse('thread-detail', kwargs={'thread_id': self.thread.id})
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class MessagingBenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        benchmark.seed(profiles=8, threads=10, messages=120, batch_size=50, random_seed=1)
+
+    def test_seed_fills_in_denormalized_state(self):
+        threads = MessageThread.objects.filter(participants__in=benchmark.seeded_profiles()).distinct()
+        self.assertEqual(threads.count(), 10)
+        self.assertEqual(Message.objects.count(), 120)
+        for thread in threads:
+            newest = thread.messages.order_by('-id').first()
+            self.assertEqual(thread.last_message_id, newest.id if newest else None)
+            for state in thread.participant_states.all():
+                unread = thread.messages.filter(
+                    id__gt=state.last_read_message_id
+                ).exclude(sender_id=state.profile_id).count()
+                self.assertEqual(state.unread_count, unread)
+
+    def test_run_reports_every_scenario(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command(
+            'benchmark_messaging', requests=5, warmup=1, sample_size=4,
+            output=path, stdout=StringIO()
+        )
+        with open(path) as f:
+            results = json.load(f)
+
+        self.assertEqual(set(results['scenarios']), set(benchmark.SCENARIOS))
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['requests'], 5, name)
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+            self.assertLessEqual(summary['p95_ms'], summary['p99_ms'])
+            self.assertGreater(summary['queries_max'], 0)
+        # Revalidating an unchanged inbox costs less than rebuilding it
+        self.assertLess(
+            results['scenarios']['inbox_poll']['queries_mean'],
+            results['scenarios']['inbox']['queries_mean'] + 1
+        )
+
+    def test_regressions_against_baseline(self):
+        summary = {'p95_ms': 10.0, 'queries_max': 6, 'errors': 0}
+        baseline = {'scenarios': {'inbox': summary}}
+        self.assertEqual(benchmark.regressions({'scenarios': {'inbox': summary}}, baseline), [])
+
+        slower = {'scenarios': {'inbox': {**summary, 'p95_ms': 13.0, 'queries_max': 7}}}
+        found = benchmark.regressions(slower, baseline, tolerance=0.2)
+        self.assertEqual(len(found), 2)
+
+    def test_clear_removes_seeded_data(self):
+        call_command('seed_messaging', clear=True, stdout=StringIO())
+        self.assertFalse(benchmark.seeded_profiles().exists())
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(MessageThread.objects.exists())
+
+
+class MessagingWebSocketTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(
+            email='user1@test.com',
+            username='user1',
+            password='testpass123',
+            name='User One'
+        )
+        self.user2 = User.objects.create_user(
+            email='user2@test.com',
+            username='user2',
+            password='testpass123',
+            name='User Two'
+        )
+        self.profile1 = Profile.objects.create(user=self.user1)
+        self.profile2 = Profile.objects.create(user=self.user2)
+        self.thread = MessageThread.objects.create(title="Test Thread")
+        self.thread.participants.add(self.profile1, self.profile2)
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def communicator(self, user=None):
+        path = '/ws/messages/'
+        if user:
+            path += f'?token={AccessToken.for_user(user)}'
+        return WebsocketCommunicator(self.application, path)
+
+    async def test_rejects_unauthenticated_connections(self):
+        communicator = self.communicator()
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_closes_when_realtime_is_disabled(self):
+        with self.settings(CHANNEL_LAYERS={}):
+            communicator = self.communicator(self.user1)
+            connected, code = await communicator.connect()
+            self.assertFalse(connected)
+            self.assertEqual(code, 4503)
+            # Publishing is a no-op rather than an error
+            await database_sync_to_async(realtime.publish)([self.profile1.id], realtime.MESSAGE_CREATED, {})
+
+    async def test_rejects_invalid_token(self):
+        communicator = WebsocketCommunicator(self.application, '/ws/messages/?token=garbage')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_pushes_new_messages_and_read_receipts(self):
+        receiver = self.communicator(self.user2)
+        connected, _ = await receiver.connect()
+        self.assertTrue(connected)
+        sender = self.communicator(self.user1)
+        connected, _ = await sender.connect()
+        self.assertTrue(connected)
+        online = await receiver.receive_json_from(timeout=5)
+        self.assertEqual(online, {
+            'type': 'presence.changed',
+            'data': {'profile_id': self.profile1.id, 'online': True},
+        })
+
+        message = await database_sync_to_async(Message.objects.create)(
+            thread=self.thread,
+            sender=self.profile1,
+            receiver=self.profile2,
+            message="Hello over the socket"
+        )
+        event = await receiver.receive_json_from(timeout=5)
+        self.assertEqual(event['type'], 'message.created')
+        self.assertEqual(event['data']['id'], message.id)
+        self.assertEqual(event['data']['message'], "Hello over the socket")
+        await sender.receive_json_from(timeout=5)
+
+        thread = await database_sync_to_async(MessageThread.objects.get)(id=self.thread.id)
+        await database_sync_to_async(thread.mark_as_read)(self.profile2)
+        receipt = await sender.receive_json_from(timeout=5)
+        self.assertEqual(receipt['type'], 'message.read')
+        self.assertEqual(receipt['data']['profile_id'], self.profile2.id)
+        self.assertEqual(receipt['data']['last_read_message_id'], message.id)
+
+        await receiver.disconnect()
+        await sender.disconnect()
+
+    async def test_ping(self):
+        communicator = self.communicator(self.user1)
+        await communicator.connect()
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong'})
+        await communicator.disconnect()
+
+    async def test_typing_is_pushed_to_other_participants(self):
+        receiver = self.communicator(self.user2)
+        await receiver.connect()
+        sender = self.communicator(self.user1)
+        await sender.connect()
+        await receiver.receive_json_from(timeout=5)  # sender came online
+
+        await sender.send_json_to({'type': 'typing', 'thread_id': self.thread.id})
+        event = await receiver.receive_json_from(timeout=5)
+        self.assertEqual(event['type'], 'thread.typing')
+        self.assertEqual(event['data'], {
+            'thread_id': self.thread.id,
+            'profile_id': self.profile1.id,
+            'typing': True,
+        })
+        self.assertTrue(await sender.receive_nothing())
+
+        await receiver.disconnect()
+        await sender.disconnect()
@@ -1,12 +1,33 @@
 from django.urls import path
-from .views import MessageView, MessageThreadView, MessageThreadDetailView, MessageDetailView
+from .views import (
+    BulkMessageView,
+    MessageDetailView,
+    MessageSearchView,
+    MessageSyncView,
+    MessageThreadDetailView,
+    MessageThreadView,
+    MessageView,
+    PresenceView,
+    ThreadTypingView,
+)
 
 urlpatterns = [
     # Thread endpoints
     path('threads/', MessageThreadView.as_view(), name='thread-list'),
     path('threads/<int:thread_id>/', MessageThreadDetailView.as_view(), name='thread-detail'),
+    path('threads/<int:thread_id>/typing/', ThreadTypingView.as_view(), name='thread-typing'),
     
     # Message endpoints
     path('messages/', MessageView.as_view(), name='message-list'),
     path('messages/<int:message_id>/', MessageDetailView.as_view(), name='message-detail'),
+    path('messages/bulk/', BulkMessageView.as_view(), name='message-bulk'),
+
+    # Delta sync for reconnecting clients
+    path('sync/', MessageSyncView.as_view(), name='message-sync'),
+
+    # Full-text search across the user's conversations
+    path('search/', MessageSearchView.as_view(), name='message-search'),
+
+    # Presence heartbeat
+    path('presence/', PresenceView.as_view(), name='presence'),
 ]
\ No newline at end of file
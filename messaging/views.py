@@ -2,22 +2,113 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from .models import Message, MessageThread
-from .serializers import MessageSerializer, MessageThreadSerializer
+from .models import ArchivedMessage, Message, MessageThread, MessageTombstone, ThreadParticipantState
+from .serializers import BulkMessageSerializer, MessageSerializer, MessageThreadSerializer
+from .pagination import (
+    MessageCursorPagination,
+    decode_search_cursor,
+    decode_sync_cursor,
+    encode_search_cursor,
+    encode_sync_cursor,
+)
+from .search import search_messages, search_terms
+from . import membership, presence
+from .conditional import not_modified, set_validators, thread_validators
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Q
+from django.db.models import F, Q, OuterRef, Prefetch, Subquery
 from django.core.cache import cache
 from rest_framework.throttling import UserRateThrottle
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from datetime import timedelta
 from userprofile.models import Profile
-from authapp.services import notify_new_message  # Import the notification function
+from authapp.services import notify_new_message, notify_new_messages  # Import the notification functions
+from .realtime import MESSAGE_CREATED, publish_on_commit
 
 
 class MessageThreadThrottle(UserRateThrottle):
     rate = '10/minute'
 
 
+class PresenceThrottle(UserRateThrottle):
+    # Heartbeats and typing pings are frequent by design
+    rate = '120/minute'
+
+
+CURSOR_PARAMETERS = [
+    openapi.Parameter(
+        name='before',
+        in_=openapi.IN_QUERY,
+        type=openapi.TYPE_STRING,
+        required=False,
+        description='Cursor returned as "before" - fetch the page of older messages'
+    ),
+    openapi.Parameter(
+        name='after',
+        in_=openapi.IN_QUERY,
+        type=openapi.TYPE_STRING,
+        required=False,
+        description='Cursor returned as "after" - fetch the page of newer messages'
+    ),
+    openapi.Parameter(
+        name='page_size',
+        in_=openapi.IN_QUERY,
+        type=openapi.TYPE_INTEGER,
+        required=False,
+        description=f'Messages per page (default {MessageCursorPagination.page_size}, '
+                    f'max {MessageCursorPagination.max_page_size})'
+    ),
+]
+
+
+def get_display_name(profile):
+    """Display name with fallback to email"""
+    if hasattr(profile, 'name') and profile.name and profile.name != 'Unknown User':
+        return profile.name
+    return profile.user.email if profile.user else 'Unknown Profile'
+
+
+def conversation_title(sender_profile, receiver_profile):
+    return f"Conversation between {get_display_name(sender_profile)} and {get_display_name(receiver_profile)}"
+
+
+def presence_context(threads):
+    """Presence and typing state of every participant of ``threads``, in two cache reads"""
+    pairs = [
+        (thread.id, participant.id)
+        for thread in threads
+        for participant in thread.participants.all()
+    ]
+    return {
+        'presence': presence.last_seen(profile_id for _, profile_id in pairs),
+        'typing': presence.typing(pairs),
+    }
+
+
+def with_inbox_state(threads, profile):
+    """
+    Attach what the thread serializer needs for ``profile``.
+
+    Unread counts and last messages are denormalized, so listing threads
+    costs the same number of queries however many threads there are.
+    """
+    return threads.annotate(
+        viewer_unread_count=Subquery(
+            ThreadParticipantState.objects.filter(
+                thread=OuterRef('pk'),
+                profile=profile
+            ).values('unread_count')[:1]
+        )
+    ).select_related(
+        'last_message__sender__user',
+        'last_message__receiver__user'
+    ).prefetch_related(
+        Prefetch('participants', queryset=Profile.objects.select_related('user'))
+    )
+
+
 class MessageThreadView(APIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [MessageThreadThrottle]
@@ -25,9 +116,11 @@ class MessageThreadView(APIView):
     @swagger_auto_schema(
         tags=['messages'],
         operation_summary='List message threads',
-        operation_description='Get all message threads for the current user',
+        operation_description='Get all message threads for the current user. '
+                              'Send the returned ETag as If-None-Match to get 304 when nothing changed.',
         responses={
             200: MessageThreadSerializer(many=True),
+            304: openapi.Response('Not Modified'),
             401: openapi.Response('Unauthorized'),
         }
     )
@@ -41,21 +134,28 @@ class MessageThreadView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        threads = MessageThread.objects.filter(
-            participants=user_profile,
-            is_active=True
-        ).prefetch_related(
-            'participants',
-            'messages__sender',
-            'messages__receiver'
-        ).order_by('-updated_at')
+        visible = MessageThread.objects.filter(participants=user_profile, is_active=True)
+
+        # Pollers usually already hold the current inbox
+        etag = thread_validators(user_profile, visible)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+
+        threads = list(with_inbox_state(visible, user_profile).order_by('-updated_at'))
 
         serializer = MessageThreadSerializer(
             threads,
             many=True,
-            context={'request': request}
+            context={
+                'request': request,
+                'read_watermarks': ThreadParticipantState.objects.watermarks_for(
+                    thread.id for thread in threads
+                ),
+                **presence_context(threads),
+            }
         )
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag)
 
     @swagger_auto_schema(
         tags=['messages'],
@@ -113,9 +213,12 @@ class MessageThreadDetailView(APIView):
     @swagger_auto_schema(
         tags=['messages'],
         operation_summary='Get thread details',
-        operation_description='Get details of a specific message thread',
+        operation_description='Get details of a specific message thread with a cursor-paginated page of its messages. '
+                              'Send the returned ETag as If-None-Match to get 304 when nothing changed.',
+        manual_parameters=CURSOR_PARAMETERS,
         responses={
             200: MessageThreadSerializer,
+            304: openapi.Response('Not Modified'),
             404: openapi.Response('Not Found'),
         }
     )
@@ -136,14 +239,40 @@ class MessageThreadDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Mark messages as read
+        # The page parameters pick which messages are shown
+        visible = MessageThread.objects.filter(id=thread.id)
+        page_params = request.GET.urlencode()
+        unchanged = not_modified(request, thread_validators(user_profile, visible, page_params))
+        if unchanged is not None:
+            # Nothing arrived since the client's copy, which was read when served
+            return unchanged
+
+        # Advance the read watermark (a single-row upsert)
         thread.mark_as_read(user_profile)
 
-        serializer = MessageThreadSerializer(
-            thread,
-            context={'request': request}
+        paginator = MessageCursorPagination()
+        page = paginator.paginate_queryset(
+            thread.messages.select_related('sender__user', 'receiver__user'),
+            request,
+            view=self,
+            archive=(
+                thread.archived_messages.select_related('sender__user', 'receiver__user')
+                if thread.archived_until else None
+            ),
+            horizon=thread.archived_until
         )
-        return Response(serializer.data)
+
+        context = {
+            'request': request,
+            'read_watermarks': ThreadParticipantState.objects.watermarks_for([thread.id]),
+        }
+        serializer = MessageThreadSerializer(thread, context=context)
+        data = serializer.data
+        data['messages'] = paginator.get_paginated_data(
+            MessageSerializer(page, many=True, context=context).data
+        )
+        # Validators as of after the read, so the next poll can match them
+        return set_validators(Response(data), thread_validators(user_profile, visible, page_params))
 
     @swagger_auto_schema(
         tags=['messages'],
@@ -207,35 +336,34 @@ class MessageView(APIView):
         """
         Find existing thread between two profiles or create a new one
         """
-        # Look for existing active thread between these profiles
+        # Direct conversations are keyed by their participant set, so the
+        # lookup is a single probe of a unique index
+        participant_key = MessageThread.make_participant_key([sender_profile.pk, receiver_profile.pk])
         existing_thread = MessageThread.objects.filter(
-            participants=sender_profile,
-            is_active=True
-        ).filter(
-            participants=receiver_profile,
+            participant_key=participant_key,
             is_active=True
         ).first()
 
         if existing_thread:
             return existing_thread
 
-        # Get display names with fallback to email
-        def get_display_name(profile):
-            if hasattr(profile, 'name') and profile.name and profile.name != 'Unknown User':
-                return profile.name
-            return profile.user.email if profile.user else 'Unknown Profile'
-
-        # Create new thread if none exists
-        thread = MessageThread.objects.create(
-            title=f"Conversation between {get_display_name(sender_profile)} and {get_display_name(receiver_profile)}"
-        )
-        thread.participants.add(sender_profile, receiver_profile)
+        # Create new thread if none exists; a concurrent sender that wins the
+        # race trips the unique constraint and we use its thread instead
+        try:
+            with transaction.atomic():
+                thread = MessageThread.objects.create(
+                    title=conversation_title(sender_profile, receiver_profile),
+                    participant_key=participant_key
+                )
+                thread.participants.add(sender_profile, receiver_profile)
+        except IntegrityError:
+            thread = MessageThread.objects.get(participant_key=participant_key, is_active=True)
         return thread
 
     @swagger_auto_schema(
         tags=['messages'],
         operation_summary='List messages',
-        operation_description='Get all messages for the user or messages from a specific thread',
+        operation_description='Get a cursor-paginated page of the user\'s messages or of messages from a specific thread',
         manual_parameters=[
             openapi.Parameter(
                 name='thread_id',
@@ -257,7 +385,8 @@ class MessageView(APIView):
                 type=openapi.TYPE_INTEGER,
                 required=False,
                 description='Filter messages by receiver ID'
-            )
+            ),
+            *CURSOR_PARAMETERS,
         ],
         responses={
             200: MessageSerializer(many=True),
@@ -292,24 +421,43 @@ class MessageView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Mark messages as read
+            # Advance the read watermark (a single-row upsert)
             thread.mark_as_read(user_profile)
 
-            messages = thread.messages.all().order_by('created_at')
+            messages = thread.messages.select_related('sender__user', 'receiver__user')
+            # Threads that were never archived skip the archive entirely
+            horizon = thread.archived_until
+            archived = thread.archived_messages.select_related('sender__user', 'receiver__user') if horizon else None
+            paginator = MessageCursorPagination(ascending=True)
         else:
             # Get all messages where user's profile is sender or receiver
             messages = Message.objects.filter(
                 Q(sender=user_profile) | Q(receiver=user_profile)
-            ).select_related('sender', 'receiver', 'thread').order_by('-created_at')
+            ).select_related('sender__user', 'receiver__user', 'thread')
+            archived = ArchivedMessage.objects.filter(
+                Q(sender=user_profile) | Q(receiver=user_profile)
+            ).select_related('sender__user', 'receiver__user', 'thread')
+            horizon = None
+            paginator = MessageCursorPagination(ascending=False)
 
             # Apply additional filters if provided
             if sender_id:
                 messages = messages.filter(sender_id=sender_id)
+                archived = archived.filter(sender_id=sender_id)
             if receiver_id:
                 messages = messages.filter(receiver_id=receiver_id)
+                archived = archived.filter(receiver_id=receiver_id)
 
-        serializer = MessageSerializer(messages, many=True, context={'request': request})
-        return Response(serializer.data)
+        # Older history lives in the archive; it is only read when the
+        # cursor pages past the active window
+        page = paginator.paginate_queryset(messages, request, view=self, archive=archived, horizon=horizon)
+        serializer = MessageSerializer(page, many=True, context={
+            'request': request,
+            'read_watermarks': ThreadParticipantState.objects.watermarks_for(
+                message.thread_id for message in page if message.thread_id
+            ),
+        })
+        return paginator.get_paginated_response(serializer.data)
 
     @swagger_auto_schema(
         tags=['messages'],
@@ -340,14 +488,16 @@ class MessageView(APIView):
             # Find or create thread
             thread = self.find_or_create_thread(user_profile, receiver_profile)
 
-            # Create message
-            message = serializer.save(
-                sender=user_profile,
-                thread=thread
-            )
+            with transaction.atomic():
+                # Create message
+                message = serializer.save(
+                    sender=user_profile,
+                    thread=thread
+                )
 
-            # Notify the receiver of the new message
-            notify_new_message(user=receiver_profile.user, sender_name=user_profile.name or user_profile.user.email)
+                # Queue the receiver's notification; it commits with the message
+                # and the outbox worker delivers it off the request path
+                notify_new_message(user=receiver_profile.user, sender_name=user_profile.name or user_profile.user.email)
 
             return Response(
                 MessageSerializer(message, context={'request': request}).data,
@@ -356,6 +506,171 @@ class MessageView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkMessageView(APIView):
+    """
+    Send one message to many profiles in a single request.
+
+    Does per request what ``MessageView.post`` does per receiver, in
+    set-based statements: the body is sanitized once, direct threads are
+    resolved or created together, messages are inserted with one
+    ``bulk_create`` and the receivers' notifications go out as one job.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [MessageThreadThrottle]
+
+    def find_or_create_threads(self, sender_profile, receivers):
+        """
+        Map receiver id to the active direct thread with ``sender_profile``,
+        creating the missing ones.
+        """
+        keys = {
+            receiver.id: MessageThread.make_participant_key([sender_profile.id, receiver.id])
+            for receiver in receivers
+        }
+        threads = MessageThread.objects.filter(participant_key__in=keys.values(), is_active=True)
+        by_key = {thread.participant_key: thread for thread in threads}
+
+        missing = [receiver for receiver in receivers if keys[receiver.id] not in by_key]
+        if missing:
+            # Threads a concurrent sender creates first are skipped by the
+            # unique constraint and picked up by the re-read below
+            MessageThread.objects.bulk_create(
+                [
+                    MessageThread(
+                        title=conversation_title(sender_profile, receiver),
+                        participant_key=keys[receiver.id]
+                    )
+                    for receiver in missing
+                ],
+                ignore_conflicts=True
+            )
+            created = MessageThread.objects.filter(
+                participant_key__in=[keys[receiver.id] for receiver in missing],
+                is_active=True
+            )
+            by_key.update((thread.participant_key, thread) for thread in created)
+
+            # Participants and their read state, without a signal per thread
+            Participant = MessageThread.participants.through
+            participants = []
+            states = []
+            for receiver in missing:
+                thread = by_key[keys[receiver.id]]
+                for profile_id in (sender_profile.id, receiver.id):
+                    participants.append(Participant(messagethread_id=thread.id, profile_id=profile_id))
+                    states.append(ThreadParticipantState(thread_id=thread.id, profile_id=profile_id))
+            Participant.objects.bulk_create(participants, ignore_conflicts=True)
+            ThreadParticipantState.objects.bulk_create(states, ignore_conflicts=True)
+            membership.invalidate(by_key[keys[receiver.id]].id for receiver in missing)
+
+        return {receiver_id: by_key[key] for receiver_id, key in keys.items()}
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Send message to many profiles',
+        operation_description='Send the same message to a list of profiles, each in its direct thread '
+                              'with the sender. Returns one result per requested receiver.',
+        request_body=BulkMessageSerializer,
+        responses={
+            201: openapi.Response('At least one message was sent'),
+            400: openapi.Response('Bad Request'),
+            401: openapi.Response('Unauthorized'),
+        }
+    )
+    def post(self, request):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {"detail": "User must have a profile to send messages"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = BulkMessageSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        receiver_ids = serializer.validated_data['receiver_ids']
+        body = serializer.validated_data['message']
+
+        receivers = Profile.objects.filter(
+            id__in=receiver_ids,
+            availability_status=True
+        ).exclude(id=user_profile.id).select_related('user').in_bulk()
+
+        results = []
+        sent = {}
+        if receivers:
+            with transaction.atomic():
+                threads = self.find_or_create_threads(user_profile, list(receivers.values()))
+                messages = Message.objects.bulk_create([
+                    Message(
+                        thread=threads[receiver.id],
+                        sender=user_profile,
+                        receiver=receiver,
+                        message=body
+                    )
+                    for receiver in receivers.values()
+                ])
+                thread_ids = [message.thread_id for message in messages]
+
+                # What Message.save does per message, once for all threads
+                now = timezone.now()
+                MessageThread.objects.filter(id__in=thread_ids).update(
+                    updated_at=now,
+                    last_message=Subquery(
+                        Message.objects.filter(
+                            thread_id=OuterRef('pk')
+                        ).order_by('-created_at', '-id').values('id')[:1]
+                    )
+                )
+                ThreadParticipantState.objects.filter(
+                    thread_id__in=thread_ids
+                ).exclude(
+                    profile_id=user_profile.id
+                ).update(unread_count=F('unread_count') + 1, updated_at=now)
+
+                notify_new_messages(
+                    [receiver.user_id for receiver in receivers.values()],
+                    sender_name=user_profile.name or user_profile.user.email
+                )
+
+                context = {'request': request, 'read_watermarks': {}}
+                for message in messages:
+                    publish_on_commit(
+                        [user_profile.id, message.receiver_id],
+                        MESSAGE_CREATED,
+                        MessageSerializer(message, context=context).data
+                    )
+                sent = {message.receiver_id: message for message in messages}
+
+        for receiver_id in receiver_ids:
+            message = sent.get(receiver_id)
+            if message is not None:
+                results.append({
+                    'receiver_id': receiver_id,
+                    'status': 'sent',
+                    'message_id': message.id,
+                    'thread_id': message.thread_id,
+                })
+            elif receiver_id == user_profile.id:
+                results.append({
+                    'receiver_id': receiver_id,
+                    'status': 'failed',
+                    'detail': 'You cannot send messages to yourself',
+                })
+            else:
+                results.append({
+                    'receiver_id': receiver_id,
+                    'status': 'failed',
+                    'detail': 'Receiver not found or not available',
+                })
+
+        return Response(
+            {'message': body, 'results': results},
+            status=status.HTTP_201_CREATED if sent else status.HTTP_400_BAD_REQUEST
+        )
+
+
 class MessageDetailView(APIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [MessageThreadThrottle]
@@ -376,10 +691,22 @@ class MessageDetailView(APIView):
         except Message.DoesNotExist:
             return None
 
+    def get_archived_object(self, message_id):
+        """Archived copy of a message the user's profile sent or received"""
+        user_profile = self.request.user.profile
+        return ArchivedMessage.objects.filter(
+            id=message_id
+        ).filter(
+            Q(sender=user_profile) | Q(receiver=user_profile)
+        ).first()
+
     @swagger_auto_schema(
         tags=['messages'],
         operation_summary='Get message details',
-        operation_description='Get details of a specific message',
+        operation_description=(
+            'Get details of a specific message. Archived messages are returned '
+            'too, but they are read-only: PATCH and DELETE answer 404 for them.'
+        ),
         responses={
             200: MessageSerializer,
             404: openapi.Response('Not Found'),
@@ -395,7 +722,8 @@ class MessageDetailView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        message = self.get_object(message_id)
+        # Thread history pages into the archive, so a listed message must open too
+        message = self.get_object(message_id) or self.get_archived_object(message_id)
         if not message:
             return Response(
                 {"detail": "Message not found"},
@@ -440,6 +768,14 @@ class MessageDetailView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
+        # Read status is the receiver's thread watermark, not a per-message flag
+        if 'is_read' in request.data:
+            if (str(request.data['is_read']).lower() in ('true', '1')
+                    and message.receiver == user_profile and message.thread_id):
+                message.thread.mark_as_read(user_profile, up_to=message.id)
+            if set(request.data.keys()) == {'is_read'}:
+                return Response(MessageSerializer(message, context={'request': request}).data)
+
         serializer = MessageSerializer(
             message,
             data=request.data,
@@ -488,3 +824,346 @@ class MessageDetailView(APIView):
         message.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+
+class MessageSyncView(APIView):
+    """
+    Delta sync for reconnecting clients.
+
+    Returns what changed in the profile's threads since an opaque cursor:
+    threads whose state moved, created or edited messages, deleted message
+    ids and read watermarks, plus the cursor to sync from next time. The
+    work done is proportional to the number of changes, not to the size of
+    the inbox. Clients must apply the results idempotently; rows from the
+    last couple of seconds are replayed on the next sync in case they were
+    still committing.
+    """
+    permission_classes = [IsAuthenticated]
+    max_messages = 500
+    # Timestamps are taken before commit; replay this window on the next sync
+    settle_window = timedelta(seconds=2)
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Sync message changes',
+        operation_description='Get threads, messages, deletions and read states changed since a '
+                              'sync cursor. Without "since", only a starting cursor is returned.',
+        manual_parameters=[
+            openapi.Parameter(
+                name='since',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=False,
+                description='Cursor returned by the previous sync'
+            ),
+        ],
+        responses={
+            200: openapi.Response('Changes since the cursor'),
+            400: openapi.Response('Bad Request'),
+            401: openapi.Response('Unauthorized'),
+            404: openapi.Response('Invalid sync cursor'),
+        }
+    )
+    def get(self, request):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {"detail": "User must have a profile to access messages"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        settled_at = timezone.now() - self.settle_window
+        since = request.query_params.get('since')
+        if not since:
+            # Fresh client: it loads the inbox normally and syncs from here
+            return Response({
+                'cursor': encode_sync_cursor(settled_at),
+                'has_more': False,
+                'threads': [],
+                'messages': [],
+                'deleted_messages': [],
+                'read_states': [],
+            })
+        since_at, since_id = decode_sync_cursor(since)
+
+        thread_ids = MessageThread.objects.filter(participants=user_profile).values('id')
+
+        messages = Message.objects.filter(
+            Q(updated_at__gt=since_at) | Q(updated_at=since_at, id__gt=since_id),
+            thread_id__in=thread_ids
+        ).select_related(
+            'sender__user',
+            'receiver__user'
+        ).order_by('updated_at', 'id')
+        messages = list(messages[:self.max_messages + 1])
+        has_more = len(messages) > self.max_messages
+        messages = messages[:self.max_messages]
+
+        # The other streams are small; bound them to the message window so a
+        # client paging through a backlog does not see them out of order
+        window = {'updated_at__gte': since_at}
+        if has_more:
+            window['updated_at__lte'] = messages[-1].updated_at
+            next_cursor = encode_sync_cursor(messages[-1].updated_at, messages[-1].id)
+        elif settled_at > since_at:
+            next_cursor = encode_sync_cursor(settled_at)
+        else:
+            next_cursor = since
+
+        threads = list(with_inbox_state(
+            MessageThread.objects.filter(participants=user_profile, **window),
+            user_profile
+        ).order_by('updated_at', 'id'))
+
+        read_states = [
+            {
+                'thread_id': state['thread_id'],
+                'profile_id': state['profile_id'],
+                'last_read_message_id': state['last_read_message_id'],
+                # Other participants' counters are not the viewer's business
+                'unread_count': (
+                    state['unread_count'] if state['profile_id'] == user_profile.id else None
+                ),
+            }
+            for state in ThreadParticipantState.objects.filter(
+                thread_id__in=thread_ids, **window
+            ).values('thread_id', 'profile_id', 'last_read_message_id', 'unread_count')
+        ]
+
+        tombstone_window = {
+            key.replace('updated_at', 'deleted_at'): value for key, value in window.items()
+        }
+        deleted_messages = [
+            {'id': tombstone['message_id'], 'thread_id': tombstone['thread_id']}
+            for tombstone in MessageTombstone.objects.filter(
+                thread_id__in=thread_ids, **tombstone_window
+            ).values('message_id', 'thread_id')
+        ]
+
+        context = {
+            'request': request,
+            'read_watermarks': ThreadParticipantState.objects.watermarks_for(
+                {thread.id for thread in threads} | {message.thread_id for message in messages}
+            ),
+            **presence_context(threads),
+        }
+        return Response({
+            'cursor': next_cursor,
+            'has_more': has_more,
+            'threads': MessageThreadSerializer(threads, many=True, context=context).data,
+            'messages': MessageSerializer(messages, many=True, context=context).data,
+            'deleted_messages': deleted_messages,
+            'read_states': read_states,
+        })
+
+
+class MessageSearchView(APIView):
+    """
+    Ranked full-text search over the conversations of the current profile.
+
+    Each hit carries the message, its thread and a snippet with the matched
+    words wrapped in ``<mark>`` tags. Message text is stored escaped, so the
+    snippet is safe to render as HTML.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [MessageThreadThrottle]
+    page_size = 20
+    max_page_size = 50
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Search messages',
+        operation_description='Full-text search across the threads the current user participates in',
+        manual_parameters=[
+            openapi.Parameter(
+                name='q',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=True,
+                description='Words to search for'
+            ),
+            openapi.Parameter(
+                name='cursor',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                required=False,
+                description='Cursor returned as "next" - fetch the following page of hits'
+            ),
+            openapi.Parameter(
+                name='page_size',
+                in_=openapi.IN_QUERY,
+                type=openapi.TYPE_INTEGER,
+                required=False,
+                description=f'Hits per page (default {page_size}, max {max_page_size})'
+            ),
+        ],
+        responses={
+            200: openapi.Response('Ranked hits'),
+            400: openapi.Response('Bad Request'),
+            401: openapi.Response('Unauthorized'),
+            404: openapi.Response('Invalid search cursor'),
+        }
+    )
+    def get(self, request):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {"detail": "User must have a profile to access messages"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        terms = search_terms(request.query_params.get('q'))
+        if not terms:
+            return Response(
+                {"detail": "Search query must contain at least one word"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            page_size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        if page_size <= 0:
+            page_size = self.page_size
+        page_size = min(page_size, self.max_page_size)
+
+        cursor = request.query_params.get('cursor')
+        after = decode_search_cursor(cursor) if cursor else None
+
+        # One extra hit tells whether another page exists
+        hits = search_messages(user_profile, terms, page_size + 1, after=after)
+        has_more = len(hits) > page_size
+        hits = hits[:page_size]
+
+        messages = Message.objects.select_related(
+            'sender__user',
+            'receiver__user'
+        ).in_bulk([message_id for message_id, _, _ in hits])
+        context = {
+            'request': request,
+            'read_watermarks': ThreadParticipantState.objects.watermarks_for(
+                message.thread_id for message in messages.values()
+            ),
+        }
+
+        results = []
+        for message_id, score, snippet in hits:
+            message = messages.get(message_id)
+            if message is None:
+                # Deleted between the search and the fetch
+                continue
+            results.append({
+                'thread_id': message.thread_id,
+                'rank': score,
+                'snippet': snippet,
+                'message': MessageSerializer(message, context=context).data,
+            })
+
+        return Response({
+            'next': encode_search_cursor(hits[-1][1], hits[-1][0]) if has_more else None,
+            'results': results,
+        })
+
+
+class PresenceView(APIView):
+    """
+    Presence heartbeat. Clients call it about every
+    ``presence.PRESENCE_TTL / 2`` seconds while the app is in the foreground
+    (WebSocket clients get the same from their ``ping``). Only the cache is
+    written.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [PresenceThrottle]
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Presence heartbeat',
+        operation_description='Mark the current user online for the next '
+                              f'{presence.PRESENCE_TTL} seconds',
+        responses={
+            200: openapi.Response('Online'),
+            400: openapi.Response('Bad Request'),
+            401: openapi.Response('Unauthorized'),
+        }
+    )
+    def post(self, request):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {"detail": "User must have a profile to access messages"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        presence.heartbeat_and_announce(user_profile.id)
+        return Response({'online': True, 'ttl': presence.PRESENCE_TTL})
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Go offline',
+        operation_description='Clear the current user\'s presence before it expires',
+        responses={
+            204: openapi.Response('Offline'),
+            401: openapi.Response('Unauthorized'),
+        }
+    )
+    def delete(self, request):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {"detail": "User must have a profile to access messages"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        presence.go_offline(user_profile.id)
+        presence.announce(user_profile.id, False)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ThreadTypingView(APIView):
+    """Typing indicator for a thread, pushed to the other participants"""
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [PresenceThrottle]
+
+    def set_typing(self, request, thread_id, is_typing):
+        try:
+            user_profile = request.user.profile
+        except Profile.DoesNotExist:
+            return Response(
+                {"detail": "User must have a profile to access messages"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Soft-deleted threads are rejected like in the other thread views;
+        # membership then comes from the participant cache
+        thread = MessageThread.objects.filter(id=thread_id, is_active=True).only('id').first()
+        if not thread or not thread.has_participant(user_profile):
+            return Response(
+                {"detail": "Thread not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        presence.set_typing(thread, user_profile.id, is_typing)
+        return Response({'typing': is_typing, 'ttl': presence.TYPING_TTL})
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Start typing',
+        operation_description=f'Show the current user as typing for {presence.TYPING_TTL} seconds',
+        responses={
+            200: openapi.Response('Typing'),
+            404: openapi.Response('Thread not found'),
+        }
+    )
+    def post(self, request, thread_id):
+        return self.set_typing(request, thread_id, True)
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Stop typing',
+        operation_description='Clear the current user\'s typing indicator',
+        responses={
+            200: openapi.Response('Not typing'),
+            404: openapi.Response('Thread not found'),
+        }
+    )
+    def delete(self, request, thread_id):
+        return self.set_typing(request, thread_id, False)
@@ -2,6 +2,8 @@
 ASGI config for talentsearch project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections are authenticated with the
+API's JWT and routed to the messaging consumers.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,4 +14,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'talentsearch.settings.prod')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_asgi_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from authapp.channels_auth import JWTAuthMiddleware  # noqa: E402
+from messaging.routing import websocket_urlpatterns  # noqa: E402
+
+# No origin check on WebSockets: they authenticate with a bearer token, not
+# cookies, so a foreign page cannot ride on a user's session.
+application = ProtocolTypeRouter({
+    'http': django_asgi_application,
+    'websocket': JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+})
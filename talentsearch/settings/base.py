@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 import environ
 import sys
+import tempfile
 from datetime import timedelta
 
 # Initialize environment variables
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'cloudinary',
     'cloudinary_storage',
+    'channels',
 
     # Custom apps
     'authapp',
@@ -103,6 +105,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'talentsearch.wsgi.application'
+ASGI_APPLICATION = 'talentsearch.asgi.application'
 
 # Database
 DATABASES = {
@@ -125,6 +128,61 @@ CACHES = {
     }
 }
 
+
+def shared_state_settings(redis_url, single_process=False):
+    """
+    ``(CHANNEL_LAYERS, FEED_TIMELINE, IMPRESSIONS)`` for a deployment.
+
+    All three hold state that web processes and workers must share, so they
+    live in Redis at ``redis_url``. Without Redis, a ``single_process`` run
+    (runserver, tests) keeps them in memory. Otherwise an in-memory copy
+    would be invisible to the other processes, so realtime delivery is off
+    and home timelines are read from the database (``FEED_TIMELINE = None``).
+    View counters are always flushed in-process when kept in memory.
+    """
+    if redis_url:
+        return (
+            {'default': {'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': [redis_url]}}},
+            {'BACKEND': 'feed.timeline.RedisTimelineStore', 'OPTIONS': {'url': redis_url}},
+            {'BACKEND': 'authapp.impressions.RedisImpressionStore', 'OPTIONS': {'url': redis_url}},
+        )
+    # The flush_impressions worker cannot see another process's memory, so
+    # in-memory view counters are flushed by the process that records them
+    impressions = {
+        'BACKEND': 'authapp.impressions.InMemoryImpressionStore',
+        'OPTIONS': {'flush_interval': 10},
+    }
+    if single_process:
+        return (
+            {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            {'BACKEND': 'feed.timeline.InMemoryTimelineStore'},
+            impressions,
+        )
+    return {}, None, impressions
+
+
+# Channel layer for real-time WebSocket delivery, home timelines (per-profile
+# sorted sets of post ids, written on post creation) and the view counter buffer
+CHANNEL_LAYERS, FEED_TIMELINE, IMPRESSIONS = shared_state_settings(
+    env("REDIS_URL", default="redis://127.0.0.1:6379/1")
+)
+
+# Messages older than this are moved to the archive table by `archive_messages`
+MESSAGING_ARCHIVE_AFTER_DAYS = env.int('MESSAGING_ARCHIVE_AFTER_DAYS', default=180)
+
+# Posts kept per timeline, and the follower count above which posts are merged in on read
+FEED_TIMELINE_LENGTH = env.int('FEED_TIMELINE_LENGTH', default=800)
+FEED_CELEBRITY_FOLLOWERS = env.int('FEED_CELEBRITY_FOLLOWERS', default=10000)
+
+# Trending feed: engagement halves in score every half-life; the ranking keeps the top posts of the window
+FEED_TRENDING_HALF_LIFE_HOURS = env.float('FEED_TRENDING_HALF_LIFE_HOURS', default=24.0)
+FEED_TRENDING_WINDOW_DAYS = env.int('FEED_TRENDING_WINDOW_DAYS', default=7)
+FEED_TRENDING_SIZE = env.int('FEED_TRENDING_SIZE', default=200)
+
+# View counters are buffered in the IMPRESSIONS store and flushed to the database
+# by flush_impressions; a viewer counts once per object per window
+IMPRESSIONS_DEDUP_WINDOW = env.int('IMPRESSIONS_DEDUP_WINDOW', default=24 * 3600)
+
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = env('EMAIL_HOST', default='smtp.gmail.com')
@@ -145,6 +203,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = ''  # Not needed for Cloudinary
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Feed media renditions (thumbnails, video posters), rendered by the outbox worker
+FEED_MEDIA_STORAGE = {'BACKEND': DEFAULT_FILE_STORAGE}
+FEED_MEDIA_WORKERS = env.int('FEED_MEDIA_WORKERS', default=4)
+FEED_MEDIA_FFMPEG = env('FEED_MEDIA_FFMPEG', default='ffmpeg')
+
 # Cloudinary Configuration
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': env('CLOUD_NAME', default='dummy_cloud_name'),
@@ -288,6 +351,22 @@ if 'test' in sys.argv:
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ]
+    CHANNEL_LAYERS, FEED_TIMELINE, IMPRESSIONS = shared_state_settings(None, single_process=True)
+    # Tests flush view counters themselves
+    IMPRESSIONS = {'BACKEND': 'authapp.impressions.InMemoryImpressionStore'}
+    # Presence, typing and other TTL state live in the cache; no Redis needed
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    FEED_MEDIA_STORAGE = {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.path.join(tempfile.gettempdir(), 'talentsearch-test-media'),
+            'base_url': '/media/',
+        },
+    }
 
 # Authentication settings
 AUTHENTICATION_BACKENDS = [
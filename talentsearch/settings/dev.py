@@ -4,6 +4,7 @@ Development settings for TalentSearch project.
 
 from .base import *
 import os
+import sys
 
 DEBUG = True
 SECRET_KEY = 'django-insecure-key-for-development-only'
@@ -41,8 +42,8 @@ CACHES = {
     }
 }
 
-# Optional Redis support for dev
-if env('REDIS_URL', default=None):
+# Optional Redis support for dev; tests always use the in-memory cache
+if env('REDIS_URL', default=None) and 'test' not in sys.argv:
     CACHES = {
         'default': {
             'BACKEND': 'django_redis.cache.RedisCache',
@@ -60,6 +61,13 @@ else:
         }
     }
 
+# Channel layer, home timelines and view counters: Redis when available,
+# otherwise in-process (runserver is a single process)
+CHANNEL_LAYERS, FEED_TIMELINE, IMPRESSIONS = shared_state_settings(
+    env('REDIS_URL', default=None) if 'test' not in sys.argv else None,
+    single_process=True
+)
+
 # CORS settings for local frontend devs
 CORS_ALLOWED_ORIGINS = [
     "https://talentdiscovery1.netlify.app",
@@ -141,6 +149,7 @@ if not all([CLOUDINARY_STORAGE.get('CLOUD_NAME'),
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+    FEED_MEDIA_STORAGE = {'BACKEND': DEFAULT_FILE_STORAGE}
 else:
     print("✅ Cloudinary configured for development")
     # Ensure MEDIA_URL is empty for Cloudinary
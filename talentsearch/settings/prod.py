@@ -122,6 +122,7 @@ if not all([cloud_name, api_key, api_secret]):
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+    FEED_MEDIA_STORAGE = {'BACKEND': DEFAULT_FILE_STORAGE}
     print("⚠️  Falling back to local file storage (not recommended for production)")
 else:
     print("✅ Cloudinary configured for production")
@@ -170,6 +171,16 @@ else:
         }
     }
 
+# Channel layer, home timelines and view counters. Web processes and workers
+# only share them through Redis; without it realtime delivery is off and
+# timelines are read from the database
+CHANNEL_LAYERS, FEED_TIMELINE, IMPRESSIONS = shared_state_settings(REDIS_URL)
+if not REDIS_URL:
+    logger.error(
+        "REDIS_URL is not set: WebSocket delivery is disabled (clients must poll), timelines are "
+        "read from the database and each web process flushes its own view counts"
+    )
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from userprofile import search
+
+
+class Command(BaseCommand):
+    help = 'Reindex every profile for talent search; run after deploying the search tables or to repair the index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=search.REBUILD_BATCH_SIZE,
+            help='Profiles indexed per batch'
+        )
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        indexed = search.rebuild(batch_size=options['batch_size'], log=log)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} profiles'))
@@ -0,0 +1,170 @@
+# Generated by Django 5.2.1 on 2026-10-16 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copies of the index definition in userprofile.search at the time of this migration
+PROFESSION_FLAGS = (
+    "is_actor", "is_model", "is_performer", "is_host", "is_influencer",
+    "is_voice_over", "is_cameraman", "is_presenter", "is_stuntman",
+)
+FACETS = {
+    "profession": ("professions_and_skills", ("professions",)),
+    "category": ("professions_and_skills", (
+        "actor_category", "model_categories", "performer_categories", "influencer_categories"
+    )),
+    "skill": ("professions_and_skills", ("skills", "main_skill")),
+    "gender": ("basic_information", ("gender",)),
+    "language": ("basic_information", ("languages",)),
+    "country": ("location_information", ("country",)),
+    "region": ("location_information", ("region",)),
+    "city": ("location_information", ("city",)),
+}
+SECTIONS = ("basic_information", "location_information", "professions_and_skills")
+VALUE_MAX_LENGTH = 100
+BATCH_SIZE = 500
+
+
+def normalize(value):
+    if isinstance(value, dict):
+        value = value.get("id", value.get("value", value.get("name")))
+    if isinstance(value, bool) or value is None:
+        return None
+    value = str(value).strip().lower()
+    return value[:VALUE_MAX_LENGTH] or None
+
+
+def section(profile, name):
+    try:
+        return getattr(profile, name)
+    except profile._meta.get_field(name).related_model.DoesNotExist:
+        return None
+
+
+def facet_values(profile):
+    values = {facet: set() for facet in FACETS}
+    for facet, (name, fields) in FACETS.items():
+        part = section(profile, name)
+        if part is None:
+            continue
+        for field in fields:
+            raw = getattr(part, field)
+            for item in raw if isinstance(raw, (list, tuple)) else [raw]:
+                value = normalize(item)
+                if value:
+                    values[facet].add(value)
+
+    skills = section(profile, "professions_and_skills")
+    if skills is not None:
+        values["profession"].update(flag[len("is_"):] for flag in PROFESSION_FLAGS if getattr(skills, flag))
+    return values
+
+
+def backfill_search_index(apps, schema_editor):
+    Profile = apps.get_model("userprofile", "Profile")
+    ProfileSearchDocument = apps.get_model("userprofile", "ProfileSearchDocument")
+    ProfileSearchTerm = apps.get_model("userprofile", "ProfileSearchTerm")
+
+    ids = list(Profile.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        profiles = Profile.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).select_related(*SECTIONS)
+        documents, terms = [], []
+        for profile in profiles:
+            basic = section(profile, "basic_information")
+            document = ProfileSearchDocument(
+                profile=profile,
+                available=profile.availability_status,
+                verified=profile.verified,
+                flagged=profile.flagged,
+                date_of_birth=basic.date_of_birth if basic else None,
+                height=basic.height if basic else None,
+                weight=basic.weight if basic else None,
+            )
+            documents.append(document)
+            terms.extend(
+                ProfileSearchTerm(document=document, facet=facet, value=value)
+                for facet, values in facet_values(profile).items()
+                for value in sorted(values)
+            )
+        ProfileSearchDocument.objects.bulk_create(documents)
+        ProfileSearchTerm.objects.bulk_create(terms)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("userprofile", "0027_alter_headshot_professional_headshot_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfileSearchDocument",
+            fields=[
+                (
+                    "profile",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="userprofile.profile",
+                    ),
+                ),
+                ("available", models.BooleanField(default=True)),
+                ("verified", models.BooleanField(default=False)),
+                ("flagged", models.BooleanField(default=False)),
+                ("date_of_birth", models.DateField(blank=True, null=True)),
+                (
+                    "height",
+                    models.DecimalField(
+                        blank=True, decimal_places=1, max_digits=5, null=True
+                    ),
+                ),
+                (
+                    "weight",
+                    models.DecimalField(
+                        blank=True, decimal_places=1, max_digits=5, null=True
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["height"], name="profilesearch_height_idx"),
+                    models.Index(fields=["weight"], name="profilesearch_weight_idx"),
+                    models.Index(
+                        fields=["date_of_birth"], name="profilesearch_dob_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProfileSearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("facet", models.CharField(max_length=20)),
+                ("value", models.CharField(max_length=100)),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="terms",
+                        to="userprofile.profilesearchdocument",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("facet", "value", "document")},
+            },
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -787,4 +787,42 @@ class NaturalPhotos(models.Model):
 
     class Meta:
         verbose_name = "Natural Photos"
-        verbose_name_plural = "Natural Photos"
\ No newline at end of file
+        verbose_name_plural = "Natural Photos"
+
+class ProfileSearchDocument(models.Model):
+    """
+    One profile flattened for talent search; rewritten from the profile and
+    its sections whenever one of them is saved (see userprofile.search).
+    """
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    available = models.BooleanField(default=True)
+    verified = models.BooleanField(default=False)
+    flagged = models.BooleanField(default=False)
+    date_of_birth = models.DateField(null=True, blank=True)
+    height = models.DecimalField(max_digits=5, decimal_places=1, null=True, blank=True)
+    weight = models.DecimalField(max_digits=5, decimal_places=1, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['height'], name='profilesearch_height_idx'),
+            models.Index(fields=['weight'], name='profilesearch_weight_idx'),
+            models.Index(fields=['date_of_birth'], name='profilesearch_dob_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search document of profile {self.profile_id}"
+
+
+class ProfileSearchTerm(models.Model):
+    """A facet value of a search document: one posting of the inverted index"""
+    document = models.ForeignKey(ProfileSearchDocument, on_delete=models.CASCADE, related_name='terms')
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=100)
+
+    class Meta:
+        # Leading (facet, value) makes each term's posting list one index range scan
+        unique_together = ('facet', 'value', 'document')
+
+    def __str__(self):
+        return f"{self.facet}={self.value}"
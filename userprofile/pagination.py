@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProfileSearchPagination(CursorPagination):
+    """Keyset pages of search hits, newest profiles first"""
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    ordering = '-id'
@@ -0,0 +1,268 @@
+"""
+Faceted talent search.
+
+Each profile is flattened into a ``ProfileSearchDocument`` (flags and the
+range attributes: height, weight, date of birth) and its facet values into
+``ProfileSearchTerm`` rows, an inverted index keyed on ``(facet, value)``.
+Saving a profile or one of its sections rewrites its document after
+commit; ``rebuild_profile_search`` reindexes every profile.
+
+A search selects values of some facets and ranges of some attributes.
+Values of one facet are alternatives (``city=addis ababa&city=adama``),
+facets and ranges must all match. Facet counts are the usual disjunctive
+ones: the counts of a selected facet ignore its own selection, so the
+alternatives stay visible, and every facet costs one grouped query at most.
+"""
+
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Profile, ProfileSearchDocument, ProfileSearchTerm
+
+PROFESSION_FLAGS = (
+    'is_actor', 'is_model', 'is_performer', 'is_host', 'is_influencer',
+    'is_voice_over', 'is_cameraman', 'is_presenter', 'is_stuntman',
+)
+
+# facet -> (profile section, fields holding its values)
+FACETS = {
+    'profession': ('professions_and_skills', ('professions',)),
+    'category': ('professions_and_skills', (
+        'actor_category', 'model_categories', 'performer_categories', 'influencer_categories'
+    )),
+    'skill': ('professions_and_skills', ('skills', 'main_skill')),
+    'gender': ('basic_information', ('gender',)),
+    'language': ('basic_information', ('languages',)),
+    'country': ('location_information', ('country',)),
+    'region': ('location_information', ('region',)),
+    'city': ('location_information', ('city',)),
+}
+SECTIONS = ('basic_information', 'location_information', 'professions_and_skills')
+
+# ``<name>_min``/``<name>_max`` query parameters and their parsers; age is matched on date of birth
+RANGES = {'height': Decimal, 'weight': Decimal, 'age': int}
+MAX_RANGE_VALUE = 1000
+
+FACET_SIZE = 20
+VALUE_MAX_LENGTH = 100
+REBUILD_BATCH_SIZE = 500
+
+
+class SearchError(ValueError):
+    """A search parameter could not be understood"""
+
+
+def normalize(value):
+    """The indexed form of one facet value, or None for values that cannot be indexed"""
+    if isinstance(value, dict):
+        value = value.get('id', value.get('value', value.get('name')))
+    if isinstance(value, bool) or value is None:
+        return None
+    value = str(value).strip().lower()
+    return value[:VALUE_MAX_LENGTH] or None
+
+
+def section(profile, name):
+    """One-to-one section ``name`` of ``profile``, or None when it was never filled in"""
+    try:
+        return getattr(profile, name)
+    except profile._meta.get_field(name).related_model.DoesNotExist:
+        return None
+
+
+def facet_values(profile):
+    """``{facet: set(values)}`` of a profile loaded with its sections"""
+    values = {facet: set() for facet in FACETS}
+    for facet, (name, fields) in FACETS.items():
+        part = section(profile, name)
+        if part is None:
+            continue
+        for field in fields:
+            raw = getattr(part, field)
+            for item in raw if isinstance(raw, (list, tuple)) else [raw]:
+                value = normalize(item)
+                if value:
+                    values[facet].add(value)
+
+    skills = section(profile, 'professions_and_skills')
+    if skills is not None:
+        # The checkboxes name professions too, whether or not they were also picked from the list
+        values['profession'].update(flag[len('is_'):] for flag in PROFESSION_FLAGS if getattr(skills, flag))
+    return values
+
+
+def index(profiles):
+    """Rewrite the search documents of ``profiles``, loaded with their sections"""
+    profiles = list(profiles)
+    if not profiles:
+        return
+    documents, terms = [], []
+    for profile in profiles:
+        basic = section(profile, 'basic_information')
+        document = ProfileSearchDocument(
+            profile=profile,
+            available=profile.availability_status,
+            verified=profile.verified,
+            flagged=profile.flagged,
+            date_of_birth=basic.date_of_birth if basic else None,
+            height=basic.height if basic else None,
+            weight=basic.weight if basic else None,
+        )
+        documents.append(document)
+        terms.extend(
+            ProfileSearchTerm(document=document, facet=facet, value=value)
+            for facet, values in facet_values(profile).items()
+            for value in sorted(values)
+        )
+
+    ids = [profile.pk for profile in profiles]
+    with transaction.atomic():
+        ProfileSearchTerm.objects.filter(document_id__in=ids).delete()
+        ProfileSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['profile'],
+            update_fields=['available', 'verified', 'flagged', 'date_of_birth', 'height', 'weight', 'updated_at'],
+        )
+        ProfileSearchTerm.objects.bulk_create(terms)
+
+
+def indexable():
+    return Profile.objects.select_related(*SECTIONS)
+
+
+def reindex(profile_ids):
+    """Rewrite the documents of the profiles in ``profile_ids`` that still exist"""
+    index(indexable().filter(pk__in=profile_ids))
+
+
+def reindex_on_commit(profile_id):
+    transaction.on_commit(lambda: reindex([profile_id]))
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE, log=None):
+    """
+    Reindex every profile.
+
+    Returns:
+        Number of profiles indexed
+    """
+    ids = list(Profile.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        reindex(ids[start:start + batch_size])
+        if log:
+            log(f'{min(start + batch_size, len(ids))}/{len(ids)} profiles')
+    ProfileSearchDocument.objects.exclude(profile_id__in=Profile.objects.values('pk')).delete()
+    return len(ids)
+
+
+def parse_flag(value, name):
+    lowered = value.lower()
+    if lowered not in ('true', 'false'):
+        raise SearchError(f"'{name}' must be true or false")
+    return lowered == 'true'
+
+
+def parse(params):
+    """
+    Read a search from query parameters: repeated or comma separated
+    facet values, ``<attribute>_min``/``_max`` ranges and the
+    ``verified``/``available`` flags.
+
+    Returns:
+        ``(terms, filters)``: ``{facet: [values]}`` and document filters
+    """
+    terms = {}
+    for facet in FACETS:
+        values = {
+            normalize(part)
+            for value in params.getlist(facet)
+            for part in value.split(',')
+        } - {None}
+        if values:
+            terms[facet] = sorted(values)
+
+    filters = {'flagged': False, 'available': True}
+    for name in ('verified', 'available'):
+        if params.get(name) is not None:
+            filters[name] = parse_flag(params[name], name)
+
+    today = date.today()
+    for attribute, parser in RANGES.items():
+        for bound in ('min', 'max'):
+            raw = params.get(f'{attribute}_{bound}')
+            if raw in (None, ''):
+                continue
+            try:
+                value = parser(raw)
+                in_range = 0 <= value <= MAX_RANGE_VALUE
+            except (ValueError, InvalidOperation):
+                # Comparing a Decimal NaN raises as well
+                raise SearchError(f"'{attribute}_{bound}' must be a number")
+            if not in_range:
+                raise SearchError(f"'{attribute}_{bound}' must be between 0 and {MAX_RANGE_VALUE}")
+            if attribute != 'age':
+                filters[f'{attribute}__{"gte" if bound == "min" else "lte"}'] = value
+            elif bound == 'min':
+                # At least ``value`` years old: born on or before this day ``value`` years ago
+                filters['date_of_birth__lte'] = years_before(today, value)
+            else:
+                # Younger than ``value + 1``: born after this day ``value + 1`` years ago
+                filters['date_of_birth__gt'] = years_before(today, value + 1)
+    return terms, filters
+
+
+def years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        # 29 February in a year that has none
+        return day.replace(year=day.year - years, day=28)
+
+
+def matching(terms, filters, skip=None):
+    """Documents passing ``filters`` and every selected facet except ``skip``"""
+    documents = ProfileSearchDocument.objects.filter(**filters)
+    for facet, values in terms.items():
+        if facet != skip:
+            documents = documents.filter(
+                pk__in=ProfileSearchTerm.objects.filter(facet=facet, value__in=values).values('document_id')
+            )
+    return documents
+
+
+def facet_counts(terms, filters, size=FACET_SIZE):
+    """
+    The ``size`` most common values of every facet among the matches: one
+    grouped query for the unselected facets and one per selected facet.
+
+    Returns:
+        ``{facet: [{'value': v, 'count': n}]}``, most common first
+    """
+    counts = {facet: [] for facet in FACETS}
+    groups = [(None, [facet for facet in FACETS if facet not in terms])]
+    groups += [(facet, [facet]) for facet in terms]
+    for skip, facets in groups:
+        if not facets:
+            continue
+        rows = (
+            ProfileSearchTerm.objects
+            .filter(facet__in=facets, document__in=matching(terms, filters, skip))
+            .values('facet', 'value')
+            .annotate(count=Count('document'))
+            .order_by('facet', '-count', 'value')
+        )
+        for row in rows:
+            if len(counts[row['facet']]) < size:
+                counts[row['facet']].append({'value': row['value'], 'count': row['count']})
+    return counts
+
+
+def hits(terms, filters):
+    """Matching profiles, loaded for search results; order them before slicing"""
+    return Profile.objects.filter(
+        pk__in=matching(terms, filters).values('pk')
+    ).select_related('user', 'headshot', *SECTIONS)
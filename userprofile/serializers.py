@@ -13,6 +13,7 @@ import bleach
 import json
 from django.conf import settings
 import logging
+from .search import section
 
 # Helper function to sanitize strings
 def sanitize_string(value):
@@ -34,6 +35,16 @@ def to_lowercase(value):
         return value.lower()
     return value
 
+HEADSHOT_THUMBNAIL_SIZE = 96
+
+
+def thumbnail_url(image, size):
+    """URL of a square ``size`` crop of ``image``; storages other than Cloudinary serve the original"""
+    url = image.url
+    if '/image/upload/' in url:
+        return url.replace('/image/upload/', f'/image/upload/c_fill,g_face,w_{size},h_{size}/', 1)
+    return url
+
 class IdentityVerificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = IdentityVerification
@@ -513,4 +524,59 @@ class PublicProfileSerializer(serializers.ModelSerializer):
                 }
         except:
             pass
-        return {}
\ No newline at end of file
+        return {}
+
+class ProfileSearchHitSerializer(serializers.ModelSerializer):
+    """
+    A talent search result: enough to list and tell profiles apart.
+    Querysets should come from ``userprofile.search.hits``, which loads the sections.
+    """
+    name = serializers.CharField(source='user.name', read_only=True)
+    headshot = serializers.SerializerMethodField()
+    professions = serializers.SerializerMethodField()
+    gender = serializers.SerializerMethodField()
+    age = serializers.SerializerMethodField()
+    height = serializers.SerializerMethodField()
+    city = serializers.SerializerMethodField()
+    country = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Profile
+        fields = [
+            'id', 'name', 'headshot', 'verified', 'availability_status',
+            'professions', 'gender', 'age', 'height', 'city', 'country'
+        ]
+
+    def get_headshot(self, obj):
+        headshot = section(obj, 'headshot')
+        if headshot is None or not headshot.professional_headshot:
+            return None
+        return thumbnail_url(headshot.professional_headshot, HEADSHOT_THUMBNAIL_SIZE)
+
+    def get_professions(self, obj):
+        skills = section(obj, 'professions_and_skills')
+        return skills.professions if skills else []
+
+    def get_gender(self, obj):
+        basic = section(obj, 'basic_information')
+        return basic.gender if basic else None
+
+    def get_age(self, obj):
+        basic = section(obj, 'basic_information')
+        if basic is None or basic.date_of_birth is None:
+            return None
+        today = date.today()
+        born = basic.date_of_birth
+        return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+    def get_height(self, obj):
+        basic = section(obj, 'basic_information')
+        return float(basic.height) if basic and basic.height is not None else None
+
+    def get_city(self, obj):
+        location = section(obj, 'location_information')
+        return location.city if location else None
+
+    def get_country(self, obj):
+        location = section(obj, 'location_information')
+        return location.country if location else None
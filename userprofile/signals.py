@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import search
+from .models import BasicInformation, LocationInformation, Profile, ProfessionsAndSkills
+
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=BasicInformation)
+@receiver(post_save, sender=LocationInformation)
+@receiver(post_save, sender=ProfessionsAndSkills)
+@receiver(post_delete, sender=BasicInformation)
+@receiver(post_delete, sender=LocationInformation)
+@receiver(post_delete, sender=ProfessionsAndSkills)
+def index_profile_section(sender, instance, raw=False, **kwargs):
+    """A section changed; its profile's search document is rewritten (a deleted profile's is already gone)"""
+    if not raw:
+        search.reindex_on_commit(instance.profile_id)
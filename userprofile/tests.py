@@ -1,8 +1,15 @@
+import importlib
 import os
 from django.test import TestCase
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Profile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+from .models import (
+    Profile, BasicInformation, LocationInformation, ProfessionsAndSkills, ProfileSearchDocument, ProfileSearchTerm
+)
+from . import search
 from .serializers import ProfileSerializer
 from datetime import date, timedelta
 from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
@@ -258,3 +265,114 @@ class ProfileIntegrationTests(APITestCase):
         response = self.client.post(PROFILE_API_URL, invalid_payload, format='multipart')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('Birthdate cannot be in the future', str(response.data))
+
+
+class ProfileSearchTest(APITestCase):
+    url = '/api/profile/search/'
+
+    def make_talent(self, name, professions=(), skills=(), gender=None, born=None, height=None, city=None, **flags):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user(
+                email=f'{name}@test.com', username=name, password='testpass123', name=name.title()
+            )
+            profile = Profile.objects.create(user=user)
+            BasicInformation.objects.create(
+                profile=profile, gender=gender, date_of_birth=born, height=height, languages=['Amharic', 'English']
+            )
+            LocationInformation.objects.create(profile=profile, city=city, country='ET')
+            ProfessionsAndSkills.objects.create(profile=profile, professions=list(professions), skills=list(skills), **flags)
+        return profile
+
+    def setUp(self):
+        today = date.today()
+        self.abel = self.make_talent(
+            'abel', ['actor'], ['Singing'], 'male', today.replace(year=today.year - 30), 180, 'Addis Ababa'
+        )
+        self.hana = self.make_talent(
+            'hana', ['model', 'actor'], ['dancing'], 'female', today.replace(year=today.year - 22), 170, 'Adama'
+        )
+        self.sara = self.make_talent('sara', ['model'], [], 'female', None, 165, 'Addis Ababa', is_host=True)
+
+    def search(self, query=''):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    @staticmethod
+    def ids(data):
+        return [hit['id'] for hit in data['results']]
+
+    def counts(self, data, facet):
+        return {entry['value']: entry['count'] for entry in data['facets'][facet]}
+
+    def test_facets_match_any_value_and_all_facets(self):
+        data = self.search('profession=actor')
+        self.assertEqual(self.ids(data), [self.hana.id, self.abel.id])
+
+        data = self.search('profession=actor,model&city=Addis Ababa')
+        self.assertEqual(self.ids(data), [self.sara.id, self.abel.id])
+        # A selected facet is counted as if unselected, the others within the matches
+        self.assertEqual(self.counts(data, 'city'), {'addis ababa': 2, 'adama': 1})
+        self.assertEqual(self.counts(data, 'profession'), {'actor': 1, 'model': 1, 'host': 1})
+        self.assertEqual(self.counts(data, 'gender'), {'male': 1, 'female': 1})
+
+        data = self.search('skill=singing&profession=host')
+        self.assertEqual(data['results'], [])
+        self.assertEqual(self.counts(data, 'profession'), {'actor': 1})
+
+    def test_ranges(self):
+        self.assertEqual(self.ids(self.search('height_min=168')), [self.hana.id, self.abel.id])
+        self.assertEqual(self.ids(self.search('height_min=168&height_max=175')), [self.hana.id])
+        self.assertEqual(self.ids(self.search('age_min=22&age_max=29')), [self.hana.id])
+        self.assertEqual(self.ids(self.search('age_min=30')), [self.abel.id])
+        for query in ('height_min=tall', 'age_max=NaN', 'age_min=-1', 'verified=maybe'):
+            self.assertEqual(self.client.get(f'{self.url}?{query}').status_code, 400, query)
+
+    def test_index_follows_saves_and_hides_unlisted_profiles(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            location = self.abel.location_information
+            location.city = 'Hawassa'
+            location.save()
+        self.assertEqual(self.ids(self.search('city=hawassa')), [self.abel.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hana.flagged = True
+            self.hana.save()
+            self.sara.availability_status = False
+            self.sara.save()
+        self.assertEqual(self.ids(self.search()), [self.abel.id])
+        self.assertEqual(self.ids(self.search('available=false')), [self.sara.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.abel.user.delete()
+        self.assertEqual(ProfileSearchDocument.objects.filter(profile_id=self.abel.id).count(), 0)
+
+    def test_cursor_pages_and_query_count(self):
+        first = self.search('page_size=2')
+        self.assertEqual(self.ids(first), [self.sara.id, self.hana.id])
+        self.assertEqual(first['results'][1]['age'], 22)
+        second = self.client.get(first['next']).data
+        self.assertEqual(self.ids(second), [self.abel.id])
+        self.assertIsNone(second['next'])
+
+        # Hits, then one grouped query for the unselected facets and one per selected facet
+        with CaptureQueriesContext(connection) as ctx:
+            self.search('profession=model&city=adama')
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+    def test_rebuild(self):
+        ProfileSearchDocument.objects.all().delete()
+        self.assertEqual(search.rebuild(batch_size=2), 3)
+        self.assertEqual(
+            sorted(ProfileSearchTerm.objects.filter(document_id=self.sara.id, facet='profession').values_list('value', flat=True)),
+            ['host', 'model']
+        )
+        self.assertEqual(self.ids(self.search('language=english')), [self.sara.id, self.hana.id, self.abel.id])
+
+    def test_migration_backfills_existing_profiles(self):
+        ProfileSearchDocument.objects.all().delete()
+        state = MigrationExecutor(connection).loader.project_state(('userprofile', '0028_profile_search'))
+        migration = importlib.import_module('userprofile.migrations.0028_profile_search')
+        migration.backfill_search_index(state.apps, None)
+        self.assertEqual(ProfileSearchDocument.objects.count(), 3)
+        self.assertEqual(self.ids(self.search('profession=actor')), [self.hana.id, self.abel.id])
@@ -1,6 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.permissions import IsAuthenticated
@@ -8,7 +9,12 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import Profile, VerificationStatus, VerificationAuditLog, Headshot
-from .serializers import ProfileSerializer, VerificationStatusSerializer, VerificationAuditLogSerializer, PublicProfileSerializer
+from .serializers import (
+    ProfileSerializer, VerificationStatusSerializer, VerificationAuditLogSerializer, PublicProfileSerializer,
+    ProfileSearchHitSerializer
+)
+from .pagination import ProfileSearchPagination
+from . import search
 import os
 from django.conf import settings
 from django.db import IntegrityError
@@ -555,6 +561,64 @@ class PublicProfilesView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class ProfileSearchView(APIView):
+    """
+    Public faceted talent search over available, unflagged profiles
+    """
+    permission_classes = []
+
+    @swagger_auto_schema(
+        tags=['public-profiles'],
+        operation_summary="Search profiles by facets and ranges",
+        operation_description=(
+            "Values of one facet are alternatives, given repeated or comma separated "
+            "(?profession=actor,model); all facets and ranges must match. Returns the counts "
+            "of the most common values of every facet among the matches (a selected facet is "
+            "counted without its own selection) and one cursor page of hits, newest profiles first."
+        ),
+        manual_parameters=[
+            *[
+                openapi.Parameter(facet, openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False)
+                for facet in search.FACETS
+            ],
+            *[
+                openapi.Parameter(f'{attribute}_{bound}', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=False)
+                for attribute in search.RANGES for bound in ('min', 'max')
+            ],
+            openapi.Parameter('verified', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, required=False),
+            openapi.Parameter('available', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, required=False,
+                              description="Defaults to true"),
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False),
+        ],
+        responses={
+            200: "Facet counts and a page of matching profiles",
+            400: "Invalid search parameter"
+        }
+    )
+    def get(self, request):
+        try:
+            terms, filters = search.parse(request.query_params)
+        except search.SearchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            paginator = ProfileSearchPagination()
+            page = paginator.paginate_queryset(search.hits(terms, filters), request, view=self)
+            return Response({
+                'facets': search.facet_counts(terms, filters),
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'results': ProfileSearchHitSerializer(page, many=True).data,
+            }, status=status.HTTP_200_OK)
+        except APIException:
+            raise
+        except Exception as e:
+            return Response(
+                {"error": f"An error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 @method_decorator(csrf_exempt, name='dispatch')
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]